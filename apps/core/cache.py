@@ -0,0 +1,396 @@
+"""
+Caché en dos niveles para lecturas calientes:
+
+1. LRU en memoria del proceso (acotada en entradas y con TTL corto).
+2. django.core.cache (Redis), compartida por todos los procesos.
+
+Las escrituras y borrados publican las claves afectadas en el canal Redis
+CANAL_INVALIDACION; cada proceso tiene un hilo suscrito que las descarta de
+su LRU. Mientras ese hilo no está suscrito (arranque, Redis caído) el nivel
+local no se usa, y al reconectarse se vacía, porque los mensajes publicados
+en el intervalo se perdieron. El TTL local acota lo que pueda escaparse.
+
+Los valores del nivel local se comparten entre peticiones del mismo proceso:
+quien los lea no debe modificarlos.
+
+calcular_una_vez (al final) evita estampidas al recalcular valores caros.
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from django.core.cache import cache
+
+from apps.core.redis_client import get_redis
+
+CANAL_INVALIDACION = "cache:invalidaciones"
+REINTENTO_SUSCRIPCION = 1.0
+
+_caches = {}
+_escucha = {"pid": None, "origen": None, "suscrito": threading.Event()}
+_candado_escucha = threading.Lock()
+
+
+class CacheDosNiveles:
+    """
+    Caché con nombre (`nombre` separa sus claves en los mensajes de
+    invalidación) y API reducida de django.core.cache: get, get_many, set,
+    set_many, add, delete y delete_many. None no se guarda (es "no está").
+    """
+
+    def __init__(self, nombre, max_entradas=1000, ttl_local=30):
+        if nombre in _caches:
+            raise ValueError(f"Ya existe una caché de dos niveles llamada {nombre!r}.")
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.ttl_local = ttl_local
+        self._local = OrderedDict()  # clave -> (vence, valor)
+        self._generacion = 0  # sube con cada invalidación recibida
+        self._candado = threading.Lock()
+        self._contadores = dict.fromkeys(
+            ("local_hits", "local_misses", "redis_hits", "redis_misses", "desalojos", "invalidaciones"), 0
+        )
+        _caches[nombre] = self
+
+    # ------------------------------------------------------------------
+    # Nivel local
+    # ------------------------------------------------------------------
+    def _contar(self, **deltas):
+        with self._candado:
+            for nombre, delta in deltas.items():
+                self._contadores[nombre] += delta
+
+    def _leer_local(self, clave, ahora):
+        with self._candado:
+            entrada = self._local.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] <= ahora:
+                del self._local[clave]
+                return None
+            self._local.move_to_end(clave)
+            return entrada[1]
+
+    def _guardar_local(self, valores, timeout, generacion=None):
+        """
+        Guarda en el nivel local. Con `generacion`, solo si desde entonces no
+        llegó ninguna invalidación (lo leído de Redis podría ser anterior a ella).
+        """
+        if not _local_activo():
+            return
+        ttl = self.ttl_local if timeout is None else min(self.ttl_local, timeout)
+        if ttl <= 0:
+            return
+        vence = time.monotonic() + ttl
+        with self._candado:
+            if generacion is not None and generacion != self._generacion:
+                return
+            for clave, valor in valores.items():
+                self._local[clave] = (vence, valor)
+                self._local.move_to_end(clave)
+            desalojar = max(len(self._local) - self.max_entradas, 0)
+            for _ in range(desalojar):
+                self._local.popitem(last=False)
+            self._contadores["desalojos"] += desalojar
+
+    def descartar_local(self, claves=None):
+        """Quita `claves` (o todo, con None) del nivel local de este proceso."""
+        with self._candado:
+            self._generacion += 1
+            if claves is None:
+                self._local.clear()
+                return
+            for clave in claves:
+                self._local.pop(clave, None)
+            self._contadores["invalidaciones"] += len(claves)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def get(self, clave, default=None):
+        return self.get_many([clave]).get(clave, default)
+
+    def get_many(self, claves):
+        """{clave: valor} de las claves presentes en algún nivel."""
+        activo = _local_activo()
+        ahora = time.monotonic()
+        encontrados = {}
+        faltantes = []
+        for clave in claves:
+            valor = self._leer_local(clave, ahora) if activo else None
+            if valor is None:
+                faltantes.append(clave)
+            else:
+                encontrados[clave] = valor
+        self._contar(local_hits=len(encontrados), local_misses=len(faltantes))
+        if not faltantes:
+            return encontrados
+
+        generacion = self._generacion
+        remotos = cache.get_many(faltantes)
+        self._contar(redis_hits=len(remotos), redis_misses=len(faltantes) - len(remotos))
+        # El TTL restante en Redis no se conoce; el local ya es corto
+        self._guardar_local(remotos, None, generacion)
+        encontrados.update(remotos)
+        return encontrados
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def set(self, clave, valor, timeout=None):
+        self.set_many({clave: valor}, timeout)
+
+    def set_many(self, valores, timeout=None):
+        if not valores:
+            return
+        cache.set_many(valores, timeout)
+        self._publicar(list(valores))
+        self._guardar_local(valores, timeout)
+
+    def add(self, clave, valor, timeout=None):
+        """Como cache.add: solo escribe si la clave no existía en Redis (sin invalidar a los demás)."""
+        agregado = cache.add(clave, valor, timeout)
+        if agregado:
+            self._guardar_local({clave: valor}, timeout)
+        return agregado
+
+    def delete(self, clave):
+        self.delete_many([clave])
+
+    def delete_many(self, claves):
+        claves = list(claves)
+        if not claves:
+            return
+        self.descartar_local(claves)
+        cache.delete_many(claves)
+        self._publicar(claves)
+
+    def _publicar(self, claves):
+        _local_activo()  # asegura el origen de este proceso
+        try:
+            mensaje = json.dumps({"o": _escucha["origen"], "n": self.nombre, "c": claves})
+            get_redis().publish(CANAL_INVALIDACION, mensaje)
+        except Exception as e:
+            print(f"Error al publicar invalidaciones de {self.nombre}: {e}")
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+    def estadisticas(self):
+        with self._candado:
+            datos = dict(self._contadores, entradas_locales=len(self._local))
+        datos["local_activo"] = _escucha["suscrito"].is_set()
+        return datos
+
+
+def estadisticas_caches():
+    """{nombre: contadores} de todas las cachés de dos niveles del proceso."""
+    return {nombre: c.estadisticas() for nombre, c in _caches.items()}
+
+
+# ----------------------------------------------------------------------
+# Suscripción a invalidaciones (un hilo por proceso)
+# ----------------------------------------------------------------------
+def _local_activo():
+    """Arranca el hilo de escucha si hace falta; el nivel local solo vale si está suscrito."""
+    if _escucha["pid"] != os.getpid():
+        with _candado_escucha:
+            if _escucha["pid"] != os.getpid():
+                # Proceso nuevo (o hijo de un fork): lo heredado no está escuchando
+                _escucha.update(pid=os.getpid(), origen=uuid.uuid4().hex, suscrito=threading.Event())
+                for c in _caches.values():
+                    c.descartar_local()
+                threading.Thread(target=_escuchar, name="cache-invalidaciones", daemon=True).start()
+    return _escucha["suscrito"].is_set()
+
+
+def _aplicar(crudo, origen):
+    try:
+        mensaje = json.loads(crudo)
+    except (TypeError, ValueError):
+        return
+    if mensaje.get("o") == origen:
+        return
+    destino = _caches.get(mensaje.get("n"))
+    if destino is not None:
+        destino.descartar_local(mensaje.get("c") or [])
+
+
+def _escuchar():
+    suscrito = _escucha["suscrito"]
+    origen = _escucha["origen"]
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CANAL_INVALIDACION)
+            pubsub.get_message(timeout=REINTENTO_SUSCRIPCION)  # confirma la suscripción
+            for c in _caches.values():
+                c.descartar_local()
+            suscrito.set()
+            for mensaje in pubsub.listen():
+                if mensaje.get("type") == "message":
+                    _aplicar(mensaje["data"], origen)
+        except Exception as e:
+            print(f"Error en la suscripción a invalidaciones de caché: {e}")
+        finally:
+            suscrito.clear()
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        time.sleep(REINTENTO_SUSCRIPCION)
+
+
+# ----------------------------------------------------------------------
+# Cálculo único (single-flight) con refresco anticipado
+# ----------------------------------------------------------------------
+_LIBERAR_LEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+ESPERA_SONDEO = 0.05
+OLAS_RECIENTES = 20
+
+_metricas_calculo = {}
+_candado_metricas = threading.Lock()
+
+
+def _contar(nombre, ola=None, **sumas):
+    """Suma `sumas` a los contadores de `nombre` y, si se da, agrega la ola."""
+    with _candado_metricas:
+        metricas = _metricas_calculo.setdefault(nombre, {
+            "calculos": 0, "anticipados": 0, "colapsados": 0, "vencidos_servidos": 0,
+            "olas": deque(maxlen=OLAS_RECIENTES),
+        })
+        for contador, valor in sumas.items():
+            metricas[contador] += valor
+        if ola is not None:
+            metricas["olas"].append(ola)
+
+
+def estadisticas_calculos():
+    """
+    {nombre: contadores} de calcular_una_vez en este proceso. `olas` son las
+    peticiones (de cualquier proceso) que cada uno de los últimos cálculos
+    hechos aquí evitó; `colapsados` es su total.
+    """
+    with _candado_metricas:
+        return {nombre: dict(m, olas=list(m["olas"])) for nombre, m in _metricas_calculo.items()}
+
+
+def _sobre_valido(entrada):
+    return isinstance(entrada, dict) and {"valor", "duracion", "vence"} <= set(entrada)
+
+
+def calcular_una_vez(nombre, clave, calcular, ttl, cache_destino=None, gracia=None, lease=10, beta=1.0):
+    """
+    Valor cacheado en `clave`, calculado con `calcular()` por una sola
+    petición a la vez en todo el sistema.
+
+    - Se guarda {valor, duracion, vence} por ttl + gracia segundos (gracia
+      por defecto = ttl): pasado `vence` el valor está vencido pero aún se
+      puede servir.
+    - Refresco anticipado (XFetch): cada lectura recalcula antes de `vence`
+      con probabilidad que crece al acercarse y con la duración del cálculo,
+      así que normalmente una sola petición refresca antes de que venza.
+    - Solo recalcula quien obtiene el lease (SET NX PX de `lease` segundos).
+      Las demás sirven el valor vencido o, si no hay ninguno, esperan hasta
+      `lease` segundos a que aparezca; si no aparece, calculan ellas.
+    - Si Redis no responde, se calcula directamente.
+
+    `cache_destino` es django.core.cache (por defecto) o una CacheDosNiveles.
+    """
+    destino = cache_destino or cache
+    gracia = ttl if gracia is None else gracia
+    _contar(nombre)
+
+    try:
+        entrada = destino.get(clave)
+    except Exception as e:
+        print(f"Error al leer {clave} de la caché: {e}")
+        return calcular()
+    if not _sobre_valido(entrada):
+        entrada = None
+
+    ahora = time.time()
+    if entrada is not None:
+        anticipo = -entrada["duracion"] * beta * math.log(1.0 - random.random())
+        if ahora + anticipo < entrada["vence"]:
+            return entrada["valor"]
+
+    clave_lease = f"lease:{clave}"
+    clave_ola = f"ola:{clave}"
+    token = uuid.uuid4().hex
+    try:
+        r = get_redis()
+        obtenido = r.set(clave_lease, token, nx=True, px=int(lease * 1000))
+    except Exception as e:
+        print(f"Error al pedir el lease de {clave}: {e}")
+        return entrada["valor"] if entrada is not None else calcular()
+
+    if not obtenido:
+        try:
+            with r.pipeline(transaction=False) as pipe:
+                pipe.incr(clave_ola)
+                pipe.expire(clave_ola, int(lease) * 2 + 1)
+                pipe.execute()
+        except Exception as e:
+            print(f"Error al contar la espera de {clave}: {e}")
+        if entrada is not None:
+            _contar(nombre, vencidos_servidos=int(ahora >= entrada["vence"]))
+            return entrada["valor"]
+        limite = time.monotonic() + lease
+        while time.monotonic() < limite:
+            time.sleep(ESPERA_SONDEO)
+            try:
+                entrada = destino.get(clave)
+            except Exception as e:
+                print(f"Error al leer {clave} de la caché: {e}")
+                break
+            if _sobre_valido(entrada):
+                return entrada["valor"]
+        # El que tenía el lease no terminó a tiempo
+        return calcular()
+
+    try:
+        # Otro pudo terminar entre la lectura y el lease
+        try:
+            reciente = destino.get(clave)
+        except Exception as e:
+            print(f"Error al leer {clave} de la caché: {e}")
+            reciente = None
+        if _sobre_valido(reciente) and reciente["vence"] > time.time():
+            if entrada is None or reciente["vence"] != entrada["vence"]:
+                return reciente["valor"]
+
+        inicio = time.time()
+        valor = calcular()
+        duracion = time.time() - inicio
+        try:
+            destino.set(
+                clave, {"valor": valor, "duracion": duracion, "vence": inicio + duracion + ttl}, ttl + gracia
+            )
+        except Exception as e:
+            print(f"Error al guardar {clave} en la caché: {e}")
+        try:
+            with r.pipeline() as pipe:
+                pipe.get(clave_ola)
+                pipe.delete(clave_ola)
+                ola = int(pipe.execute()[0] or 0)
+        except Exception as e:
+            print(f"Error al leer la espera de {clave}: {e}")
+            ola = 0
+        _contar(
+            nombre, ola=ola, calculos=1, colapsados=ola,
+            anticipados=int(entrada is not None and ahora < entrada["vence"]),
+        )
+        return valor
+    finally:
+        try:
+            r.eval(_LIBERAR_LEASE, 1, clave_lease, token)
+        except Exception as e:
+            print(f"Error al liberar el lease de {clave}: {e}")
@@ -1,7 +1,252 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Debajo de esta estimación se cuenta exacto (el COUNT es barato)
+UMBRAL_CONTEO_EXACTO = 1000
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 20  # ← tamaño por defecto
     page_size_query_param = "page_size"  # permite ?page_size=50
     max_page_size = 100
+
+
+def conteo_estimado(queryset):
+    """
+    Número aproximado de filas del queryset según el planificador de
+    PostgreSQL (EXPLAIN), sin recorrer la tabla. Si la estimación es pequeña,
+    o la base no es PostgreSQL, se cuenta exacto.
+    """
+    queryset = queryset.order_by()
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    try:
+        plan = json.loads(queryset.explain(format="json"))
+        estimado = int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        print(f"Error al estimar el conteo: {e}")
+        return None
+    if estimado < UMBRAL_CONTEO_EXACTO:
+        return queryset.count()
+    return estimado
+
+
+class CursorPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre una tupla de campos únicos, por
+    defecto (-fecha_reporte, -id). Cada página filtra con
+    (fecha_reporte, id) < (último visto) en lugar de OFFSET, así que una
+    página profunda cuesta lo mismo que la primera si hay un índice con ese
+    orden. No hay conteo total salvo ?count=estimado (ver conteo_estimado).
+
+    El cursor es opaco para el cliente: JSON en base64 con los valores del
+    último (o primer) elemento y la dirección.
+    """
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    conteo_query_param = "count"
+    ordering = ("-fecha_reporte", "-id")
+    invalid_cursor_message = "Cursor inválido."
+
+    # ------------------------------------------------------------------
+    # Cursor
+    # ------------------------------------------------------------------
+    def codificar_cursor(self, valores, anterior=False):
+        crudo = json.dumps({"v": valores, "a": anterior}, default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+    def decodificar_cursor(self, request):
+        """(valores, anterior) del cursor de la petición, o None si no hay cursor."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            valores, anterior = datos["v"], bool(datos["a"])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valores, list) or len(valores) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return valores, anterior
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(tamano, 1), self.max_page_size)
+
+    def _url(self, valores, anterior):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.codificar_cursor(valores, anterior))
+
+    # ------------------------------------------------------------------
+    # Keyset sobre un queryset
+    # ------------------------------------------------------------------
+    def _campos(self):
+        return [(campo.lstrip("-"), campo.startswith("-")) for campo in self.ordering]
+
+    def _filtro_despues_de(self, modelo, valores, hacia_atras):
+        """
+        Q de las filas posteriores a `valores` en el orden (anteriores si
+        hacia_atras): a < x OR (a = x AND b < y) ... La condición redundante
+        sobre el primer campo (a <= x) es la que el índice usa para empezar
+        directamente en el cursor. Un valor que no corresponde al campo
+        (cursor alterado o de otra versión) da NotFound.
+        """
+        filtro = Q()
+        iguales = Q()
+        primero = None
+        for (campo, descendente), valor in zip(self._campos(), valores):
+            try:
+                # clean: tipo, nulos y rango del campo en la base
+                valor = modelo._meta.get_field(campo).clean(valor, None)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if valor is None:
+                raise NotFound(self.invalid_cursor_message)
+            operador = "lt" if descendente != hacia_atras else "gt"
+            filtro |= iguales & Q(**{f"{campo}__{operador}": valor})
+            iguales &= Q(**{campo: valor})
+            if primero is None:
+                primero = Q(**{f"{campo}__{operador}e": valor})
+        return primero & filtro
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_actual = self.get_page_size(request)
+        cursor = self.decodificar_cursor(request)
+        anterior = bool(cursor and cursor[1])
+
+        orden = self.ordering
+        if anterior:
+            orden = [campo[1:] if campo.startswith("-") else f"-{campo}" for campo in orden]
+        qs = queryset.order_by(*orden)
+        if cursor:
+            qs = qs.filter(self._filtro_despues_de(queryset.model, cursor[0], anterior))
+
+        filas = list(qs[: self.page_size_actual + 1])
+        hay_mas = len(filas) > self.page_size_actual
+        filas = filas[: self.page_size_actual]
+        if anterior:
+            filas.reverse()
+
+        claves = [[getattr(fila, campo) for campo, _ in self._campos()] for fila in filas]
+        self._enlaces(claves, cursor is not None, anterior, hay_mas)
+        self.queryset = queryset
+        return filas
+
+    # ------------------------------------------------------------------
+    # Keyset sobre una lista ya ordenada de pares (clave, id)
+    # ------------------------------------------------------------------
+    def paginate_pares(self, pares, request):
+        """
+        Pagina una lista de pares (valor, id) ordenada ascendentemente (p. ej.
+        distancia, id). El cursor guarda el último par visto, así que la
+        página siguiente no se corre aunque entren o salgan huecos antes.
+        Devuelve los ids de la página.
+        """
+        self.request = request
+        self.page_size_actual = self.get_page_size(request)
+        cursor = self.decodificar_cursor(request)
+        anterior = bool(cursor and cursor[1])
+
+        claves = [list(par) for par in pares]
+        if cursor is not None and not all(
+            isinstance(valor, (int, float)) and not isinstance(valor, bool) for valor in cursor[0]
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor is None:
+            inicio, fin = 0, self.page_size_actual
+        elif anterior:
+            fin = bisect_left(claves, cursor[0])
+            inicio = max(fin - self.page_size_actual, 0)
+        else:
+            inicio = bisect_right(claves, cursor[0])
+            fin = inicio + self.page_size_actual
+
+        pagina = claves[inicio:fin]
+        hay_mas = (inicio > 0) if anterior else (fin < len(claves))
+        self._enlaces(pagina, cursor is not None, anterior, hay_mas)
+        self.queryset = None
+        self.total_pares = len(claves)
+        return [id_h for _, id_h in pagina]
+
+    # ------------------------------------------------------------------
+    # Respuesta
+    # ------------------------------------------------------------------
+    def _enlaces(self, claves, con_cursor, anterior, hay_mas):
+        # Hacia adelante: siempre hay anterior si se llegó con cursor; hacia
+        # atrás: siempre hay siguiente (de ahí venía el cliente).
+        self.next = self.previous = None
+        if not claves:
+            if con_cursor and anterior:
+                self.next = remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+            return
+        if hay_mas or anterior:
+            self.next = self._url(claves[-1], anterior=False)
+        if (hay_mas and anterior) or (con_cursor and not anterior):
+            self.previous = self._url(claves[0], anterior=True)
+
+    def get_paginated_response(self, data):
+        respuesta = {"next": self.next, "previous": self.previous}
+        if self.request.query_params.get(self.conteo_query_param) == "estimado":
+            if self.queryset is not None:
+                respuesta["count_estimado"] = conteo_estimado(self.queryset)
+            else:
+                respuesta["count_estimado"] = self.total_pares
+        respuesta["results"] = data
+        return Response(respuesta)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "count_estimado": {"type": "integer", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class CursorDistanciaPagination(CursorPagination):
+    """Cursor sobre (distancia, id) para las listas de huecos cercanos."""
+    ordering = ("distancia", "id")
+
+
+class PaginacionCursorMixin:
+    """
+    Vistas de lista con CursorPagination. Las versiones anteriores de la app
+    paginan con ?page= (o ?limit=/?offset=); si llega alguno de
+    `parametros_legados` se usa `legacy_pagination_class` con su conteo exacto.
+    """
+    pagination_class = CursorPagination
+    legacy_pagination_class = DefaultPagination
+    parametros_legados = ("page",)
+
+    def get_pagination_class(self):
+        return self.pagination_class
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            clase = self.get_pagination_class()
+            params = self.request.query_params
+            if any(parametro in params for parametro in self.parametros_legados):
+                clase = self.legacy_pagination_class
+            self._paginator = clase() if clase is not None else None
+        return self._paginator
@@ -0,0 +1,15 @@
+import redis
+from django.conf import settings
+
+_cliente = None
+
+
+def get_redis():
+    """
+    Cliente Redis compartido (un pool de conexiones por proceso) para las
+    estructuras que no caben en django.core.cache: hashes, sorted sets, etc.
+    """
+    global _cliente
+    if _cliente is None:
+        _cliente = redis.Redis.from_url(settings.REDIS_URL)
+    return _cliente
@@ -0,0 +1,124 @@
+"""
+Tareas periódicas de mantenimiento: ejecución única y métricas.
+
+`tarea_unica` envuelve la función de una tarea Celery para que a lo sumo una
+ejecución corra a la vez en todo el sistema: toma un lease en Redis (SET NX
+PX) y, mientras corre, un hilo lo renueva cada tercio de su duración. Si el
+proceso muere, el lease vence solo. Una ejecución que encuentra el lease
+tomado se omite (la siguiente programada volverá a intentarlo).
+
+Cada ejecución deja en el hash `tarea:<nombre>:metricas` su duración,
+inicio, resultado y los totales de ejecuciones, omisiones y fallos, y en la
+lista `tarea:<nombre>:duraciones` las últimas DURACIONES_GUARDADAS
+duraciones en ms.
+"""
+import functools
+import threading
+import time
+import uuid
+
+from apps.core.redis_client import get_redis
+
+DURACIONES_GUARDADAS = 50
+
+_RENOVAR = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+_LIBERAR = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+def _clave(nombre, sufijo):
+    return f"tarea:{nombre}:{sufijo}"
+
+
+def _registrar(nombre, **campos):
+    """Suma los contadores (`+campo`) y guarda los demás valores en el hash de métricas."""
+    try:
+        r = get_redis()
+        clave = _clave(nombre, "metricas")
+        with r.pipeline(transaction=False) as pipe:
+            for campo, valor in campos.items():
+                if campo.startswith("+"):
+                    pipe.hincrby(clave, campo[1:], valor)
+                else:
+                    pipe.hset(clave, campo, valor)
+            if "ultima_duracion_ms" in campos:
+                pipe.lpush(_clave(nombre, "duraciones"), campos["ultima_duracion_ms"])
+                pipe.ltrim(_clave(nombre, "duraciones"), 0, DURACIONES_GUARDADAS - 1)
+            pipe.execute()
+    except Exception as e:
+        print(f"Error al registrar métricas de la tarea {nombre}: {e}")
+
+
+def tarea_unica(lease=60):
+    """
+    Decorador (debajo de @shared_task) que ejecuta la tarea con un lease de
+    `lease` segundos renovado mientras corre. Los errores se imprimen, se
+    cuentan como fallos y se vuelven a lanzar (Celery marca la tarea como
+    FAILURE y puede reintentarla); una ejecución omitida devuelve None.
+    """
+    def decorador(funcion):
+        nombre = funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            r = get_redis()
+            clave_lease = _clave(nombre, "lease")
+            token = uuid.uuid4().hex
+            ms_lease = int(lease * 1000)
+            try:
+                obtenido = r.set(clave_lease, token, nx=True, px=ms_lease)
+            except Exception as e:
+                print(f"[CELERY ERROR] {nombre}: no se pudo tomar el lease ({e}), se omite.")
+                return None
+            if not obtenido:
+                print(f"[TAREA] {nombre}: otra ejecución en curso, se omite.")
+                _registrar(nombre, **{"+omitidas": 1})
+                return None
+
+            terminado = threading.Event()
+
+            def renovar():
+                while not terminado.wait(lease / 3):
+                    try:
+                        if not r.eval(_RENOVAR, 1, clave_lease, token, ms_lease):
+                            print(f"[TAREA] {nombre}: se perdió el lease.")
+                            return
+                    except Exception as e:
+                        print(f"Error al renovar el lease de la tarea {nombre}: {e}")
+
+            threading.Thread(target=renovar, name=f"lease-{nombre}", daemon=True).start()
+            inicio = time.time()
+            resultado, estado = None, "ok"
+            try:
+                resultado = funcion(*args, **kwargs)
+            except Exception as e:
+                estado = "error"
+                print(f"[CELERY ERROR] {nombre}: {e}")
+                raise
+            finally:
+                terminado.set()
+                duracion = round((time.time() - inicio) * 1000, 1)
+                try:
+                    r.eval(_LIBERAR, 1, clave_lease, token)
+                except Exception as e:
+                    print(f"Error al liberar el lease de la tarea {nombre}: {e}")
+                _registrar(
+                    nombre,
+                    ultima_duracion_ms=duracion,
+                    ultimo_inicio=int(inicio),
+                    ultimo_estado=estado,
+                    **{"+ejecuciones": 1, "+fallos": int(estado == "error")},
+                )
+                print(f"[TAREA] {nombre}: {estado} en {duracion} ms.")
+            return resultado
+
+        return envoltura
+
+    return decorador
+
+
+def metricas_tarea(nombre):
+    """{ejecuciones, omitidas, fallos, ultima_duracion_ms, ..., duraciones_ms} de la tarea."""
+    r = get_redis()
+    metricas = {campo.decode(): valor.decode() for campo, valor in r.hgetall(_clave(nombre, "metricas")).items()}
+    metricas["duraciones_ms"] = [float(d) for d in r.lrange(_clave(nombre, "duraciones"), 0, -1)]
+    return metricas
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.huecos.services.contador_service import reconciliar_contadores
+
+
+class Command(BaseCommand):
+    """
+    Repara Hueco.comentarios_count / confirmaciones_count cuando se
+    desalinean (p. ej. por update() o cargas masivas que no pasan por save()).
+    """
+    help = "Recalcula los contadores de comentarios y confirmaciones de los huecos desalineados."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5000, help="Huecos por UPDATE (rango de ids)")
+
+    def handle(self, *args, **options):
+        corregidos = reconciliar_contadores(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"Huecos corregidos: {corregidos}."))
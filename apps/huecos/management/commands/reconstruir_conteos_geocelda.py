@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.huecos.services.conteo_service import reconstruir_conteos
+
+
+class Command(BaseCommand):
+    """
+    Recalcula ConteoGeocelda desde la tabla de huecos. Úsese si los conteos
+    se desalinearon (p. ej. tras cargas masivas con bulk_create/update()).
+    """
+    help = "Recalcula desde cero los conteos de huecos por geocelda."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        creadas = reconstruir_conteos(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Conteos reconstruidos: {creadas} filas."))
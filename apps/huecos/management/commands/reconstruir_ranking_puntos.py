@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.huecos.services.ranking_service import reconstruir_ranking
+
+
+class Command(BaseCommand):
+    """
+    Recalcula el ranking de puntos (sorted set de Redis) recorriendo el
+    historial de PuntosUsuario; el ranking anterior se reemplaza de una vez.
+    """
+    help = "Reconstruye el ranking de puntos en Redis desde PuntosUsuario."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5000, help="Usuarios por ZADD")
+
+    def handle(self, *args, **options):
+        total = reconstruir_ranking(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"Usuarios en el ranking: {total}."))
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-16 22:25
+
+from django.db import migrations, models
+
+
+def rellenar_geohash(apps, schema_editor):
+    from apps.huecos.services.geocell_service import codificar
+
+    Hueco = apps.get_model('huecos', 'Hueco')
+    lote = []
+    for h in Hueco.objects.only('id', 'latitud', 'longitud').iterator(chunk_size=2000):
+        if h.latitud is None or h.longitud is None:
+            continue
+        h.geohash = codificar(h.latitud, h.longitud)
+        lote.append(h)
+        if len(lote) >= 2000:
+            Hueco.objects.bulk_update(lote, ['geohash'])
+            lote = []
+    if lote:
+        Hueco.objects.bulk_update(lote, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huecos', '0011_hueco_denuncias_count_denunciahueco'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hueco',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(rellenar_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-16 23:35
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Substr
+
+
+def poblar_conteos(apps, schema_editor):
+    Hueco = apps.get_model('huecos', 'Hueco')
+    ConteoGeocelda = apps.get_model('huecos', 'ConteoGeocelda')
+    activos = Hueco.objects.filter(status=1, is_deleted=False).exclude(geohash="")
+    for precision in range(1, 9):
+        filas = (
+            activos.annotate(celda=Substr('geohash', 1, precision))
+            .values('celda', 'estado')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        ConteoGeocelda.objects.bulk_create(
+            [ConteoGeocelda(precision=precision, **fila) for fila in filas.iterator(chunk_size=2000)],
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huecos', '0012_hueco_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoGeocelda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('celda', models.CharField(max_length=12)),
+                ('estado', models.PositiveSmallIntegerField(choices=[(1, 'Pendiente de validación'), (2, 'Activo'), (3, 'Rechazado'), (4, 'Reabierto'), (5, 'Cerrado'), (6, 'En reparación'), (7, 'Reparado')])),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('precision', 'celda', 'estado')},
+            },
+        ),
+        migrations.RunPython(poblar_conteos, migrations.RunPython.noop),
+    ]
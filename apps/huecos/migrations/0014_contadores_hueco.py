@@ -0,0 +1,43 @@
+# Generated by Django 4.2.25 on 2026-10-16 23:52
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def rellenar_contadores(apps, schema_editor):
+    Hueco = apps.get_model('huecos', 'Hueco')
+
+    def conteo(nombre_modelo):
+        modelo = apps.get_model('huecos', nombre_modelo)
+        filas = (
+            modelo.objects.filter(hueco=OuterRef('pk'), is_deleted=False)
+            .order_by().values('hueco').annotate(total=Count('id')).values('total')
+        )
+        return Coalesce(Subquery(filas, output_field=IntegerField()), 0)
+
+    Hueco.objects.update(
+        comentarios_count=conteo('Comentario'),
+        confirmaciones_count=conteo('Confirmacion'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huecos', '0013_conteogeocelda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hueco',
+            name='comentarios_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hueco',
+            name='confirmaciones_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(rellenar_contadores, migrations.RunPython.noop),
+    ]
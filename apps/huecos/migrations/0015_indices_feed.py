@@ -0,0 +1,21 @@
+# Generated by Django 4.2.25 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huecos', '0014_contadores_hueco'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hueco',
+            index=models.Index(fields=['-fecha_reporte', '-id'], name='hueco_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hueco',
+            index=models.Index(fields=['usuario', '-fecha_reporte', '-id'], name='hueco_feed_usuario_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-17 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huecos', '0015_indices_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='puntosusuario',
+            name='ciudad',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
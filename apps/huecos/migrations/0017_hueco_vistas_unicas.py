@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-17 00:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('huecos', '0016_puntosusuario_ciudad'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hueco',
+            name='vistas_unicas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='VistaDiariaHueco',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('vistas_unicas', models.PositiveIntegerField(default=0)),
+                ('hueco', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vistas_diarias', to='huecos.hueco')),
+            ],
+            options={
+                'unique_together': {('hueco', 'fecha')},
+            },
+        ),
+    ]
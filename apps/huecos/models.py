@@ -1,9 +1,12 @@
 # apps/huecos/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from apps.core.models import BaseStatusModel
 from django.conf import settings
-from apps.utils.mixins import AuditMixin
-from apps.usuarios.models import User
+from django.utils import timezone
+from apps.utils.mixins import AuditMixin, FieldTrackerMixin
+from apps.usuarios.models import ContadorEnUsuarioMixin, User
 
 class EstadoHueco(models.IntegerChoices):
     PENDIENTE = 1, 'Pendiente de validación'
@@ -14,7 +17,9 @@ class EstadoHueco(models.IntegerChoices):
     EN_REPARACION = 6, 'En reparación'
     REPARADO = 7, 'Reparado'
 
-class Hueco(AuditMixin, BaseStatusModel):
+class Hueco(ContadorEnUsuarioMixin, AuditMixin, BaseStatusModel):
+    campo_estadistica = 'reportes'
+
     # Usamos los choices numéricos
     ciudad = models.CharField(max_length=100, blank=True, null=True)
     usuario = models.ForeignKey('usuarios.User', on_delete=models.CASCADE, related_name='huecos')
@@ -35,9 +40,16 @@ class Hueco(AuditMixin, BaseStatusModel):
     imagen = models.ImageField(upload_to="huecos/", null=True, blank=True)
     imagen_preview = models.ImageField(upload_to="huecos/preview/", null=True, blank=True)
     denuncias_count = models.PositiveIntegerField(default=0)
+    # Contadores desnormalizados (ver ContadorEnHuecoMixin); solo filas no eliminadas
+    comentarios_count = models.PositiveIntegerField(default=0, editable=False)
+    confirmaciones_count = models.PositiveIntegerField(default=0, editable=False)
+    # Índice espacial: se recalcula en save() cuando cambian las coordenadas
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True, editable=False)
 
     # Nuevos campos
     vistas = models.IntegerField(default=0)
+    # Visitantes distintos (HyperLogLog en Redis, ver vistas_service)
+    vistas_unicas = models.PositiveIntegerField(default=0, editable=False)
     GRAVEDAD_CHOICES = [
         ('baja', 'Baja'),
         ('media', 'Media'),
@@ -45,13 +57,52 @@ class Hueco(AuditMixin, BaseStatusModel):
     ]
     gravedad = models.CharField(max_length=10, choices=GRAVEDAD_CHOICES, default='media')
 
+    # Campos que alimentan ConteoGeocelda
+    campos_rastreados = ('geohash', 'estado', 'status', 'is_deleted')
+
+    class Meta:
+        indexes = [
+            # Paginación por cursor (fecha_reporte, id) de los feeds
+            models.Index(fields=['-fecha_reporte', '-id'], name='hueco_feed_idx'),
+            models.Index(fields=['usuario', '-fecha_reporte', '-id'], name='hueco_feed_usuario_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        # 2. Procesamiento de Imagen: Delegar a Celery
+
+        # 1. Mantener el geohash al día con las coordenadas
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'latitud', 'longitud'} & set(update_fields):
+            from apps.huecos.services.geocell_service import codificar
+            if self.latitud is not None and self.longitud is not None:
+                anterior = self.geohash
+                self.geohash = codificar(self.latitud, self.longitud)
+                # Celda previa: la usan las señales para invalidar los tiles viejos
+                if anterior and anterior != self.geohash:
+                    self._geohash_anterior = anterior
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'geohash'}
+
+        # 2. Guardar y ajustar los conteos por geocelda en la misma transacción
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(self.campos_rastreados) & set(update_fields):
+            from apps.huecos.services.conteo_service import aplicar_cambio
+
+            originales = self.valores_originales()
+            actuales = dict(originales or {})
+            for campo in self.campos_rastreados:
+                if is_new or update_fields is None or campo in update_fields:
+                    actuales[campo] = getattr(self, campo)
+
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                aplicar_cambio(self._clave_conteo(originales), self._clave_conteo(actuales))
+        else:
+            super().save(*args, **kwargs)
+        self._guardar_originales()
+
+        # 3. Procesamiento de Imagen: Delegar a Celery
         if is_new and self.imagen:
-            from django.db import transaction
             from apps.huecos.tasks import optimizar_imagen_hueco_task
             
             def safe_delay():
@@ -62,6 +113,14 @@ class Hueco(AuditMixin, BaseStatusModel):
 
             transaction.on_commit(safe_delay)
             
+    @staticmethod
+    def _clave_conteo(valores):
+        """(geohash, estado, activo) con el que el hueco aporta a ConteoGeocelda."""
+        if not valores:
+            return None
+        activo = valores['status'] == 1 and not valores['is_deleted']
+        return valores['geohash'], valores['estado'], activo
+
     def evaluar_validaciones(self):
         from apps.huecos.services.puntos_service import evaluar_validaciones_hueco
         evaluar_validaciones_hueco(self)
@@ -71,6 +130,136 @@ class Hueco(AuditMixin, BaseStatusModel):
         return f"Hueco #{self.id} ({self.estado})"
 
 
+@receiver(post_save, sender=Hueco)
+def sincronizar_indice_hueco(sender, instance, update_fields=None, **kwargs):
+    """Publica el cambio en el índice espacial en memoria (indice_service)."""
+    campos_indice = {'latitud', 'longitud', 'estado', 'status', 'is_deleted'}
+    if update_fields is not None and not campos_indice & set(update_fields):
+        return
+
+    from apps.huecos.services.hueco_service import ESTADOS_CERCANOS
+    from apps.huecos.services.indice_service import registrar_cambio
+
+    activo = instance.status == 1 and not instance.is_deleted and instance.estado in ESTADOS_CERCANOS
+    datos = (instance.pk, instance.latitud, instance.longitud, activo)
+    transaction.on_commit(lambda: registrar_cambio(*datos))
+
+
+@receiver(post_delete, sender=Hueco)
+def retirar_hueco_del_indice(sender, instance, **kwargs):
+    from apps.huecos.services.indice_service import registrar_eliminacion
+    hueco_id = instance.pk
+    transaction.on_commit(lambda: registrar_eliminacion(hueco_id))
+
+
+@receiver(post_delete, sender=Hueco)
+def descontar_hueco_eliminado(sender, instance, **kwargs):
+    from apps.huecos.services.conteo_service import aplicar_cambio
+    valores = {campo: getattr(instance, campo) for campo in instance.campos_rastreados}
+    valores.update(getattr(instance, '_originales', {}))
+    aplicar_cambio(Hueco._clave_conteo(valores), None)
+
+
+class ConteoGeocelda(models.Model):
+    """Huecos activos por (precisión geohash, celda, estado). Ver conteo_service."""
+    precision = models.PositiveSmallIntegerField()
+    celda = models.CharField(max_length=12)
+    estado = models.PositiveSmallIntegerField(choices=EstadoHueco.choices)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('precision', 'celda', 'estado')
+
+    def __str__(self):
+        return f"{self.celda} ({self.estado}): {self.total}"
+
+
+class VistaDiariaHueco(models.Model):
+    """Visitantes únicos de un hueco por día (volcados desde Redis por vistas_service)."""
+    hueco = models.ForeignKey(Hueco, on_delete=models.CASCADE, related_name='vistas_diarias')
+    fecha = models.DateField()
+    vistas_unicas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('hueco', 'fecha')
+
+    def __str__(self):
+        return f"Hueco #{self.hueco_id} {self.fecha}: {self.vistas_unicas}"
+
+
+def _posiciones_afectadas(instance):
+    posiciones = [(instance.latitud, instance.longitud)]
+    anterior = getattr(instance, '_geohash_anterior', None)
+    if anterior:
+        from apps.huecos.services.geocell_service import limites
+        # Esquinas de la celda previa: cubren todas las celdas y tiles donde pudo estar
+        lat_min, lat_max, lon_min, lon_max = limites(anterior)
+        posiciones += [(lat, lon) for lat in (lat_min, lat_max) for lon in (lon_min, lon_max)]
+        instance._geohash_anterior = None
+    return posiciones
+
+
+@receiver(post_save, sender=Hueco)
+def invalidar_caches_hueco(sender, instance, created=False, update_fields=None, **kwargs):
+    """Invalida solo los tiles del mapa y las listas de cercanos que contienen al hueco."""
+    from apps.huecos.services.hueco_service import invalidar_cercanos_de
+    from apps.huecos.services.tile_service import invalidar_tiles_de
+
+    from apps.huecos.services.fragmento_service import invalidar_fragmento
+    hueco_id = instance.pk
+    transaction.on_commit(lambda: invalidar_fragmento(hueco_id))
+
+    campos = set(update_fields) if update_fields is not None else None
+    tiles = campos is None or bool({'latitud', 'longitud', 'estado', 'gravedad', 'status', 'is_deleted'} & campos)
+    cercanos = campos is None or bool({'latitud', 'longitud', 'estado', 'status', 'is_deleted'} & campos)
+    if not (tiles or cercanos):
+        return
+
+    posiciones = _posiciones_afectadas(instance)
+
+    def invalidar():
+        if tiles:
+            invalidar_tiles_de(*posiciones)
+        if cercanos:
+            invalidar_cercanos_de(*posiciones)
+
+    transaction.on_commit(invalidar)
+
+
+@receiver(post_delete, sender=Hueco)
+def invalidar_caches_hueco_eliminado(sender, instance, **kwargs):
+    from apps.huecos.services.hueco_service import invalidar_cercanos_de
+    from apps.huecos.services.tile_service import invalidar_tiles_de
+
+    from apps.huecos.services.fragmento_service import invalidar_fragmento
+
+    posiciones = _posiciones_afectadas(instance)
+    hueco_id = instance.pk
+    transaction.on_commit(lambda: (
+        invalidar_tiles_de(*posiciones), invalidar_cercanos_de(*posiciones), invalidar_fragmento(hueco_id)
+    ))
+
+
+@receiver(post_save, sender='huecos.Comentario')
+@receiver(post_delete, sender='huecos.Comentario')
+@receiver(post_save, sender='huecos.Confirmacion')
+@receiver(post_delete, sender='huecos.Confirmacion')
+def invalidar_fragmento_por_relacion(sender, instance, **kwargs):
+    """Los últimos comentarios y el conteo de confirmaciones forman parte del fragmento."""
+    from apps.huecos.services.fragmento_service import invalidar_fragmento
+    hueco_id = instance.hueco_id
+    transaction.on_commit(lambda: invalidar_fragmento(hueco_id))
+
+
+@receiver(post_delete, sender='huecos.Comentario')
+@receiver(post_delete, sender='huecos.Confirmacion')
+def descontar_fila_eliminada(sender, instance, **kwargs):
+    """Borrado físico: descuenta la fila si todavía contaba."""
+    valores = {'hueco_id': instance.hueco_id, 'is_deleted': instance.is_deleted}
+    valores.update(getattr(instance, '_originales', {}))
+    instance.ajustar_contador(ContadorEnHuecoMixin._hueco_contado(valores), -1)
+
+
 class HistorialHueco(AuditMixin):
     hueco = models.ForeignKey(Hueco, on_delete=models.CASCADE, related_name="historial")
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
@@ -82,7 +271,57 @@ class HistorialHueco(AuditMixin):
         return f"{self.accion} por {self.usuario} en {self.fecha}"
 
 
-class Confirmacion(AuditMixin, BaseStatusModel):
+class ContadorEnHuecoMixin(FieldTrackerMixin):
+    """
+    Mantiene Hueco.<campo_contador> al crear, eliminar (soft o físico) o
+    restaurar la fila, con F() y en la misma transacción que el save().
+    """
+    campo_contador = None
+    campos_rastreados = ('hueco_id', 'is_deleted')
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def _hueco_contado(valores):
+        """Hueco al que suma la fila, o None si no cuenta (eliminada)."""
+        if not valores or valores.get('is_deleted') or valores.get('hueco_id') is None:
+            return None
+        return valores['hueco_id']
+
+    def ajustar_contador(self, hueco_id, delta):
+        if hueco_id is not None:
+            Hueco.objects.filter(pk=hueco_id).update(
+                **{self.campo_contador: models.F(self.campo_contador) + delta}
+            )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'hueco', 'hueco_id', 'is_deleted'} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        originales = self.valores_originales()
+        actuales = dict(originales or {})
+        if originales is None or update_fields is None or {'hueco', 'hueco_id'} & set(update_fields):
+            actuales['hueco_id'] = self.hueco_id
+        if originales is None or update_fields is None or 'is_deleted' in update_fields:
+            actuales['is_deleted'] = self.is_deleted
+
+        anterior = self._hueco_contado(originales)
+        actual = self._hueco_contado(actuales)
+        with transaction.atomic():
+            resultado = super().save(*args, **kwargs)
+            if anterior != actual:
+                self.ajustar_contador(anterior, -1)
+                self.ajustar_contador(actual, 1)
+        self._guardar_originales()
+        return resultado
+
+
+class Confirmacion(ContadorEnUsuarioMixin, ContadorEnHuecoMixin, AuditMixin, BaseStatusModel):
+    campo_contador = 'confirmaciones_count'
+    campo_estadistica = 'confirmaciones'
+
     hueco = models.ForeignKey(Hueco, on_delete=models.CASCADE, related_name="confirmaciones")
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     nuevo_estado = models.PositiveSmallIntegerField(choices=EstadoHueco.choices, default=EstadoHueco.PENDIENTE) 
@@ -96,7 +335,10 @@ class Confirmacion(AuditMixin, BaseStatusModel):
         return f"{self.usuario} confirmó hueco {self.hueco.id} ciclo {self.numero_ciclo}"
 
 
-class Comentario(AuditMixin, BaseStatusModel):
+class Comentario(ContadorEnUsuarioMixin, ContadorEnHuecoMixin, AuditMixin, BaseStatusModel):
+    campo_contador = 'comentarios_count'
+    campo_estadistica = 'comentarios'
+
     hueco = models.ForeignKey(Hueco, on_delete=models.CASCADE, related_name="comentarios")
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     texto = models.TextField()
@@ -125,6 +367,8 @@ class PuntosUsuario(AuditMixin):
     tipo = models.CharField(max_length=50, choices=TIPOS)
     puntos = models.IntegerField(default=0)
     descripcion = models.CharField(max_length=255, blank=True)
+    # Ciudad normalizada (ranking_service.normalizar_ciudad) para los rankings por ciudad
+    ciudad = models.CharField(max_length=100, null=True, blank=True)
     fecha = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -136,8 +380,15 @@ class PuntosUsuario(AuditMixin):
         Guarda el registro y actualiza automáticamente la reputación del usuario.
         Si es un reporte falso o penalización, resta puntos.
         """
+        nuevo = self._state.adding
         super().save(*args, **kwargs)
 
+        if nuevo and not self.is_deleted:
+            from apps.huecos.services.ranking_service import sumar_al_ranking
+            from apps.usuarios.services.stats_service import sumar_puntos
+            sumar_puntos(self.usuario_id, self.tipo, self.puntos)
+            sumar_al_ranking(self.usuario_id, self.puntos, self.ciudad, timezone.localdate(self.fecha))
+
         from apps.usuarios.models import ReputacionUsuario  # evitar import circular
         reputacion, _ = ReputacionUsuario.objects.get_or_create(usuario=self.usuario)
 
@@ -153,7 +404,9 @@ class PuntosUsuario(AuditMixin):
             reputacion.save()
 
 
-class ValidacionHueco(AuditMixin, BaseStatusModel):
+class ValidacionHueco(ContadorEnUsuarioMixin, AuditMixin, BaseStatusModel):
+    campo_estadistica = 'validaciones'
+
     hueco = models.ForeignKey(Hueco, on_delete=models.CASCADE, related_name="validaciones")
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     voto = models.BooleanField(help_text="True = confirma que el hueco existe, False = no existe")
@@ -184,7 +437,9 @@ class DispositivoUsuario(BaseStatusModel):
         return f"{self.usuario.username} - {self.plataforma}"
 
 
-class Suscripcion(AuditMixin, BaseStatusModel):
+class Suscripcion(ContadorEnUsuarioMixin, AuditMixin, BaseStatusModel):
+    campo_estadistica = 'huecos_seguidos'
+
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
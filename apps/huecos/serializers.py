@@ -1,4 +1,7 @@
+from django.db import models
+from django.db.models import F, prefetch_related_objects
 from rest_framework import serializers
+from apps.huecos.services.hueco_service import ULTIMOS_COMENTARIOS, prefetch_ultimos_comentarios
 from .models import Hueco, HistorialHueco, Confirmacion, Comentario, PuntosUsuario, ValidacionHueco, Suscripcion, EstadoHueco, DenunciaHueco
 
 
@@ -11,12 +14,66 @@ class ComentarioSerializer(serializers.ModelSerializer):
         read_only_fields = ['usuario', 'fecha']
 
 
+class HuecoListSerializer(serializers.ListSerializer):
+    """
+    Serializa una lista de huecos resolviendo en lote lo que HuecoSerializer
+    consultaría por cada hueco: usuario, últimos comentarios (si el queryset
+    no los trae ya con prefetch_ultimos_comentarios) y los campos del usuario
+    (seguido, validado, confirmación del ciclo actual).
+    El número de consultas no depende del tamaño de la página.
+    """
+
+    def to_representation(self, data):
+        huecos = list(data.all() if isinstance(data, models.Manager) else data)
+        self._lote = self._cargar_lote(huecos)
+        try:
+            return [self.child.to_representation(hueco) for hueco in huecos]
+        finally:
+            self._lote = None
+
+    def _cargar_lote(self, huecos):
+        ids = [h.pk for h in huecos]
+        campos = self.child.fields
+        lote = {}
+        if not ids:
+            return lote
+
+        if "usuario_nombre" in campos and not Hueco.usuario.is_cached(huecos[0]):
+            prefetch_related_objects(huecos, "usuario")
+
+        if "comentarios" in campos and not hasattr(huecos[0], "ultimos_comentarios"):
+            prefetch_related_objects(huecos, prefetch_ultimos_comentarios())
+
+        request = self.context.get("request")
+        usuario = getattr(request, "user", None)
+        if usuario is not None and usuario.is_authenticated:
+            if "is_followed" in campos:
+                lote["seguidos"] = set(
+                    Suscripcion.objects.filter(usuario=usuario, hueco_id__in=ids, status=1)
+                    .values_list("hueco_id", flat=True)
+                )
+            if "validado_usuario" in campos:
+                lote["validados"] = set(
+                    ValidacionHueco.objects.filter(usuario=usuario, hueco_id__in=ids)
+                    .values_list("hueco_id", flat=True)
+                )
+            if "mi_confirmacion" in campos:
+                # Confirmación del ciclo actual de cada hueco (una por ciclo: unique_together)
+                lote["confirmaciones"] = {
+                    confirmacion.hueco_id: confirmacion
+                    for confirmacion in Confirmacion.objects.filter(
+                        usuario=usuario, hueco_id__in=ids, numero_ciclo=F("hueco__numero_ciclos"),
+                    ).select_related("usuario")
+                }
+        return lote
+
+
 class HuecoSerializer(serializers.ModelSerializer):
     usuario = serializers.PrimaryKeyRelatedField(read_only=True)
     usuario_nombre = serializers.CharField(source='usuario.username', read_only=True)
     comentarios = serializers.SerializerMethodField()
-    total_comentarios = serializers.IntegerField(source='comentarios.count', read_only=True)
-    confirmaciones_count = serializers.IntegerField(source='confirmaciones.count', read_only=True)
+    total_comentarios = serializers.IntegerField(source='comentarios_count', read_only=True)
+    confirmaciones_count = serializers.IntegerField(read_only=True)
     distancia_m = serializers.FloatField(read_only=True)
     validado_usuario = serializers.SerializerMethodField()
     faltan_validaciones = serializers.SerializerMethodField()
@@ -25,6 +82,7 @@ class HuecoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Hueco
+        list_serializer_class = HuecoListSerializer
         fields = [
             'id',
             'usuario',
@@ -41,6 +99,7 @@ class HuecoSerializer(serializers.ModelSerializer):
             'validaciones_negativas',
             'gravedad',
             'vistas',
+            'vistas_unicas',
             'imagen',
             'comentarios',
             'total_comentarios',  # Nuevo campo
@@ -52,27 +111,44 @@ class HuecoSerializer(serializers.ModelSerializer):
             "is_followed",      # Nuevo
         ]
 
+    def _lote(self):
+        """Datos precargados por HuecoListSerializer (None al serializar un solo hueco)."""
+        return getattr(self.parent, "_lote", None)
+
     def get_comentarios(self, obj):
-        # Retorna solo los 3 ultimos
-        comentarios = obj.comentarios.all().order_by('-fecha')[:3]
+        # Retorna solo los 3 ultimos (precargados con prefetch_ultimos_comentarios)
+        if hasattr(obj, "ultimos_comentarios"):
+            comentarios = obj.ultimos_comentarios
+        else:
+            comentarios = (
+                obj.comentarios.filter(status=1, is_deleted=False)
+                .select_related('usuario').order_by('-fecha', '-id')[:ULTIMOS_COMENTARIOS]
+            )
         return ComentarioSerializer(comentarios, many=True).data
 
     def get_is_followed(self, obj):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
+        lote = self._lote()
+        if lote is not None:
+            return obj.pk in lote["seguidos"]
         return Suscripcion.objects.filter(hueco=obj, usuario=request.user, status=1).exists()
 
     def get_mi_confirmacion(self, obj):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return None
-        # Buscar confirmacion del ciclo actual
-        confirmacion = Confirmacion.objects.filter(
-            hueco=obj, 
-            usuario=request.user,
-            numero_ciclo=obj.numero_ciclos
-        ).first()
+        lote = self._lote()
+        if lote is not None:
+            confirmacion = lote["confirmaciones"].get(obj.pk)
+        else:
+            # Buscar confirmacion del ciclo actual
+            confirmacion = Confirmacion.objects.filter(
+                hueco=obj, 
+                usuario=request.user,
+                numero_ciclo=obj.numero_ciclos
+            ).first()
         if confirmacion:
             return ConfirmacionSerializer(confirmacion, context=self.context).data
         return None
@@ -81,6 +157,9 @@ class HuecoSerializer(serializers.ModelSerializer):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
+        lote = self._lote()
+        if lote is not None:
+            return obj.pk in lote["validados"]
         return ValidacionHueco.objects.filter(
             hueco=obj,
             usuario=request.user
@@ -93,6 +172,64 @@ class HuecoSerializer(serializers.ModelSerializer):
         faltan = 5 - (obj.validaciones_positivas or 0)
         return max(faltan, 0)
 
+
+# Campos de HuecoSerializer que dependen del usuario que consulta
+CAMPOS_POR_USUARIO = ("distancia_m", "validado_usuario", "mi_confirmacion", "is_followed")
+
+
+# Representación compacta (listas y mapa de la app): sin consultas por hueco
+CAMPOS_COMPACTOS = (
+    "id", "latitud", "longitud", "estado", "gravedad",
+    "fecha_reporte", "total_comentarios", "confirmaciones_count",
+)
+
+
+def _lista_parametro(valor):
+    if valor is None:
+        return None
+    return {campo.strip() for campo in valor.split(",") if campo.strip()}
+
+
+def campos_solicitados(params, disponibles=None):
+    """
+    Campos pedidos con ?fields= y ?expand= (listas separadas por comas), en el
+    orden de `disponibles`. Sin ?fields= se parte de CAMPOS_COMPACTOS y
+    ?expand= agrega campos (p. ej. comentarios, mi_confirmacion).
+    Devuelve None si no se pidió ni eso ni ?vista=compacta: representación completa.
+    Los nombres desconocidos se ignoran.
+    """
+    fields = _lista_parametro(params.get("fields"))
+    expand = _lista_parametro(params.get("expand"))
+    if fields is None and expand is None and params.get("vista") != "compacta":
+        return None
+    pedidos = (fields if fields is not None else set(CAMPOS_COMPACTOS)) | (expand or set())
+    return [campo for campo in (disponibles or HuecoSerializer.Meta.fields) if campo in pedidos]
+
+
+class HuecoCompactoSerializer(HuecoSerializer):
+    """
+    HuecoSerializer con solo los campos pedidos (ver campos_solicitados). Los
+    campos caros (comentarios y los del usuario) no se calculan si no se piden,
+    y HuecoListSerializer tampoco los carga en lote.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        campos = campos_solicitados(request.query_params) if request is not None else None
+        campos = set(campos if campos is not None else CAMPOS_COMPACTOS)
+        for nombre in list(self.fields):
+            if nombre not in campos:
+                self.fields.pop(nombre)
+
+
+class HuecoCompartidoSerializer(HuecoSerializer):
+    """Campos de HuecoSerializer iguales para todos los usuarios (ver fragmento_service)."""
+
+    class Meta(HuecoSerializer.Meta):
+        fields = [campo for campo in HuecoSerializer.Meta.fields if campo not in CAMPOS_POR_USUARIO]
+
+
 class ConfirmacionSerializer(serializers.ModelSerializer):
     usuario_nombre = serializers.CharField(source='usuario.username', read_only=True)
 
@@ -0,0 +1,49 @@
+"""
+Reconciliación de los contadores desnormalizados de Hueco
+(comentarios_count, confirmaciones_count) contra las tablas reales.
+"""
+from django.db.models import Count, F, IntegerField, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.huecos.models import Comentario, Confirmacion, Hueco
+
+CONTADORES = (
+    ('comentarios_count', Comentario),
+    ('confirmaciones_count', Confirmacion),
+)
+
+
+def conteo_real(modelo):
+    """Subconsulta con las filas no eliminadas de `modelo` para cada hueco."""
+    filas = (
+        modelo.objects.filter(hueco=OuterRef('pk'), is_deleted=False)
+        .order_by().values('hueco').annotate(total=Count('id')).values('total')
+    )
+    return Coalesce(Subquery(filas, output_field=IntegerField()), 0)
+
+
+def reconciliar_contadores(lote=5000):
+    """
+    Corrige los huecos cuyos contadores no coinciden con los conteos reales,
+    recorriendo la tabla por rangos de id (un UPDATE por rango).
+    Devuelve cuántos huecos se corrigieron.
+    """
+    rango = Hueco.objects.aggregate(minimo=Min('id'), maximo=Max('id'))
+    if rango['minimo'] is None:
+        return 0
+
+    reales = {campo: conteo_real(modelo) for campo, modelo in CONTADORES}
+    desalineado = Q()
+    for campo in reales:
+        desalineado |= ~Q(**{campo: F(f'real_{campo}')})
+
+    corregidos = 0
+    for inicio in range(rango['minimo'], rango['maximo'] + 1, lote):
+        ids = (
+            Hueco.objects.filter(id__gte=inicio, id__lt=inicio + lote)
+            .annotate(**{f'real_{campo}': expresion for campo, expresion in reales.items()})
+            .filter(desalineado)
+            .values('id')
+        )
+        corregidos += Hueco.objects.filter(id__in=ids).update(**reales)
+    return corregidos
@@ -0,0 +1,113 @@
+"""
+Conteos de huecos pre-agregados por celda geohash, a varias precisiones.
+
+Cada hueco activo (status=1, no eliminado) suma 1 en la fila
+(precision, celda, estado) de cada precisión de PRECISIONES_CONTEO. Hueco.save
+aplica la diferencia dentro de la misma transacción, así que contar una caja a
+cualquier zoom es leer unas pocas filas por índice.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Substr
+
+from apps.huecos.services.geocell_service import celdas_para_caja
+
+PRECISIONES_CONTEO = range(1, 9)
+MAX_CELDAS_CONTEO = 64
+
+
+def _aportes(geohash, estado, activo):
+    """Filas (precision, celda, estado) a las que suma 1 un hueco."""
+    if not activo or not geohash:
+        return Counter()
+    return Counter(
+        (precision, geohash[:precision], estado)
+        for precision in PRECISIONES_CONTEO
+        if len(geohash) >= precision
+    )
+
+
+def aplicar_cambio(anterior, actual):
+    """
+    Ajusta los conteos al pasar de `anterior` a `actual`, cada uno una tupla
+    (geohash, estado, activo) o None. Debe llamarse dentro de la transacción
+    que guarda el hueco.
+    """
+    from apps.huecos.models import ConteoGeocelda
+
+    deltas = _aportes(*actual) if actual else Counter()
+    deltas.subtract(_aportes(*anterior) if anterior else Counter())
+
+    for (precision, celda, estado), delta in deltas.items():
+        if delta == 0:
+            continue
+        filtro = {'precision': precision, 'celda': celda, 'estado': estado}
+        if ConteoGeocelda.objects.filter(**filtro).update(total=F('total') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                ConteoGeocelda.objects.create(total=max(delta, 0), **filtro)
+        except IntegrityError:
+            # Otra transacción creó la fila entretanto
+            ConteoGeocelda.objects.filter(**filtro).update(total=F('total') + delta)
+
+
+def contar_en_caja(lat_min, lat_max, lon_min, lon_max, estados=None):
+    """
+    Devuelve {estado: total} de los huecos en la caja. Se cuenta por celdas
+    completas, así que en los bordes se incluyen huecos de hasta una celda
+    (de la precisión elegida) fuera de la caja.
+    """
+    from apps.huecos.models import ConteoGeocelda
+
+    celdas = celdas_para_caja(lat_min, lat_max, lon_min, lon_max, max_celdas=MAX_CELDAS_CONTEO)
+    if celdas == []:
+        return {}  # caja vacía (mínimos mayores que máximos)
+    qs = ConteoGeocelda.objects.filter(total__gt=0)
+    if celdas is None:
+        qs = qs.filter(precision=PRECISIONES_CONTEO[0])
+    else:
+        precision = min(len(celdas[0]), PRECISIONES_CONTEO[-1])
+        qs = qs.filter(precision=precision, celda__in={c[:precision] for c in celdas})
+    if estados is not None:
+        qs = qs.filter(estado__in=estados)
+
+    return {
+        fila['estado']: fila['suma']
+        for fila in qs.values('estado').annotate(suma=Sum('total')).order_by('estado')
+    }
+
+
+def reconstruir_conteos(chunk_size=5000):
+    """
+    Recalcula la tabla desde cero. La agregación la hace la base por precisión
+    y las filas se insertan en lotes mientras se leen.
+    Devuelve el número de filas creadas.
+    """
+    from apps.huecos.models import ConteoGeocelda, Hueco
+
+    activos = Hueco.objects.filter(status=1, is_deleted=False).exclude(geohash="")
+    creadas = 0
+    with transaction.atomic():
+        ConteoGeocelda.objects.all().delete()
+        for precision in PRECISIONES_CONTEO:
+            filas = (
+                activos.annotate(celda=Substr('geohash', 1, precision))
+                .values('celda', 'estado')
+                .annotate(total=Count('id'))
+                .order_by()
+                .iterator(chunk_size=chunk_size)
+            )
+            lote = []
+            for fila in filas:
+                lote.append(ConteoGeocelda(precision=precision, **fila))
+                if len(lote) >= chunk_size:
+                    ConteoGeocelda.objects.bulk_create(lote)
+                    creadas += len(lote)
+                    lote = []
+            if lote:
+                ConteoGeocelda.objects.bulk_create(lote)
+                creadas += len(lote)
+    return creadas
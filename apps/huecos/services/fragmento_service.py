@@ -0,0 +1,135 @@
+"""
+Serialización de huecos en dos capas:
+
+1. Fragmento compartido: todos los campos de HuecoSerializer que no dependen
+   del usuario, guardados en caché como bytes JSON por hueco.
+2. Capa por usuario: is_followed, validado_usuario y mi_confirmacion para
+   toda la página en una sola consulta, más la distancia de cada usuario.
+
+Con todos los fragmentos en caché, una página solo ejecuta la consulta de la
+capa por usuario.
+"""
+import json
+
+from django.db.models import Exists, OuterRef, Subquery
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from apps.core.cache import CacheDosNiveles
+from apps.huecos.models import Confirmacion, Hueco, Suscripcion, ValidacionHueco
+from apps.huecos.services.hueco_service import anotar_para_lista
+
+TTL_FRAGMENTO = 300
+CAMPOS_CAPA_USUARIO = ("is_followed", "validado_usuario", "mi_confirmacion")
+
+cache_fragmentos = CacheDosNiveles("fragmentos_hueco", max_entradas=5000)
+
+
+def clave_fragmento(hueco_id):
+    return f"hueco_frag_{hueco_id}"
+
+
+def invalidar_fragmento(hueco_id):
+    try:
+        cache_fragmentos.delete(clave_fragmento(hueco_id))
+    except Exception as e:
+        print(f"Error al invalidar fragmento del hueco {hueco_id}: {e}")
+
+
+def _fragmentos(ids, request):
+    """{id: dict} con la parte compartida de cada hueco, desde caché o recién serializada."""
+    from apps.huecos.serializers import HuecoCompartidoSerializer
+
+    en_cache = cache_fragmentos.get_many([clave_fragmento(i) for i in ids])
+    fragmentos = {}
+    faltantes = []
+    for id_h in ids:
+        crudo = en_cache.get(clave_fragmento(id_h))
+        if crudo is None:
+            faltantes.append(id_h)
+        else:
+            fragmentos[id_h] = json.loads(crudo)
+
+    if faltantes:
+        huecos = list(anotar_para_lista(Hueco.objects.filter(id__in=faltantes)))
+        datos = HuecoCompartidoSerializer(huecos, many=True, context={"request": request}).data
+        nuevos = {}
+        for hueco, fragmento in zip(huecos, datos):
+            crudo = JSONRenderer().render(fragmento)
+            nuevos[clave_fragmento(hueco.pk)] = crudo
+            fragmentos[hueco.pk] = json.loads(crudo)
+        cache_fragmentos.set_many(nuevos, TTL_FRAGMENTO)
+
+    return fragmentos
+
+
+def _capa_usuario(ids, usuario):
+    """{id: {is_followed, validado_usuario, mi_confirmacion}} con una sola consulta."""
+    if not usuario or not usuario.is_authenticated:
+        return {id_h: {"is_followed": False, "validado_usuario": False, "mi_confirmacion": None} for id_h in ids}
+
+    confirmacion = Confirmacion.objects.filter(
+        hueco=OuterRef("pk"), usuario=usuario, numero_ciclo=OuterRef("numero_ciclos")
+    ).order_by("-id")
+    filas = (
+        Hueco.objects.filter(id__in=ids)
+        .annotate(
+            seguido=Exists(Suscripcion.objects.filter(hueco=OuterRef("pk"), usuario=usuario, status=1)),
+            validado=Exists(ValidacionHueco.objects.filter(hueco=OuterRef("pk"), usuario=usuario)),
+            conf_id=Subquery(confirmacion.values("id")[:1]),
+            conf_estado=Subquery(confirmacion.values("nuevo_estado")[:1]),
+            conf_fecha=Subquery(confirmacion.values("fecha")[:1]),
+        )
+        .values("id", "seguido", "validado", "conf_id", "conf_estado", "conf_fecha")
+    )
+
+    capa = {}
+    for fila in filas:
+        mi_confirmacion = None
+        if fila["conf_id"] is not None:
+            # Mismo formato que ConfirmacionSerializer
+            mi_confirmacion = {
+                "id": fila["conf_id"],
+                "hueco": fila["id"],
+                "usuario": usuario.pk,
+                "usuario_nombre": usuario.username,
+                "nuevo_estado": fila["conf_estado"],
+                "fecha": serializers.DateTimeField().to_representation(fila["conf_fecha"]),
+            }
+        capa[fila["id"]] = {
+            "is_followed": fila["seguido"],
+            "validado_usuario": fila["validado"],
+            "mi_confirmacion": mi_confirmacion,
+        }
+    return capa
+
+
+def serializar_huecos(ids, request, distancias=None, campos=None):
+    """
+    Devuelve la lista serializada (formato de HuecoSerializer) de los huecos
+    `ids`, en ese orden. `distancias` es un dict opcional {id: metros} y
+    `campos` limita la salida a esos campos (por defecto, todos); la capa por
+    usuario solo se consulta si se pide alguno de sus campos.
+    """
+    from apps.huecos.serializers import HuecoSerializer
+
+    ids = list(ids)
+    if not ids:
+        return []
+    campos = campos if campos is not None else HuecoSerializer.Meta.fields
+    fragmentos = _fragmentos(ids, request)
+    capa = {}
+    if any(campo in CAMPOS_CAPA_USUARIO for campo in campos):
+        capa = _capa_usuario([i for i in ids if i in fragmentos], getattr(request, "user", None))
+    distancias = distancias or {}
+
+    resultado = []
+    for id_h in ids:
+        if id_h not in fragmentos:
+            continue  # eliminado entre la búsqueda y la serialización
+        datos = dict(fragmentos[id_h])
+        datos.update(capa.get(id_h, {}))
+        distancia = distancias.get(id_h)
+        datos["distancia_m"] = round(distancia, 2) if distancia is not None else None
+        resultado.append({campo: datos.get(campo) for campo in campos})
+    return resultado
@@ -0,0 +1,195 @@
+"""
+Índice espacial por geohash.
+
+Cada hueco guarda su geohash (ver Hueco.save) en una columna indexada, de modo
+que una búsqueda por radio se reduce a unos pocos prefijos `LIKE 'abc%'`
+en vez de recorrer toda la tabla.
+Este módulo no importa modelos: solo funciones puras sobre coordenadas.
+"""
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODIFICAR = {c: i for i, c in enumerate(_BASE32)}
+
+# Precisión guardada en Hueco.geohash (~4.8 m x 4.8 m)
+PRECISION_GEOHASH = 9
+
+# Metros por grado de latitud (aprox. constante)
+METROS_POR_GRADO = 111_320
+
+
+def codificar(latitud, longitud, precision=PRECISION_GEOHASH):
+    """Codifica lat/lon en un geohash de `precision` caracteres."""
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    geohash = []
+    bits, valor, es_lon = 0, 0, True
+
+    while len(geohash) < precision:
+        if es_lon:
+            medio = (lon_min + lon_max) / 2
+            if longitud >= medio:
+                valor = (valor << 1) | 1
+                lon_min = medio
+            else:
+                valor <<= 1
+                lon_max = medio
+        else:
+            medio = (lat_min + lat_max) / 2
+            if latitud >= medio:
+                valor = (valor << 1) | 1
+                lat_min = medio
+            else:
+                valor <<= 1
+                lat_max = medio
+        es_lon = not es_lon
+        bits += 1
+        if bits == 5:
+            geohash.append(_BASE32[valor])
+            bits, valor = 0, 0
+
+    return "".join(geohash)
+
+
+def limites(geohash):
+    """Devuelve (lat_min, lat_max, lon_min, lon_max) de la celda."""
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    es_lon = True
+
+    for caracter in geohash:
+        valor = _DECODIFICAR[caracter]
+        for desplazamiento in range(4, -1, -1):
+            bit = (valor >> desplazamiento) & 1
+            if es_lon:
+                medio = (lon_min + lon_max) / 2
+                if bit:
+                    lon_min = medio
+                else:
+                    lon_max = medio
+            else:
+                medio = (lat_min + lat_max) / 2
+                if bit:
+                    lat_min = medio
+                else:
+                    lat_max = medio
+            es_lon = not es_lon
+
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def decodificar(geohash):
+    """Devuelve el centro (lat, lon) de la celda."""
+    lat_min, lat_max, lon_min, lon_max = limites(geohash)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def dimensiones_celda(precision):
+    """Devuelve (alto, ancho) en grados de una celda de `precision` caracteres."""
+    bits = 5 * precision
+    bits_lon = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / (1 << bits_lat), 360.0 / (1 << bits_lon)
+
+
+def vecinos(geohash):
+    """Devuelve las 8 celdas vecinas (misma precisión) de `geohash`."""
+    lat, lon = decodificar(geohash)
+    alto, ancho = dimensiones_celda(len(geohash))
+    resultado = []
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            if d_lat == 0 and d_lon == 0:
+                continue
+            lat_v = lat + d_lat * alto
+            if lat_v > 90 or lat_v < -90:
+                continue
+            lon_v = (lon + d_lon * ancho + 180) % 360 - 180
+            vecino = codificar(lat_v, lon_v, len(geohash))
+            if vecino not in resultado:
+                resultado.append(vecino)
+    return resultado
+
+
+def _rango_celdas(lat_min, lat_max, lon_min, lon_max, precision):
+    alto, ancho = dimensiones_celda(precision)
+    return (
+        alto, ancho,
+        math.floor((lat_min + 90) / alto), math.floor((lat_max + 90) / alto),
+        math.floor((lon_min + 180) / ancho), math.floor((lon_max + 180) / ancho),
+    )
+
+
+def indices_celda(latitud, longitud, precision):
+    """(fila, columna) de la celda de `precision` que contiene el punto."""
+    alto, ancho = dimensiones_celda(precision)
+    return math.floor((latitud + 90) / alto), math.floor((longitud + 180) / ancho)
+
+
+def celda_por_indices(fila, columna, precision):
+    """Geohash de la celda (fila, columna); inverso de indices_celda."""
+    alto, ancho = dimensiones_celda(precision)
+    lat_c = min((fila + 0.5) * alto - 90, 90.0)
+    lon_c = ((columna + 0.5) * ancho) % 360 - 180
+    return codificar(lat_c, lon_c, precision)
+
+
+def celdas_en_caja(lat_min, lat_max, lon_min, lon_max, precision):
+    """Celdas de la `precision` dada que cubren la caja."""
+    lat_min, lat_max = max(lat_min, -90.0), min(lat_max, 90.0)
+    _, _, fila_ini, fila_fin, col_ini, col_fin = _rango_celdas(
+        lat_min, lat_max, lon_min, lon_max, precision
+    )
+    celdas = []
+    for fila in range(fila_ini, fila_fin + 1):
+        for col in range(col_ini, col_fin + 1):
+            celda = celda_por_indices(fila, col, precision)
+            if celda not in celdas:
+                celdas.append(celda)
+    return celdas
+
+
+def celdas_para_caja(lat_min, lat_max, lon_min, lon_max, max_celdas=16):
+    """
+    Prefijos geohash que cubren la caja dada, usando la mayor precisión que no
+    supere `max_celdas` celdas. Devuelve None si ni con precisión 1 alcanza
+    (caja demasiado grande: no conviene filtrar).
+    """
+    lat_min, lat_max = max(lat_min, -90.0), min(lat_max, 90.0)
+    if lon_max - lon_min >= 360:
+        return None
+
+    for precision in range(PRECISION_GEOHASH, 0, -1):
+        _, _, fila_ini, fila_fin, col_ini, col_fin = _rango_celdas(
+            lat_min, lat_max, lon_min, lon_max, precision
+        )
+        if (fila_fin - fila_ini + 1) * (col_fin - col_ini + 1) <= max_celdas:
+            return celdas_en_caja(lat_min, lat_max, lon_min, lon_max, precision)
+    return None
+
+
+def caja_del_radio(latitud, longitud, radio_metros):
+    """Caja (lat_min, lat_max, lon_min, lon_max) que contiene el círculo."""
+    # 1% de margen: un grado de latitud mide entre 110.6 y 111.7 km según el elipsoide
+    radio_metros *= 1.01
+    d_lat = radio_metros / METROS_POR_GRADO
+    lat_extremo = min(abs(latitud) + d_lat, 89.9)
+    d_lon = radio_metros / (METROS_POR_GRADO * math.cos(math.radians(lat_extremo)))
+    return latitud - d_lat, latitud + d_lat, longitud - d_lon, longitud + d_lon
+
+
+def celdas_cercanas(latitud, longitud, radio_metros, max_celdas=16):
+    """
+    Prefijos geohash que cubren el círculo (latitud, longitud, radio_metros).
+    Devuelve None cuando el radio es tan grande que no conviene filtrar.
+    """
+    return celdas_para_caja(*caja_del_radio(latitud, longitud, radio_metros), max_celdas=max_celdas)
+
+
+def semidiagonal_m(geohash):
+    """Distancia aproximada (m) del centro de la celda a sus esquinas."""
+    lat, _ = decodificar(geohash)
+    alto, ancho = dimensiones_celda(len(geohash))
+    alto_m = alto * METROS_POR_GRADO
+    ancho_m = ancho * METROS_POR_GRADO * math.cos(math.radians(lat))
+    return math.hypot(alto_m, ancho_m) / 2
@@ -1,28 +1,239 @@
-from geopy.distance import geodesic
-from apps.huecos.models import Hueco, EstadoHueco
+import numpy as np
+from django.db.models import Prefetch, Q
+from apps.core.cache import CacheDosNiveles, calcular_una_vez
+from apps.huecos.models import Hueco, EstadoHueco, Comentario
+from apps.huecos.services.distancia_service import haversine_m
+from apps.huecos.services.geocell_service import (
+    caja_del_radio, celdas_cercanas, celdas_en_caja, codificar, decodificar, semidiagonal_m,
+)
+from apps.huecos.services.indice_service import buscar_en_radio, buscar_k_cercanos
+
+ESTADOS_CERCANOS = [
+    EstadoHueco.PENDIENTE,
+    EstadoHueco.ACTIVO,
+    EstadoHueco.REABIERTO,
+    EstadoHueco.CERRADO,
+    EstadoHueco.EN_REPARACION,
+    EstadoHueco.REPARADO
+]
+
+# (radio máximo del bucket en metros, precisión de la celda que se cachea)
+BUCKETS_RADIO = (
+    (100, 7),
+    (250, 7),
+    (500, 6),
+    (1000, 6),
+    (2000, 5),
+    (5000, 5),
+)
+TTL_CANDIDATOS = 300
+cache_candidatos = CacheDosNiveles("candidatos_cercanos", max_entradas=2000)
+
+# Comentarios que HuecoSerializer incluye por hueco
+ULTIMOS_COMENTARIOS = 3
+
+# Búsqueda de los k más cercanos
+K_MAX = 50
+RADIO_INICIAL_KNN = 250
+RADIO_MAX_KNN = 50_000
+
+
+def prefetch_ultimos_comentarios(cantidad=ULTIMOS_COMENTARIOS):
+    """
+    Prefetch de los últimos `cantidad` comentarios (con su autor) de cada hueco
+    en `hueco.ultimos_comentarios`. Django resuelve el slice con
+    ROW_NUMBER() OVER (PARTITION BY hueco_id): una consulta para toda la página.
+    Solo comentarios activos y no eliminados: comentarios_count no cuenta los eliminados.
+    """
+    return Prefetch(
+        'comentarios',
+        queryset=(
+            Comentario.objects.filter(status=1, is_deleted=False)
+            .select_related('usuario').order_by('-fecha', '-id')[:cantidad]
+        ),
+        to_attr='ultimos_comentarios',
+    )
+
+
+def anotar_para_lista(qs):
+    """
+    Prepara un queryset de huecos para HuecoSerializer: usuario en el mismo
+    JOIN y últimos comentarios precargados. Los conteos ya son columnas de
+    Hueco (comentarios_count, confirmaciones_count).
+    """
+    return qs.select_related('usuario').prefetch_related(prefetch_ultimos_comentarios())
+
+
+def filtrar_por_celdas(qs, latitud, longitud, radio_metros):
+    """
+    Restringe `qs` a los huecos cuyas celdas geohash cubren el círculo.
+    Solo descarta candidatos: la distancia exacta se calcula después.
+    """
+    celdas = celdas_cercanas(latitud, longitud, radio_metros)
+    if celdas is None:
+        return qs
+    filtro = Q()
+    for celda in celdas:
+        filtro |= Q(geohash__startswith=celda)
+    return qs.filter(filtro)
+
 
 def get_huecos_cercanos(latitud, longitud, radio_metros=50):
     """
-    Devuelve huecos cercanos según lat/lon y radio.
+    Devuelve huecos cercanos según lat/lon y radio, ordenados por distancia.
     Retorna lista de tuplas: (Hueco, distancia_en_metros)
     """
     huecos = Hueco.objects.filter(
-        estado__in=[
-            EstadoHueco.PENDIENTE, 
-            EstadoHueco.ACTIVO, 
-            EstadoHueco.REABIERTO, 
-            EstadoHueco.CERRADO,
-            EstadoHueco.EN_REPARACION,
-            EstadoHueco.REPARADO
-        ],
+        estado__in=ESTADOS_CERCANOS,
         status=1,
         is_deleted=False
     )
-    cercanos = []
-    for h in huecos:
-        if not h.latitud or not h.longitud:
+
+    # 0. Índice en memoria: ids y distancias sin consultar la base
+    pares = buscar_en_radio(latitud, longitud, radio_metros)
+    if pares is not None:
+        por_id = huecos.in_bulk([id_h for id_h, _ in pares])
+        return [(por_id[id_h], distancia) for id_h, distancia in pares if id_h in por_id]
+
+    huecos = filtrar_por_celdas(huecos, latitud, longitud, radio_metros)
+
+    # 1. Distancias de todos los candidatos en una sola pasada vectorizada
+    filas = list(huecos.exclude(latitud=0).exclude(longitud=0).values_list('id', 'latitud', 'longitud'))
+    if not filas:
+        return []
+    ids, latitudes, longitudes = (np.array(columna) for columna in zip(*filas))
+    distancias = haversine_m(latitud, longitud, latitudes, longitudes, elipsoide=True)
+
+    # 2. Solo se instancian los huecos que quedan dentro del radio
+    dentro = np.flatnonzero(distancias <= radio_metros)
+    dentro = dentro[np.argsort(distancias[dentro], kind='stable')]
+    por_id = Hueco.objects.in_bulk(ids[dentro].tolist())
+    return [
+        (por_id[int(ids[pos])], float(distancias[pos]))
+        for pos in dentro
+        if int(ids[pos]) in por_id
+    ]
+
+
+def _bucket_radio(radio_metros):
+    for bucket, precision in BUCKETS_RADIO:
+        if radio_metros <= bucket:
+            return bucket, precision
+    return None
+
+
+def _clave_candidatos(celda, bucket):
+    return f"hc_celda_{celda}_{bucket}"
+
+
+def _radio_candidatos(celda, bucket):
+    """Radio desde el centro de la celda que cubre `bucket` desde cualquier punto de ella."""
+    return (bucket + semidiagonal_m(celda)) * 1.01
+
+
+def _candidatos_celda(celda, bucket):
+    """
+    (ids, latitudes, longitudes) de los huecos que pueden estar a menos de
+    `bucket` metros de algún punto de la celda. Se cachea por (celda, bucket)
+    y lo recalcula una sola petición a la vez (ver calcular_una_vez).
+    """
+    return calcular_una_vez(
+        "candidatos_cercanos",
+        _clave_candidatos(celda, bucket),
+        lambda: _calcular_candidatos(celda, bucket),
+        TTL_CANDIDATOS,
+        cache_destino=cache_candidatos,
+    )
+
+
+def _calcular_candidatos(celda, bucket):
+    lat_c, lon_c = decodificar(celda)
+    radio = _radio_candidatos(celda, bucket)
+    huecos = filtrar_por_celdas(
+        Hueco.objects.filter(estado__in=ESTADOS_CERCANOS, status=1, is_deleted=False),
+        lat_c, lon_c, radio,
+    )
+    filas = list(huecos.exclude(latitud=0).exclude(longitud=0).values_list('id', 'latitud', 'longitud'))
+    if filas:
+        ids, latitudes, longitudes = (np.array(columna) for columna in zip(*filas))
+        dentro = haversine_m(lat_c, lon_c, latitudes, longitudes, elipsoide=True) <= radio
+        candidatos = (ids[dentro], latitudes[dentro], longitudes[dentro])
+    else:
+        candidatos = (np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+    return candidatos
+
+
+def get_ids_cercanos(latitud, longitud, radio_metros=50):
+    """
+    Devuelve [(id, distancia_en_metros)] ordenado por distancia.
+    La consulta se ajusta a una celda geohash y un bucket de radio para que
+    usuarios vecinos compartan la lista de candidatos cacheada; la distancia
+    exacta se calcula para cada usuario sobre esa lista.
+    """
+    bucket = _bucket_radio(radio_metros)
+    if bucket is None:
+        return [(h.id, distancia) for h, distancia in get_huecos_cercanos(latitud, longitud, radio_metros)]
+
+    bucket, precision = bucket
+    ids, latitudes, longitudes = _candidatos_celda(codificar(latitud, longitud, precision), bucket)
+    if not len(ids):
+        return []
+    distancias = haversine_m(latitud, longitud, latitudes, longitudes, elipsoide=True)
+    dentro = np.flatnonzero(distancias <= radio_metros)
+    dentro = dentro[np.argsort(distancias[dentro], kind='stable')]
+    return [(int(ids[pos]), float(distancias[pos])) for pos in dentro]
+
+
+def invalidar_cercanos_de(*posiciones):
+    """Borra las listas de candidatos cacheadas que pueden incluir las posiciones."""
+    claves = set()
+    for latitud, longitud in posiciones:
+        if latitud is None or longitud is None:
             continue
-        distancia = geodesic((latitud, longitud), (h.latitud, h.longitud)).meters
-        if distancia <= radio_metros:
-            cercanos.append((h, distancia))
-    return cercanos
\ No newline at end of file
+        for bucket, precision in BUCKETS_RADIO:
+            # Cota del radio de candidatos de cualquier celda de esta precisión
+            radio = _radio_candidatos(codificar(latitud, longitud, precision), bucket)
+            for celda in celdas_en_caja(*caja_del_radio(latitud, longitud, radio), precision):
+                claves.add(_clave_candidatos(celda, bucket))
+    if not claves:
+        return
+    try:
+        cache_candidatos.delete_many(claves)
+    except Exception as e:
+        print(f"Error al invalidar huecos cercanos: {e}")
+
+
+def get_k_cercanos(latitud, longitud, k=10):
+    """
+    Los k huecos activos más cercanos como [(id, distancia_en_metros)], sin
+    depender de un radio. k se limita a K_MAX.
+
+    Usa el índice en memoria; si no está disponible, busca en anillos
+    geohash que duplican el radio hasta juntar k huecos o llegar a
+    RADIO_MAX_KNN (nunca se recorre la tabla completa).
+    """
+    k = max(1, min(int(k), K_MAX))
+
+    pares = buscar_k_cercanos(latitud, longitud, k)
+    if pares is not None:
+        return pares
+
+    activos = Hueco.objects.filter(estado__in=ESTADOS_CERCANOS, status=1, is_deleted=False)
+    radio = RADIO_INICIAL_KNN
+    while True:
+        filas = list(
+            filtrar_por_celdas(activos, latitud, longitud, radio)
+            .exclude(latitud=0).exclude(longitud=0)
+            .values_list('id', 'latitud', 'longitud')
+        )
+        if filas:
+            ids, latitudes, longitudes = (np.array(columna) for columna in zip(*filas))
+            distancias = haversine_m(latitud, longitud, latitudes, longitudes, elipsoide=True)
+            # Solo los que están dentro del radio son seguros: fuera puede haber otros más cerca
+            dentro = np.flatnonzero(distancias <= radio)
+            if len(dentro) >= k or radio >= RADIO_MAX_KNN:
+                dentro = dentro[np.argsort(distancias[dentro], kind='stable')][:k]
+                return [(int(ids[pos]), float(distancias[pos])) for pos in dentro]
+        elif radio >= RADIO_MAX_KNN:
+            return []
+        radio = min(radio * 2, RADIO_MAX_KNN)
@@ -0,0 +1,421 @@
+"""
+Índice en memoria (KD-tree) de los huecos activos, compartido entre workers.
+
+- El árbol se guarda como dos arreglos .npy (puntos en orden del árbol y cajas
+  de cada nodo) que cada worker abre con mmap: el sistema operativo comparte
+  las páginas entre procesos, así que el índice ocupa memoria una sola vez.
+- Los puntos se indexan como vectores unitarios 3D derivados de lat/lon en
+  radianes; la distancia de cuerda conserva el orden de la distancia sobre la
+  esfera y no tiene problemas en el antimeridiano.
+- Los cambios posteriores al snapshot viajan por Redis: cada post_save /
+  post_delete de Hueco incrementa un sello de versión y deja el hueco en un
+  hash de deltas. Los workers solo releen ese hash cuando cambia el sello.
+- `reconstruir_indice` (tarea Celery) genera un snapshot nuevo y descarta los
+  deltas que ya quedaron incluidos.
+
+Las consultas por radio y k-vecinos se resuelven sin tocar Postgres; si el
+índice no está disponible devuelven None y el llamador usa la base de datos.
+"""
+import fcntl
+import glob
+import heapq
+import math
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from apps.core.redis_client import get_redis
+from apps.huecos.services.distancia_service import RADIO_TIERRA_M, haversine_m
+
+CLAVE_VERSION = "indice_huecos:version"
+CLAVE_SNAPSHOT = "indice_huecos:snapshot"
+CLAVE_DELTA = "indice_huecos:delta"
+CLAVE_RECONSTRUYENDO = "indice_huecos:reconstruyendo"
+
+TAMANO_HOJA = 64
+# Con más deltas pendientes que esto se encola una reconstrucción
+MAX_DELTAS = 5000
+# Margen sobre la cuerda esférica; la distancia exacta se filtra después
+MARGEN_ESFERA = 1.01
+
+_DTYPE_PUNTOS = np.dtype([
+    ("id", "<i8"),
+    ("latitud", "<f8"),
+    ("longitud", "<f8"),
+    ("xyz", "<f8", (3,)),
+])
+
+# Publica el snapshot y descarta los deltas con sello <= versión del snapshot
+_LUA_PUBLICAR = """
+redis.call('SET', KEYS[1], ARGV[1])
+local entradas = redis.call('HGETALL', KEYS[2])
+for i = 1, #entradas, 2 do
+    local sello = tonumber(string.match(entradas[i + 1], '^(%d+)|'))
+    if sello and sello <= tonumber(ARGV[1]) then
+        redis.call('HDEL', KEYS[2], entradas[i])
+    end
+end
+return redis.call('INCR', KEYS[3])
+"""
+
+
+def _a_xyz(latitudes, longitudes):
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _cuerda2(radio_metros):
+    """Cuadrado de la cuerda (esfera unitaria) equivalente a `radio_metros`."""
+    angulo = min(radio_metros * MARGEN_ESFERA / RADIO_TIERRA_M, math.pi)
+    return (2 * math.sin(angulo / 2)) ** 2
+
+
+class KDTree:
+    """
+    KD-tree balanceado implícito: el nodo i tiene hijos 2i+1 y 2i+2, y cubre
+    puntos[ini:fin] con corte en (ini + fin) // 2. Solo se guardan los puntos
+    (reordenados) y la caja envolvente de cada nodo.
+    """
+
+    def __init__(self, puntos, cajas):
+        self.puntos = puntos
+        self.cajas = cajas
+        self.profundidad = int(math.log2(len(cajas) + 1)) - 1
+
+    @staticmethod
+    def profundidad_para(n):
+        return max(0, math.ceil(math.log2(max(n, 1) / TAMANO_HOJA)))
+
+    @classmethod
+    def construir(cls, ids, latitudes, longitudes):
+        n = len(ids)
+        puntos = np.empty(n, dtype=_DTYPE_PUNTOS)
+        puntos["id"] = ids
+        puntos["latitud"] = latitudes
+        puntos["longitud"] = longitudes
+        puntos["xyz"] = _a_xyz(latitudes, longitudes) if n else np.empty((0, 3))
+
+        profundidad = cls.profundidad_para(n)
+        cajas = np.empty((2 ** (profundidad + 1) - 1, 2, 3), dtype=np.float64)
+        cajas[:, 0, :] = np.inf
+        cajas[:, 1, :] = -np.inf
+
+        orden = np.arange(n)
+        pila = [(0, 0, n, 0)]
+        while pila:
+            nodo, ini, fin, nivel = pila.pop()
+            if fin <= ini:
+                continue
+            xyz = puntos["xyz"][orden[ini:fin]]
+            cajas[nodo, 0] = xyz.min(axis=0)
+            cajas[nodo, 1] = xyz.max(axis=0)
+            if nivel == profundidad:
+                continue
+            eje = int(np.argmax(cajas[nodo, 1] - cajas[nodo, 0]))
+            medio = (ini + fin) // 2
+            particion = np.argpartition(xyz[:, eje], medio - ini)
+            orden[ini:fin] = orden[ini:fin][particion]
+            pila.append((2 * nodo + 1, ini, medio, nivel + 1))
+            pila.append((2 * nodo + 2, medio, fin, nivel + 1))
+
+        return cls(puntos[orden], cajas)
+
+    def _distancia2_caja(self, nodo, q):
+        bajo, alto = self.cajas[nodo]
+        exceso = np.maximum(np.maximum(bajo - q, q - alto), 0.0)
+        return float(exceso @ exceso)
+
+    def en_radio(self, q, cuerda2):
+        """Índices (posición en self.puntos) a distancia de cuerda² <= cuerda2."""
+        resultado = []
+        pila = [(0, 0, len(self.puntos), 0)]
+        while pila:
+            nodo, ini, fin, nivel = pila.pop()
+            if fin <= ini or self._distancia2_caja(nodo, q) > cuerda2:
+                continue
+            if nivel == self.profundidad:
+                diferencia = self.puntos["xyz"][ini:fin] - q
+                d2 = np.einsum("ij,ij->i", diferencia, diferencia)
+                resultado.append(ini + np.flatnonzero(d2 <= cuerda2))
+                continue
+            medio = (ini + fin) // 2
+            pila.append((2 * nodo + 1, ini, medio, nivel + 1))
+            pila.append((2 * nodo + 2, medio, fin, nivel + 1))
+        return np.concatenate(resultado) if resultado else np.empty(0, dtype=np.int64)
+
+    def k_cercanos(self, q, k):
+        """Índices de los k puntos más cercanos (sin orden garantizado)."""
+        mejores_d2 = np.empty(0)
+        mejores_pos = np.empty(0, dtype=np.int64)
+        frontera = [(0.0, 0, 0, len(self.puntos), 0)]
+        while frontera:
+            d2_caja, nodo, ini, fin, nivel = heapq.heappop(frontera)
+            if len(mejores_d2) == k and d2_caja > mejores_d2.max():
+                break
+            if fin <= ini:
+                continue
+            if nivel == self.profundidad:
+                diferencia = self.puntos["xyz"][ini:fin] - q
+                d2 = np.concatenate((mejores_d2, np.einsum("ij,ij->i", diferencia, diferencia)))
+                pos = np.concatenate((mejores_pos, np.arange(ini, fin)))
+                if len(d2) > k:
+                    corte = np.argpartition(d2, k - 1)[:k]
+                    d2, pos = d2[corte], pos[corte]
+                mejores_d2, mejores_pos = d2, pos
+                continue
+            medio = (ini + fin) // 2
+            for hijo, h_ini, h_fin in ((2 * nodo + 1, ini, medio), (2 * nodo + 2, medio, fin)):
+                if h_fin > h_ini:
+                    heapq.heappush(frontera, (self._distancia2_caja(hijo, q), hijo, h_ini, h_fin, nivel + 1))
+        return mejores_pos
+
+
+# ----------------------------------------------------------------------
+# Snapshots en disco
+# ----------------------------------------------------------------------
+def _ruta(version, parte):
+    return os.path.join(settings.HUECOS_INDICE_DIR, f"v{version}_{parte}.npy")
+
+
+def _guardar_npy(ruta, arreglo):
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        np.save(f, arreglo)
+    os.replace(temporal, ruta)
+
+
+def _leer_huecos_activos():
+    from apps.huecos.models import Hueco
+    from apps.huecos.services.hueco_service import ESTADOS_CERCANOS
+
+    filas = (
+        Hueco.objects.filter(estado__in=ESTADOS_CERCANOS, status=1, is_deleted=False)
+        .values_list("id", "latitud", "longitud")
+        .iterator(chunk_size=10_000)
+    )
+    datos = np.fromiter(filas, dtype=[("id", "<i8"), ("latitud", "<f8"), ("longitud", "<f8")])
+    return datos["id"], datos["latitud"], datos["longitud"]
+
+
+def _escribir_snapshot(version, forzar=False):
+    """Lee los huecos activos de la base y escribe el snapshot `version`."""
+    os.makedirs(settings.HUECOS_INDICE_DIR, exist_ok=True)
+    with open(os.path.join(settings.HUECOS_INDICE_DIR, ".lock"), "w") as candado:
+        # Un solo proceso por máquina construye; los demás esperan y reutilizan
+        fcntl.flock(candado, fcntl.LOCK_EX)
+        if not forzar and os.path.exists(_ruta(version, "cajas")):
+            return
+        arbol = KDTree.construir(*_leer_huecos_activos())
+        _guardar_npy(_ruta(version, "puntos"), arbol.puntos)
+        _guardar_npy(_ruta(version, "cajas"), arbol.cajas)
+
+
+_copias_en_curso = set()
+_candado_copias = threading.Lock()
+
+
+def _copiar_snapshot_local(version):
+    """Construye en segundo plano la copia local del snapshot `version` (una vez por proceso)."""
+    with _candado_copias:
+        if version in _copias_en_curso:
+            return
+        _copias_en_curso.add(version)
+
+    def construir():
+        from django.db import connection
+
+        try:
+            _escribir_snapshot(version)
+        except Exception as e:
+            print(f"Error al construir la copia local del índice v{version}: {e}")
+        finally:
+            connection.close()
+            with _candado_copias:
+                _copias_en_curso.discard(version)
+
+    threading.Thread(target=construir, name=f"indice-v{version}", daemon=True).start()
+
+
+def _cargar_snapshot(version):
+    """
+    Abre el snapshot `version` con mmap. Si otra máquina lo publicó y aquí
+    aún no hay copia local, la construye en segundo plano y devuelve None
+    (mientras tanto las consultas van a la base).
+    """
+    if not os.path.exists(_ruta(version, "cajas")):
+        _copiar_snapshot_local(version)
+        return None
+    return KDTree(
+        np.load(_ruta(version, "puntos"), mmap_mode="r"),
+        np.load(_ruta(version, "cajas"), mmap_mode="r"),
+    )
+
+
+def reconstruir_indice():
+    """
+    Construye un snapshot nuevo desde Postgres y lo publica en Redis.
+    Los cambios que lleguen mientras tanto quedan en el hash de deltas.
+    """
+    r = get_redis()
+    version = int(r.incr(CLAVE_VERSION))
+    _escribir_snapshot(version, forzar=True)
+    r.eval(_LUA_PUBLICAR, 3, CLAVE_SNAPSHOT, CLAVE_DELTA, CLAVE_VERSION, version)
+    r.delete(CLAVE_RECONSTRUYENDO)
+
+    # Los workers que aún tengan abiertos snapshots viejos conservan su mmap
+    vigentes = {_ruta(version, "puntos"), _ruta(version, "cajas")}
+    for ruta in glob.glob(os.path.join(settings.HUECOS_INDICE_DIR, "v*_*.npy")):
+        if ruta not in vigentes:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+    return version
+
+
+def _encolar_reconstruccion(r):
+    if r.set(CLAVE_RECONSTRUYENDO, 1, nx=True, ex=600):
+        from apps.huecos.tasks import reconstruir_indice_huecos
+        try:
+            reconstruir_indice_huecos.delay()
+        except Exception as e:
+            r.delete(CLAVE_RECONSTRUYENDO)
+            print(f"Error al encolar reconstrucción del índice: {e}")
+
+
+# ----------------------------------------------------------------------
+# Cambios incrementales (llamados desde las señales de Hueco)
+# ----------------------------------------------------------------------
+def registrar_cambio(hueco_id, latitud=None, longitud=None, activo=True):
+    """Publica la posición nueva de un hueco (o su baja si activo=False)."""
+    try:
+        r = get_redis()
+        version = int(r.incr(CLAVE_VERSION))
+        posicion = f"{latitud},{longitud}" if activo and latitud is not None and longitud is not None else ""
+        r.hset(CLAVE_DELTA, hueco_id, f"{version}|{posicion}")
+        if r.hlen(CLAVE_DELTA) > MAX_DELTAS:
+            _encolar_reconstruccion(r)
+    except Exception as e:
+        print(f"Error al actualizar índice de huecos: {e}")
+
+
+def registrar_eliminacion(hueco_id):
+    registrar_cambio(hueco_id, activo=False)
+
+
+# ----------------------------------------------------------------------
+# Estado por proceso
+# ----------------------------------------------------------------------
+class _EstadoIndice:
+    def __init__(self):
+        self.candado = threading.Lock()
+        self.version = None
+        self.snapshot = None
+        self.arbol = None
+        # Deltas: ids tocados después del snapshot y posiciones vigentes
+        self.ids_tocados = np.empty(0, dtype=np.int64)
+        self.delta_ids = np.empty(0, dtype=np.int64)
+        self.delta_lat = np.empty(0)
+        self.delta_lon = np.empty(0)
+
+    def cargar_deltas(self, crudos):
+        tocados, ids, lats, lons = [], [], [], []
+        for clave, valor in crudos.items():
+            hueco_id = int(clave)
+            tocados.append(hueco_id)
+            posicion = valor.decode().split("|", 1)[1]
+            if posicion:
+                lat, lon = posicion.split(",")
+                ids.append(hueco_id)
+                lats.append(float(lat))
+                lons.append(float(lon))
+        self.ids_tocados = np.array(sorted(tocados), dtype=np.int64)
+        self.delta_ids = np.array(ids, dtype=np.int64)
+        self.delta_lat = np.array(lats, dtype=np.float64)
+        self.delta_lon = np.array(lons, dtype=np.float64)
+
+
+_estado = _EstadoIndice()
+
+
+def _indice_actual():
+    """Devuelve el estado sincronizado con Redis, o None si no hay índice."""
+    try:
+        r = get_redis()
+        version, snapshot = r.mget(CLAVE_VERSION, CLAVE_SNAPSHOT)
+        if snapshot is None:
+            _encolar_reconstruccion(r)
+            return None
+        with _estado.candado:
+            if snapshot != _estado.snapshot:
+                arbol = _cargar_snapshot(int(snapshot))
+                if arbol is None:
+                    return None
+                _estado.arbol = arbol
+                _estado.snapshot = snapshot
+                _estado.version = None
+            if version != _estado.version:
+                _estado.cargar_deltas(r.hgetall(CLAVE_DELTA))
+                _estado.version = version
+        return _estado
+    except Exception as e:
+        print(f"Índice de huecos no disponible: {e}")
+        return None
+
+
+def _candidatos(estado, posiciones):
+    """Ids/lat/lon del snapshot en `posiciones`, sin los que tienen delta."""
+    puntos = estado.arbol.puntos[posiciones]
+    vigentes = ~np.isin(puntos["id"], estado.ids_tocados)
+    return puntos["id"][vigentes], puntos["latitud"][vigentes], puntos["longitud"][vigentes]
+
+
+def buscar_en_radio(latitud, longitud, radio_metros):
+    """
+    Huecos activos a `radio_metros` o menos, como lista de (id, distancia_m)
+    ordenada por distancia. Devuelve None si el índice no está disponible.
+    """
+    estado = _indice_actual()
+    if estado is None:
+        return None
+
+    q = _a_xyz([latitud], [longitud])[0]
+    ids, lats, lons = _candidatos(estado, estado.arbol.en_radio(q, _cuerda2(radio_metros)))
+    ids = np.concatenate((ids, estado.delta_ids))
+    lats = np.concatenate((lats, estado.delta_lat))
+    lons = np.concatenate((lons, estado.delta_lon))
+    if not len(ids):
+        return []
+
+    distancias = haversine_m(latitud, longitud, lats, lons, elipsoide=True)
+    dentro = np.flatnonzero(distancias <= radio_metros)
+    dentro = dentro[np.argsort(distancias[dentro], kind="stable")]
+    return [(int(ids[i]), float(distancias[i])) for i in dentro]
+
+
+def buscar_k_cercanos(latitud, longitud, k):
+    """
+    Los k huecos activos más cercanos como lista de (id, distancia_m).
+    Devuelve None si el índice no está disponible.
+    """
+    estado = _indice_actual()
+    if estado is None:
+        return None
+
+    q = _a_xyz([latitud], [longitud])[0]
+    # Se piden de más para compensar los que quedan tapados por deltas
+    extra = min(len(estado.ids_tocados), len(estado.arbol.puntos))
+    ids, lats, lons = _candidatos(estado, estado.arbol.k_cercanos(q, k + extra))
+    ids = np.concatenate((ids, estado.delta_ids))
+    lats = np.concatenate((lats, estado.delta_lat))
+    lons = np.concatenate((lons, estado.delta_lon))
+    if not len(ids):
+        return []
+
+    distancias = haversine_m(latitud, longitud, lats, lons, elipsoide=True)
+    orden = np.argsort(distancias, kind="stable")[:k]
+    return [(int(ids[i]), float(distancias[i])) for i in orden]
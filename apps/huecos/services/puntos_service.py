@@ -1,19 +1,22 @@
 from django.db import transaction 
 
 @transaction.atomic
-def registrar_puntos(usuario, cantidad, tipo, descripcion=""):
+def registrar_puntos(usuario, cantidad, tipo, descripcion="", ciudad=None):
     """
     Registra puntos en el historial del usuario.
     El modelo PuntosUsuario.save (models.py:126) se encarga de 
-    actualizar la reputación acumulada y el nivel de confianza.
+    actualizar la reputación acumulada y el nivel de confianza, y de sumar
+    los puntos a los rankings (histórico, por periodo y por `ciudad`).
     """
     from apps.huecos.models import PuntosUsuario  # evitar import circular
+    from apps.huecos.services.ranking_service import normalizar_ciudad
 
     return PuntosUsuario.objects.create(
         usuario=usuario,
         puntos=cantidad,
         tipo=tipo,
         descripcion=descripcion,
+        ciudad=normalizar_ciudad(ciudad),
     )
 
 def evaluar_validaciones_hueco(hueco):
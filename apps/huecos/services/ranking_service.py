@@ -0,0 +1,298 @@
+"""
+Ranking de puntos en sorted sets de Redis (miembro = id del usuario,
+puntaje = suma de sus puntos).
+
+Estructuras:
+- ranking:puntos                      histórico global.
+- ranking:puntos:ciudad:<ciudad>      histórico por ciudad.
+- ranking:puntos:dia:<AAAAMMDD>[:ciudad:<ciudad>]
+                                      buckets diarios, expiran DIAS_RETENCION
+                                      días después de su fecha.
+
+Cada PuntosUsuario nuevo hace ZINCRBY en todas las que le tocan al
+confirmarse la transacción. Los rankings de "últimos N días" se leen de la
+unión (ZUNIONSTORE) de N buckets diarios, rehecha cada TTL_VENTANA segundos.
+Top-N paginado con ZREVRANGE y "mi posición" con ZREVRANK: O(log n).
+
+reconstruir_ranking recorre el historial agregado en la base, carga cada
+estructura en una clave temporal y la publica con RENAME (atómico). Los
+puntos creados mientras tanto se suman a las temporales antes del RENAME.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.text import slugify
+
+from apps.core.cache import calcular_una_vez
+from apps.core.redis_client import get_redis
+
+CLAVE_RANKING = "ranking:puntos"
+PERIODOS = {"semana": 7, "mes": 30}
+MAX_DIAS_VENTANA = 90
+DIAS_RETENCION = MAX_DIAS_VENTANA + 2
+TTL_VENTANA = 60
+TTL_RESPALDO = 30
+
+
+def normalizar_ciudad(ciudad):
+    """Slug con el que se agrupa una ciudad ("Bogotá D.C." → "bogota-dc"), o None."""
+    return slugify(ciudad or "")[:100] or None
+
+
+def _clave_ciudad(ciudad):
+    return f"{CLAVE_RANKING}:ciudad:{ciudad}"
+
+
+def _clave_dia(dia, ciudad=None):
+    clave = f"{CLAVE_RANKING}:dia:{dia:%Y%m%d}"
+    return f"{clave}:ciudad:{ciudad}" if ciudad else clave
+
+
+def _expira_en(dia):
+    """Timestamp en que vence el bucket del día `dia`."""
+    vence = datetime.combine(dia + timedelta(days=DIAS_RETENCION), dt_time.min)
+    return int(timezone.make_aware(vence).timestamp())
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, dt_time.min))
+
+
+def sumar_al_ranking(usuario_id, puntos, ciudad=None, dia=None):
+    """
+    ZINCRBY en el histórico, el bucket del día y, con ciudad, sus equivalentes
+    por ciudad. Se aplica al confirmar la transacción actual.
+    """
+    dia = dia or timezone.localdate()
+
+    def sumar():
+        try:
+            with get_redis().pipeline(transaction=False) as pipe:
+                pipe.zincrby(CLAVE_RANKING, puntos, usuario_id)
+                for clave_dia in [_clave_dia(dia)] + ([_clave_dia(dia, ciudad)] if ciudad else []):
+                    pipe.zincrby(clave_dia, puntos, usuario_id)
+                    pipe.expireat(clave_dia, _expira_en(dia))
+                if ciudad:
+                    pipe.zincrby(_clave_ciudad(ciudad), puntos, usuario_id)
+                pipe.execute()
+        except Exception as e:
+            print(f"Error al actualizar el ranking del usuario {usuario_id}: {e}")
+
+    transaction.on_commit(sumar)
+
+
+def clave_ranking(dias=None, ciudad=None):
+    """
+    Clave del sorted set a consultar: el histórico (global o por ciudad) o,
+    con `dias`, la unión de los buckets de los últimos `dias` días incluido
+    hoy. La unión se rehace cada TTL_VENTANA segundos por una sola petición
+    (calcular_una_vez); mientras tanto las demás leen la anterior.
+    """
+    if not dias:
+        return _clave_ciudad(ciudad) if ciudad else CLAVE_RANKING
+
+    hoy = timezone.localdate()
+    destino = f"{CLAVE_RANKING}:ventana:{dias}:{ciudad or '_'}:{hoy:%Y%m%d}"
+
+    def unir():
+        buckets = [_clave_dia(hoy - timedelta(days=i), ciudad) for i in range(dias)]
+        with get_redis().pipeline() as pipe:
+            pipe.zunionstore(destino, buckets)
+            # Vive lo mismo que el valor vencido que todavía se puede servir
+            pipe.expire(destino, TTL_VENTANA * 2)
+            pipe.execute()
+        return destino
+
+    return calcular_una_vez("ranking_ventana", f"ranking_ventana_{destino}", unir, TTL_VENTANA, lease=5)
+
+
+class RankingRedis:
+    """
+    Vista perezosa del ranking como secuencia ordenada de mayor a menor:
+    len() es ZCARD y cada slice un ZREVRANGE, así que los paginadores de DRF
+    la recorren sin traer el set completo.
+    Cada elemento es (usuario_id, puntos).
+    """
+
+    def __init__(self, clave=CLAVE_RANKING):
+        self.clave = clave
+
+    def count(self):
+        return get_redis().zcard(self.clave)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice) or indice.step not in (None, 1):
+            raise TypeError("RankingRedis solo admite slices contiguos.")
+        inicio = indice.start or 0
+        fin = indice.stop if indice.stop is not None else 0
+        if fin <= inicio:
+            return []
+        filas = get_redis().zrevrange(self.clave, inicio, fin - 1, withscores=True)
+        return [(int(miembro), int(puntaje)) for miembro, puntaje in filas]
+
+
+def ranking_existe():
+    try:
+        return bool(get_redis().exists(CLAVE_RANKING))
+    except Exception as e:
+        print(f"Error al consultar el ranking: {e}")
+        return False
+
+
+def posicion_de(usuario_id, clave=CLAVE_RANKING):
+    """(posicion, puntos) del usuario (posición desde 1), o None si no está en el ranking."""
+    r = get_redis()
+    with r.pipeline(transaction=False) as pipe:
+        pipe.zrevrank(clave, usuario_id)
+        pipe.zscore(clave, usuario_id)
+        rango, puntaje = pipe.execute()
+    if rango is None:
+        return None
+    return rango + 1, int(puntaje)
+
+
+def _totales_en_base(dias=None, ciudad=None):
+    from apps.huecos.models import PuntosUsuario
+
+    qs = PuntosUsuario.objects.filter(is_deleted=False)
+    if dias:
+        qs = qs.filter(fecha__gte=_inicio_del_dia(timezone.localdate() - timedelta(days=dias - 1)))
+    if ciudad:
+        qs = qs.filter(ciudad=ciudad)
+    return qs.values('usuario_id').annotate(total=Sum('puntos'))
+
+
+def ranking_en_base(dias=None, ciudad=None):
+    """Mismo ranking calculado en la base (respaldo mientras los sets no existen)."""
+    return _totales_en_base(dias, ciudad).order_by('-total', 'usuario_id').values_list('usuario_id', 'total')
+
+
+def ranking_de_respaldo(dias=None, ciudad=None):
+    """
+    ranking_en_base como lista, cacheada TTL_RESPALDO segundos y calculada
+    por una sola petición a la vez: mientras se reconstruyen los sets, todas
+    las peticiones caerían a la base al mismo tiempo.
+    """
+    return calcular_una_vez(
+        "ranking_respaldo",
+        f"ranking_respaldo_{dias or '_'}_{ciudad or '_'}",
+        lambda: list(ranking_en_base(dias, ciudad)),
+        TTL_RESPALDO,
+        lease=30,
+    )
+
+
+def posicion_en_base(usuario_id, dias=None, ciudad=None):
+    """Como posicion_de, pero con consultas a la base."""
+    totales = _totales_en_base(dias, ciudad)
+    propios = list(totales.filter(usuario_id=usuario_id).order_by().values_list('total', flat=True))
+    if not propios:
+        return None
+    propio = propios[0]
+    return totales.filter(total__gt=propio).count() + 1, propio
+
+
+def _cargar(r, filas, sufijo, lote):
+    """
+    Carga filas (clave, usuario_id, puntos) en claves `clave + sufijo`, un
+    ZADD por bloque de `lote` miembros. Devuelve las claves cargadas.
+    """
+    bloques = defaultdict(dict)
+    cargadas = set()
+    for clave, usuario_id, puntos in filas:
+        cargadas.add(clave)
+        bloques[clave][usuario_id] = puntos
+        if len(bloques[clave]) >= lote:
+            r.zadd(clave + sufijo, bloques.pop(clave))
+    for clave, bloque in bloques.items():
+        r.zadd(clave + sufijo, bloque)
+    return cargadas
+
+
+def reconstruir_ranking(lote=5000):
+    """
+    Recalcula los rankings desde PuntosUsuario: histórico global y por ciudad,
+    y los buckets diarios aún vigentes. Las sumas las hace la base y se leen
+    en bloques (.iterator); cada estructura se arma en una clave temporal que
+    reemplaza a la actual con RENAME, y las que quedaron sin filas se borran.
+    Solo se leen los puntos hasta el id más alto al empezar; los posteriores
+    hicieron su ZINCRBY en las claves que el RENAME reemplaza, así que se
+    vuelven a sumar a las temporales en la misma transacción del RENAME.
+    Devuelve el número de usuarios en el ranking histórico.
+    """
+    from apps.huecos.models import PuntosUsuario
+
+    tope = PuntosUsuario.objects.aggregate(tope=Max('id'))['tope'] or 0
+    puntos = PuntosUsuario.objects.filter(is_deleted=False, id__lte=tope).order_by()
+    con_ciudad = puntos.exclude(ciudad=None)
+    desde = _inicio_del_dia(timezone.localdate() - timedelta(days=DIAS_RETENCION - 1))
+
+    def sumas(qs, *grupo):
+        filas = qs.values(*grupo).annotate(total=Sum('puntos')).values_list(*grupo, 'total')
+        return filas.iterator(chunk_size=lote)
+
+    def por_dia(qs, *grupo):
+        return sumas(qs.filter(fecha__gte=desde).annotate(dia=TruncDate('fecha')), 'dia', *grupo)
+
+    fuentes = [
+        ((CLAVE_RANKING, u, t) for u, t in sumas(puntos, 'usuario_id')),
+        ((_clave_ciudad(c), u, t) for c, u, t in sumas(con_ciudad, 'ciudad', 'usuario_id')),
+        ((_clave_dia(d), u, t) for d, u, t in por_dia(puntos, 'usuario_id')),
+        ((_clave_dia(d, c), u, t) for d, c, u, t in por_dia(con_ciudad, 'ciudad', 'usuario_id')),
+    ]
+
+    r = get_redis()
+    sufijo = f":reconstruyendo:{time.time_ns()}"
+    cargadas = set()
+    try:
+        for filas in fuentes:
+            cargadas |= _cargar(r, filas, sufijo, lote)
+
+        recientes = defaultdict(lambda: defaultdict(int))
+        filas = PuntosUsuario.objects.filter(is_deleted=False, id__gt=tope).values_list(
+            'usuario_id', 'puntos', 'ciudad', 'fecha'
+        )
+        for usuario_id, valor, ciudad, fecha in filas.iterator(chunk_size=lote):
+            claves = [CLAVE_RANKING] + ([_clave_ciudad(ciudad)] if ciudad else [])
+            if fecha >= desde:
+                dia = timezone.localdate(fecha)
+                claves += [_clave_dia(dia)] + ([_clave_dia(dia, ciudad)] if ciudad else [])
+            for clave in claves:
+                recientes[clave][usuario_id] += valor
+        cargadas |= set(recientes)
+
+        # Claves que ya no tienen filas (ciudades o días sin puntos); las
+        # uniones por ventana se dejan vencer solas (clave_ranking las referencia)
+        existentes = (clave.decode() for clave in r.scan_iter(f"{CLAVE_RANKING}:*", count=1000))
+        sobrantes = [
+            clave for clave in existentes
+            if ":reconstruyendo:" not in clave and ":ventana:" not in clave and clave not in cargadas
+        ]
+        with r.pipeline() as pipe:
+            for clave, sumas in recientes.items():
+                for usuario_id, valor in sumas.items():
+                    pipe.zincrby(clave + sufijo, valor, usuario_id)
+            for clave in cargadas:
+                pipe.rename(clave + sufijo, clave)
+                if ":dia:" in clave:
+                    dia = datetime.strptime(clave.split(":dia:")[1][:8], "%Y%m%d").date()
+                    pipe.expireat(clave, _expira_en(dia))
+            if CLAVE_RANKING not in cargadas:
+                pipe.delete(CLAVE_RANKING)
+            if sobrantes:
+                pipe.delete(*sobrantes)
+            pipe.zcard(CLAVE_RANKING)
+            total = pipe.execute()[-1]
+        cargadas = set()
+    finally:
+        if cargadas:
+            r.delete(*(clave + sufijo for clave in cargadas))
+    return total
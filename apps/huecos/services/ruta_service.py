@@ -0,0 +1,233 @@
+"""
+Huecos a lo largo de una ruta (polyline codificada) dentro de un corredor.
+
+1. La ruta se decodifica y se proyecta a metros (equirectangular local).
+2. Índice de segmentos: cada celda geohash de PRECISION_RUTA guarda los
+   segmentos cuyo corredor la toca. Esas celdas filtran los candidatos
+   (índice de geohash), en consultas de a LOTE_CELDAS celdas.
+3. Cada candidato solo se compara con los segmentos de su celda; distancia
+   punto-segmento vectorizada con numpy.
+
+El resultado se ordena por distancia recorrida sobre la ruta. Las rutas de
+más de MAX_LARGO_RUTA_M o que cubren más de MAX_CELDAS_RUTA celdas se
+rechazan (RutaDemasiadoLarga), igual que las que cruzan el meridiano 180: las
+celdas y la proyección no dan la vuelta.
+"""
+import itertools
+import math
+
+import numpy as np
+from django.db.models import Q
+
+from apps.huecos.models import Hueco
+from apps.huecos.services.distancia_service import RADIO_TIERRA_M
+from apps.huecos.services.geocell_service import (
+    METROS_POR_GRADO, caja_del_radio, celda_por_indices, dimensiones_celda, indices_celda,
+)
+
+PRECISION_RUTA = 6
+ANCHO_MAX_M = 500
+MAX_PUNTOS_RUTA = 5000
+MAX_LARGO_RUTA_M = 500_000
+# Una recta de 500 km con el corredor más ancho toca ~2100 celdas; el resto es
+# margen para rutas que zigzaguean
+MAX_CELDAS_RUTA = 5000
+# Celdas recorridas al armar el índice, contando repeticiones: una ruta normal
+# de 500 km recorre ~70 000; cerca de los polos las celdas se angostan y un
+# corredor que va y viene puede recorrer millones sin sumar celdas nuevas
+MAX_VISITAS_RUTA = 50 * MAX_CELDAS_RUTA
+LOTE_CELDAS = 500
+
+
+class RutaDemasiadoLarga(ValueError):
+    """La ruta supera MAX_LARGO_RUTA_M o MAX_CELDAS_RUTA, o cruza el meridiano 180."""
+
+
+def largo_ruta_m(puntos):
+    """Largo de la ruta en metros (haversine por segmento)."""
+    if len(puntos) < 2:
+        return 0.0
+    ruta = np.radians(np.array(puntos, dtype=np.float64))
+    d_lat = np.diff(ruta[:, 0])
+    d_lon = np.diff(ruta[:, 1])
+    a = np.sin(d_lat / 2) ** 2 + np.cos(ruta[:-1, 0]) * np.cos(ruta[1:, 0]) * np.sin(d_lon / 2) ** 2
+    return float((2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).sum())
+
+
+def decodificar_polyline(texto, precision=5):
+    """Decodifica una polyline codificada (algoritmo de Google) en [(lat, lon)]."""
+    factor = 10 ** precision
+    puntos = []
+    indice = lat = lon = 0
+    largo = len(texto)
+    while indice < largo:
+        deltas = []
+        for _ in range(2):
+            resultado = desplazamiento = 0
+            while True:
+                if indice >= largo:
+                    raise ValueError("Polyline truncada.")
+                byte = ord(texto[indice]) - 63
+                indice += 1
+                resultado |= (byte & 0x1F) << desplazamiento
+                desplazamiento += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(resultado >> 1) if resultado & 1 else resultado >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        puntos.append((lat / factor, lon / factor))
+    return puntos
+
+
+def codificar_polyline(puntos, precision=5):
+    """Inverso de decodificar_polyline (útil para pruebas y benchmarks)."""
+    factor = 10 ** precision
+    salida = []
+    previo = (0, 0)
+    for lat, lon in puntos:
+        actual = (round(lat * factor), round(lon * factor))
+        for valor in (actual[0] - previo[0], actual[1] - previo[1]):
+            valor = ~(valor << 1) if valor < 0 else valor << 1
+            while valor >= 0x20:
+                salida.append(chr((0x20 | (valor & 0x1F)) + 63))
+                valor >>= 5
+            salida.append(chr(valor + 63))
+        previo = actual
+    return "".join(salida)
+
+
+def _indice_segmentos(puntos, ancho_m):
+    """
+    Índice de segmentos por celda: devuelve (celdas, filas, columnas, segmentos)
+    donde la celda k (geohash celdas[k], índices filas[k]/columnas[k]) contiene
+    los segmentos segmentos[k], cuyo corredor la toca. Lanza RutaDemasiadoLarga
+    apenas el corredor pasa de MAX_CELDAS_RUTA celdas (o de MAX_VISITAS_RUTA
+    celdas recorridas).
+    """
+    alto, ancho_celda = dimensiones_celda(PRECISION_RUTA)
+    paso_grados = min(alto, ancho_celda)
+    mapa = {}
+    visitas = 0
+    for i, ((lat_a, lon_a), (lat_b, lon_b)) in enumerate(zip(puntos, puntos[1:])):
+        # Los segmentos largos se cubren por tramos para no tomar toda su caja
+        tramos = max(1, math.ceil(max(abs(lat_b - lat_a), abs(lon_b - lon_a)) / paso_grados))
+        for t in range(tramos):
+            f0, f1 = t / tramos, (t + 1) / tramos
+            lats = (lat_a + (lat_b - lat_a) * f0, lat_a + (lat_b - lat_a) * f1)
+            lons = (lon_a + (lon_b - lon_a) * f0, lon_a + (lon_b - lon_a) * f1)
+            lat_min, _, lon_min, _ = caja_del_radio(min(lats), min(lons), ancho_m)
+            _, lat_max, _, lon_max = caja_del_radio(max(lats), max(lons), ancho_m)
+            fila_ini, col_ini = indices_celda(lat_min, lon_min, PRECISION_RUTA)
+            fila_fin, col_fin = indices_celda(lat_max, lon_max, PRECISION_RUTA)
+            visitas += (fila_fin - fila_ini + 1) * (col_fin - col_ini + 1)
+            if visitas > MAX_VISITAS_RUTA:
+                raise RutaDemasiadoLarga("El corredor de la ruta es demasiado grande.")
+            for fila in range(fila_ini, fila_fin + 1):
+                for col in range(col_ini, col_fin + 1):
+                    segmentos = mapa.get((fila, col))
+                    if segmentos is None:
+                        if len(mapa) >= MAX_CELDAS_RUTA:
+                            raise RutaDemasiadoLarga("El corredor de la ruta es demasiado grande.")
+                        segmentos = mapa[(fila, col)] = []
+                    if not segmentos or segmentos[-1] != i:
+                        segmentos.append(i)
+
+    claves = sorted(mapa)
+    return (
+        [celda_por_indices(fila, col, PRECISION_RUTA) for fila, col in claves],
+        np.array([fila for fila, _ in claves], dtype=np.int64),
+        np.array([col for _, col in claves], dtype=np.int64),
+        [mapa[clave] for clave in claves],
+    )
+
+
+def huecos_en_ruta(puntos, ancho_m):
+    """
+    Huecos activos a menos de `ancho_m` metros de la ruta `puntos` [(lat, lon)].
+    Devuelve dicts {id, lat, lon, estado, gravedad, distancia_m,
+    distancia_ruta_m} ordenados por distancia recorrida sobre la ruta.
+    Lanza RutaDemasiadoLarga si la ruta supera MAX_LARGO_RUTA_M, su
+    corredor cubre más de MAX_CELDAS_RUTA celdas o cruza el meridiano 180.
+    """
+    from apps.huecos.services.hueco_service import ESTADOS_CERCANOS
+
+    # Un salto de más de 180° de longitud es el camino corto por el otro lado
+    if any(abs(b[1] - a[1]) > 180 for a, b in zip(puntos, puntos[1:])):
+        raise RutaDemasiadoLarga("La ruta no puede cruzar el meridiano 180.")
+    if largo_ruta_m(puntos) > MAX_LARGO_RUTA_M:
+        raise RutaDemasiadoLarga(f"La ruta no puede medir más de {MAX_LARGO_RUTA_M // 1000} km.")
+    if len(puntos) == 1:
+        puntos = puntos * 2
+    celdas, filas_celda, columnas_celda, segmentos = _indice_segmentos(puntos, ancho_m)
+
+    activos = Hueco.objects.filter(estado__in=ESTADOS_CERCANOS, status=1, is_deleted=False)
+    filas = []
+    for inicio_lote in range(0, len(celdas), LOTE_CELDAS):
+        filtro = Q()
+        for celda in celdas[inicio_lote:inicio_lote + LOTE_CELDAS]:
+            filtro |= Q(geohash__startswith=celda)
+        filas.extend(activos.filter(filtro).values_list('id', 'latitud', 'longitud', 'estado', 'gravedad'))
+    if not filas:
+        return []
+    ids, lats, lons, estados, gravedades = zip(*filas)
+    lats = np.array(lats)
+    lons = np.array(lons)
+
+    # Celda de cada candidato (misma aritmética que el índice) → sus segmentos
+    alto, ancho_celda = dimensiones_celda(PRECISION_RUTA)
+    ancho_clave = int(columnas_celda.max()) + 1
+    claves_celda = filas_celda * ancho_clave + columnas_celda
+    claves_punto = (
+        np.floor((lats + 90) / alto).astype(np.int64) * ancho_clave
+        + np.floor((lons + 180) / ancho_celda).astype(np.int64)
+    )
+    pos = np.minimum(np.searchsorted(claves_celda, claves_punto), len(claves_celda) - 1)
+    con_celda = np.flatnonzero(claves_celda[pos] == claves_punto)
+    celda_de_punto = pos[con_celda]
+
+    # Pares (candidato, segmento) que comparten celda, sin bucles de Python
+    largos = np.array([len(s) for s in segmentos])
+    inicio = np.concatenate(([0], np.cumsum(largos)[:-1]))
+    planos = np.fromiter(itertools.chain.from_iterable(segmentos), dtype=np.int64, count=int(largos.sum()))
+    por_punto = largos[celda_de_punto]
+    if not por_punto.sum():
+        return []
+    idx_punto = np.repeat(con_celda, por_punto)
+    desplazamiento = np.arange(por_punto.sum()) - np.repeat(np.cumsum(por_punto) - por_punto, por_punto)
+    idx_segmento = planos[np.repeat(inicio[celda_de_punto], por_punto) + desplazamiento]
+
+    # Proyección local a metros alrededor de la latitud media de la ruta
+    ruta = np.array(puntos)
+    cos_lat = math.cos(math.radians(ruta[:, 0].mean()))
+    ruta_xy = np.column_stack((ruta[:, 1] * cos_lat, ruta[:, 0])) * METROS_POR_GRADO
+    cand = np.column_stack((lons * cos_lat, lats)) * METROS_POR_GRADO
+
+    a = ruta_xy[:-1]
+    ab = ruta_xy[1:] - a
+    largo2 = (ab ** 2).sum(axis=1)
+    acumulado = np.concatenate(([0.0], np.cumsum(np.sqrt(largo2))))
+
+    ap = cand[idx_punto] - a[idx_segmento]
+    ab_par = ab[idx_segmento]
+    l2 = largo2[idx_segmento]
+    t = np.clip(np.divide((ap * ab_par).sum(axis=1), l2, out=np.zeros_like(l2), where=l2 > 0), 0, 1)
+    distancias = np.hypot(*(ap - ab_par * t[:, None]).T)
+    a_lo_largo = acumulado[idx_segmento] + t * np.sqrt(l2)
+
+    # Por candidato, el segmento más cercano (orden por punto y luego distancia)
+    orden = np.lexsort((distancias, idx_punto))
+    primeros = orden[np.r_[True, idx_punto[orden][1:] != idx_punto[orden][:-1]]]
+    primeros = primeros[distancias[primeros] <= ancho_m]
+    primeros = primeros[np.argsort(a_lo_largo[primeros], kind='stable')]
+
+    resultado = []
+    for par in primeros:
+        i = idx_punto[par]
+        resultado.append({
+            'id': ids[i], 'lat': lats[i].item(), 'lon': lons[i].item(),
+            'estado': estados[i], 'gravedad': gravedades[i],
+            'distancia_m': round(float(distancias[par]), 2),
+            'distancia_ruta_m': round(float(a_lo_largo[par]), 1),
+        })
+    return resultado
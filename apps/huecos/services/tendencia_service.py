@@ -0,0 +1,194 @@
+"""
+Huecos en tendencia: interacciones recientes con decaimiento exponencial.
+
+Cada interacción (vista de un visitante nuevo en el día, validación,
+confirmación, comentario) suma PESOS[tipo] al hueco en dos sorted sets: el
+de su celda geohash de PRECISION_TENDENCIA y el de su ciudad. El puntaje de
+una interacción vale la mitad cada VIDA_MEDIA segundos. "Cerca de mí" lee la
+celda del usuario y sus 8 vecinas (claves_cercanas) y mezcla los mejores de
+cada una.
+
+En lugar de recalcular todo periódicamente, el peso se guarda escalado a una
+época por set (decaimiento "hacia adelante"): se suma
+peso * e^(λ·(t - época)), así todos los miembros comparten el mismo factor
+e^(-λ·(ahora - época)) y el orden del set ya es el de los puntajes
+decaídos. El feed es un ZREVRANGE por set, O(log n + k), y el factor de cada
+set se aplica al leer, lo que hace comparables los puntajes de sets
+distintos. Para que los exponentes no crezcan sin límite, la primera
+escritura después de REBASAR_CADA segundos reescala el set a la época actual
+(ZUNIONSTORE con WEIGHTS, en el mismo script) y borra lo que ya no pesa.
+"""
+import heapq
+import math
+import time
+
+from django.db import transaction
+
+from apps.core.redis_client import get_redis
+from apps.huecos.models import EstadoHueco, Hueco
+from apps.huecos.services.geocell_service import codificar, vecinos
+
+PRECISION_TENDENCIA = 5  # celdas de ~4.9 x 4.9 km
+VIDA_MEDIA = 6 * 3600
+LAMBDA = math.log(2) / VIDA_MEDIA
+PESOS = {"vista": 1, "comentario": 3, "confirmacion": 4, "validacion": 5}
+REBASAR_CADA = 7 * 24 * 3600
+PUNTAJE_MINIMO = 0.05
+MAX_MIEMBROS = 2000
+# Un set sin escrituras en este tiempo ya no tiene nada que pese
+TTL_TENDENCIA = REBASAR_CADA + 24 * 3600
+MAX_LIMITE = 50
+# Solo huecos aún abiertos en la vía
+ESTADOS_TENDENCIA = [
+    EstadoHueco.PENDIENTE,
+    EstadoHueco.ACTIVO,
+    EstadoHueco.REABIERTO,
+    EstadoHueco.EN_REPARACION,
+]
+
+_SUMAR = """
+local ahora = tonumber(ARGV[3])
+local lambda = tonumber(ARGV[4])
+local epoca = tonumber(redis.call('get', KEYS[2]))
+if not epoca or redis.call('exists', KEYS[1]) == 0 then
+    epoca = ahora
+    redis.call('set', KEYS[2], ARGV[3])
+elseif ahora - epoca > tonumber(ARGV[5]) then
+    local factor = string.format('%.17g', math.exp(-lambda * (ahora - epoca)))
+    redis.call('zunionstore', KEYS[1], 1, KEYS[1], 'WEIGHTS', factor)
+    redis.call('zremrangebyscore', KEYS[1], '-inf', '(' .. ARGV[6])
+    redis.call('zremrangebyrank', KEYS[1], 0, -tonumber(ARGV[7]) - 1)
+    epoca = ahora
+    redis.call('set', KEYS[2], ARGV[3])
+end
+local escalado = tonumber(ARGV[2]) * math.exp(lambda * (ahora - epoca))
+redis.call('zincrby', KEYS[1], string.format('%.17g', escalado), ARGV[1])
+redis.call('expire', KEYS[1], ARGV[8])
+redis.call('expire', KEYS[2], ARGV[8])
+return 1
+"""
+
+
+def clave_celda(geohash):
+    return f"tendencias:celda:{geohash[:PRECISION_TENDENCIA]}"
+
+
+def claves_cercanas(latitud, longitud):
+    """Claves de la celda que contiene el punto y de sus 8 vecinas."""
+    celda = codificar(latitud, longitud, PRECISION_TENDENCIA)
+    return [clave_celda(c) for c in [celda, *vecinos(celda)]]
+
+
+def clave_ciudad(ciudad):
+    return f"tendencias:ciudad:{ciudad}"
+
+
+def _clave_epoca(clave):
+    return f"{clave}:epoca"
+
+
+def claves_de_hueco(hueco):
+    from apps.huecos.services.ranking_service import normalizar_ciudad
+
+    geohash = hueco.geohash or codificar(hueco.latitud, hueco.longitud)
+    claves = [clave_celda(geohash)]
+    ciudad = normalizar_ciudad(hueco.ciudad)
+    if ciudad:
+        claves.append(clave_ciudad(ciudad))
+    return claves
+
+
+def registrar_interaccion(hueco, tipo):
+    """Suma la interacción `tipo` (ver PESOS) al confirmarse la transacción actual."""
+    claves = claves_de_hueco(hueco)
+    hueco_id = hueco.pk
+
+    def sumar():
+        try:
+            r = get_redis()
+            ahora = time.time()
+            with r.pipeline(transaction=False) as pipe:
+                for clave in claves:
+                    pipe.eval(
+                        _SUMAR, 2, clave, _clave_epoca(clave),
+                        hueco_id, PESOS[tipo], ahora, LAMBDA, REBASAR_CADA,
+                        PUNTAJE_MINIMO, MAX_MIEMBROS, TTL_TENDENCIA,
+                    )
+                pipe.execute()
+        except Exception as e:
+            print(f"Error al actualizar la tendencia del hueco {hueco_id}: {e}")
+
+    transaction.on_commit(sumar)
+
+
+def _leer(tramos):
+    """
+    {clave: [(hueco_id, puntaje decaído a ahora)]} de los tramos
+    {clave: (desde, hasta)}, leídos en una sola transacción.
+    """
+    claves = list(tramos)
+    with get_redis().pipeline() as pipe:
+        for clave in claves:
+            desde, hasta = tramos[clave]
+            pipe.get(_clave_epoca(clave))
+            pipe.zrevrange(clave, desde, hasta, withscores=True)
+        respuestas = pipe.execute()
+    ahora = time.time()
+    leidos = {}
+    for clave, epoca, miembros in zip(claves, respuestas[::2], respuestas[1::2]):
+        if epoca is None:
+            leidos[clave] = []
+            continue
+        factor = math.exp(-LAMBDA * (ahora - float(epoca)))
+        leidos[clave] = [(int(miembro), puntaje * factor) for miembro, puntaje in miembros]
+    return leidos
+
+
+def huecos_en_tendencia(claves, limite=20):
+    """
+    Los `limite` huecos abiertos con mayor puntaje entre los sets `claves`
+    (una clave o una lista). Cada set se lee por tramos desde su tope y se
+    deja de leer cuando su siguiente puntaje ya no entra en el resultado.
+    Los huecos que ya no están abiertos (cerrados, reparados, rechazados,
+    eliminados) se quitan de su set al encontrarlos.
+    """
+    if isinstance(claves, str):
+        claves = [claves]
+    tamano = 2 * limite
+    desde = {clave: 0 for clave in claves}
+    # Último puntaje leído de cada set que aún puede tener más miembros
+    pendientes = {}
+    candidatos = []
+    while desde:
+        leidos = _leer({clave: (inicio, inicio + tamano - 1) for clave, inicio in desde.items()})
+        activos = set(
+            Hueco.objects.filter(
+                id__in=[hueco_id for tramo in leidos.values() for hueco_id, _ in tramo],
+                status=1, is_deleted=False, estado__in=ESTADOS_TENDENCIA,
+            ).values_list("id", flat=True)
+        )
+        for clave, tramo in leidos.items():
+            inactivos = [hueco_id for hueco_id, _ in tramo if hueco_id not in activos]
+            quitados = 0
+            if inactivos:
+                try:
+                    quitados = get_redis().zrem(clave, *inactivos)
+                except Exception as e:
+                    print(f"Error al limpiar la tendencia {clave}: {e}")
+            candidatos.extend((puntaje, hueco_id) for hueco_id, puntaje in tramo if hueco_id in activos)
+            if len(tramo) < tamano:
+                desde.pop(clave)
+                pendientes.pop(clave, None)
+            else:
+                # Los quitados corren el resto del set hacia arriba
+                desde[clave] += tamano - quitados
+                pendientes[clave] = tramo[-1][1]
+
+        mejores = heapq.nlargest(limite, candidatos)
+        if len(mejores) == limite:
+            # Lo que falta leer de cada set puntúa a lo sumo su último leído
+            corte = mejores[-1][0]
+            for clave in [clave for clave, ultimo in pendientes.items() if ultimo <= corte]:
+                desde.pop(clave)
+                pendientes.pop(clave)
+    return [(hueco_id, puntaje) for puntaje, hueco_id in heapq.nlargest(limite, candidatos)]
@@ -0,0 +1,154 @@
+"""
+Tiles del mapa (esquema XYZ / Web Mercator) con agrupación en el servidor.
+
+- Zoom bajo: los huecos del tile se agrupan por prefijo de geohash (en SQL),
+  devolviendo por grupo el centroide, el total y los conteos por estado y
+  gravedad.
+- Zoom alto (>= ZOOM_DETALLE): se devuelve cada hueco con sus campos mínimos.
+
+Cada tile se cachea con su clave z/x/y y solo se invalida cuando cambia un
+hueco que cae dentro de él (ver invalidar_tiles_de).
+"""
+import math
+from collections import defaultdict
+
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import Substr
+
+from apps.core.cache import CacheDosNiveles
+from apps.huecos.models import Hueco
+from apps.huecos.services.geocell_service import celdas_para_caja, PRECISION_GEOHASH
+
+ZOOM_MAX = 20
+ZOOM_DETALLE = 15
+# Cada tile agrupado se divide en ~2^BITS_GRUPO x 2^BITS_GRUPO grupos
+BITS_GRUPO = 3
+TTL_TILE = 60 * 60 * 24
+LAT_MAX_MERCATOR = 85.05112878
+
+cache_tiles = CacheDosNiveles("tiles", max_entradas=2000)
+
+
+def clave_tile(z, x, y):
+    return f"hueco_tile_{z}_{x}_{y}"
+
+
+def limites_tile(z, x, y):
+    """Devuelve (lat_min, lat_max, lon_min, lon_max) del tile."""
+    n = 2 ** z
+    lon_min = x / n * 360.0 - 180.0
+    lon_max = (x + 1) / n * 360.0 - 180.0
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def tile_de(latitud, longitud, z):
+    """Tile (x, y) que contiene el punto en el zoom z."""
+    n = 2 ** z
+    latitud = max(min(latitud, LAT_MAX_MERCATOR), -LAT_MAX_MERCATOR)
+    x = int((longitud + 180.0) / 360.0 * n)
+    lat_rad = math.radians(latitud)
+    y = int((1 - math.asinh(math.tan(lat_rad)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _precision_grupo(z):
+    """Precisión de geohash cuyas celdas miden ~1/2^BITS_GRUPO del tile."""
+    return max(1, min(PRECISION_GEOHASH, round(2 * (z + BITS_GRUPO) / 5)))
+
+
+def _huecos_del_tile(z, x, y):
+    from apps.huecos.services.hueco_service import ESTADOS_CERCANOS
+
+    lat_min, lat_max, lon_min, lon_max = limites_tile(z, x, y)
+    qs = Hueco.objects.filter(
+        estado__in=ESTADOS_CERCANOS,
+        status=1,
+        is_deleted=False,
+        latitud__gte=lat_min,
+        latitud__lt=lat_max,
+        longitud__gte=lon_min,
+        longitud__lt=lon_max,
+    )
+    # Prefijos geohash para aprovechar el índice; el rango lat/lon es el filtro exacto
+    celdas = celdas_para_caja(lat_min, lat_max, lon_min, lon_max, max_celdas=32)
+    if celdas is not None:
+        filtro = Q()
+        for celda in celdas:
+            filtro |= Q(geohash__startswith=celda)
+        qs = qs.filter(filtro)
+    return qs
+
+
+def _tile_agrupado(qs, z):
+    filas = (
+        qs.annotate(grupo=Substr('geohash', 1, _precision_grupo(z)))
+        .values('grupo', 'estado', 'gravedad')
+        .annotate(total=Count('id'), lat=Avg('latitud'), lon=Avg('longitud'))
+    )
+
+    grupos = defaultdict(lambda: {
+        'total': 0, 'suma_lat': 0.0, 'suma_lon': 0.0,
+        'estados': defaultdict(int), 'gravedades': defaultdict(int),
+    })
+    for fila in filas:
+        g = grupos[fila['grupo']]
+        g['total'] += fila['total']
+        g['suma_lat'] += fila['lat'] * fila['total']
+        g['suma_lon'] += fila['lon'] * fila['total']
+        g['estados'][fila['estado']] += fila['total']
+        g['gravedades'][fila['gravedad']] += fila['total']
+
+    return [
+        {
+            'lat': round(g['suma_lat'] / g['total'], 6),
+            'lon': round(g['suma_lon'] / g['total'], 6),
+            'total': g['total'],
+            'estados': dict(g['estados']),
+            'gravedades': dict(g['gravedades']),
+        }
+        for g in grupos.values()
+    ]
+
+
+def _tile_detalle(qs):
+    return [
+        {'id': id_h, 'lat': lat, 'lon': lon, 'estado': estado, 'gravedad': gravedad}
+        for id_h, lat, lon, estado, gravedad in qs.values_list(
+            'id', 'latitud', 'longitud', 'estado', 'gravedad'
+        )
+    ]
+
+
+def obtener_tile(z, x, y):
+    """Devuelve el contenido del tile z/x/y (desde caché si está disponible)."""
+    clave = clave_tile(z, x, y)
+    datos = cache_tiles.get(clave)
+    if datos is not None:
+        return datos
+
+    qs = _huecos_del_tile(z, x, y)
+    if z >= ZOOM_DETALLE:
+        datos = {'z': z, 'x': x, 'y': y, 'huecos': _tile_detalle(qs)}
+    else:
+        datos = {'z': z, 'x': x, 'y': y, 'grupos': _tile_agrupado(qs, z)}
+
+    cache_tiles.set(clave, datos, TTL_TILE)
+    return datos
+
+
+def invalidar_tiles_de(*posiciones):
+    """Borra de la caché los tiles (todos los zooms) que contienen las posiciones."""
+    claves = set()
+    for latitud, longitud in posiciones:
+        if latitud is None or longitud is None:
+            continue
+        for z in range(ZOOM_MAX + 1):
+            claves.add(clave_tile(z, *tile_de(latitud, longitud, z)))
+    if not claves:
+        return
+    try:
+        cache_tiles.delete_many(claves)
+    except Exception as e:
+        print(f"Error al invalidar tiles: {e}")
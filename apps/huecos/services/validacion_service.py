@@ -26,11 +26,11 @@ def procesar_validacion(hueco, usuario, voto):
         if voto:
             hueco.validaciones_positivas += peso
             # Puntos para el validador
-            registrar_puntos(usuario, 2, "confirmacion", f"Confirmación positiva de hueco #{hueco.id}")
+            registrar_puntos(usuario, 2, "confirmacion", f"Confirmación positiva de hueco #{hueco.id}", ciudad=hueco.ciudad)
         else:
             hueco.validaciones_negativas += peso
             # Puntos para el validador
-            registrar_puntos(usuario, 1, "confirmacion", f"Validación negativa de hueco #{hueco.id}")
+            registrar_puntos(usuario, 1, "confirmacion", f"Validación negativa de hueco #{hueco.id}", ciudad=hueco.ciudad)
         
         hueco.save(update_fields=['validaciones_positivas', 'validaciones_negativas'])
 
@@ -64,12 +64,12 @@ def evaluar_y_actualizar_estado_hueco(hueco):
         hueco.save(update_fields=['estado'])
         
         # Premiar al autor del reporte real
-        registrar_puntos(autor, 10, "verificacion", f"Hueco #{hueco.id} verificado por la comunidad")
+        registrar_puntos(autor, 10, "verificacion", f"Hueco #{hueco.id} verificado por la comunidad", ciudad=hueco.ciudad)
         
         # Premiar (bono extra) a los validadores que acertaron
         for v in hueco.validaciones.filter(voto=True):
             if v.usuario != autor:
-                registrar_puntos(v.usuario, 3, "confirmacion", f"Bono por validación correcta de hueco #{hueco.id}")
+                registrar_puntos(v.usuario, 3, "confirmacion", f"Bono por validación correcta de hueco #{hueco.id}", ciudad=hueco.ciudad)
         
         # Notificar al autor
         notificar_validacion_final(hueco, es_positivo=True)
@@ -79,12 +79,12 @@ def evaluar_y_actualizar_estado_hueco(hueco):
         hueco.save(update_fields=['estado'])
         
         # Penalizar al autor del reporte falso
-        registrar_puntos(autor, -15, "reporte_falso", f"Hueco #{hueco.id} rechazado como falso")
+        registrar_puntos(autor, -15, "reporte_falso", f"Hueco #{hueco.id} rechazado como falso", ciudad=hueco.ciudad)
         
         # Premiar a los validadores que detectaron la falsedad
         for v in hueco.validaciones.filter(voto=False):
             if v.usuario != autor:
-                registrar_puntos(v.usuario, 2, "confirmacion", f"Bono por detectar reporte falso #{hueco.id}")
+                registrar_puntos(v.usuario, 2, "confirmacion", f"Bono por detectar reporte falso #{hueco.id}", ciudad=hueco.ciudad)
         
         # Notificar al autor
         notificar_validacion_final(hueco, es_positivo=False)
@@ -0,0 +1,273 @@
+"""
+Vistas de huecos acumuladas en Redis y volcadas a la base por lotes.
+
+registrar_vista hace HINCRBY en el hash HASH_VISTAS (campo = id del hueco).
+volcar_vistas lo renombra de forma atómica a una clave de volcado: las vistas
+que llegan después crean un hash nuevo, así que ninguna se pierde. El hash
+renombrado se recorre con HSCAN; cada bloque se borra (HDEL) y se suma con
+un solo UPDATE ... FROM (VALUES ...), y si el UPDATE falla se devuelve al
+hash. Si el proceso muere a mitad, el siguiente volcado encuentra la clave
+con SCAN y termina lo que falta; un bloque nunca se suma dos veces (a lo
+sumo se pierde el que estaba entre el HDEL y el UPDATE).
+
+Visitantes únicos: cada vista agrega al visitante (usuario o IP) a dos
+HyperLogLog, uno histórico por hueco y otro por hueco y día (error estándar
+de ~0.81 %, a lo sumo 12 KB por clave sin importar cuántos visitantes), y
+marca el par hueco-día en el set SUCIOS_UNICOS. volcar_unicos saca esos
+pares con SPOP, lee PFCOUNT y escribe el valor absoluto en
+Hueco.vistas_unicas y VistaDiariaHueco: repetir un volcado no suma dos veces.
+"""
+import time
+from datetime import date, datetime
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.redis_client import get_redis
+from apps.huecos.models import Hueco, VistaDiariaHueco
+
+HASH_VISTAS = "huecos:vistas"
+# RENAME solo si hay algo que volcar (sin la respuesta de error de RENAME)
+_LUA_RENOMBRAR = "if redis.call('exists', KEYS[1]) == 1 then redis.call('rename', KEYS[1], KEYS[2]) return 1 end return 0"
+# Contadores sueltos de la versión anterior (clave de django.core.cache)
+PATRON_LEGADO = "*hueco_vistas_*"
+SUCIOS_UNICOS = "huecos:unicos:sucios"
+# El HLL diario vive lo suficiente para que el volcado del día siguiente lo lea
+TTL_UNICOS_DIA = 3 * 24 * 3600
+
+
+def _prefijo_volcado(clave):
+    return f"{clave}:volcando:"
+
+
+def clave_unicos(hueco_id, dia=None):
+    if dia is None:
+        return f"huecos:unicos:{hueco_id}"
+    return f"huecos:unicos:{hueco_id}:dia:{dia:%Y%m%d}"
+
+
+def identificador_visitante(request):
+    """Usuario autenticado o, si no hay, la IP de la petición."""
+    usuario = getattr(request, "user", None)
+    if usuario is not None and usuario.is_authenticated:
+        return f"u:{usuario.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def registrar_vista(hueco_id, visitante=None):
+    """
+    Suma una vista al hueco y, con `visitante`, lo agrega a sus visitantes
+    únicos. Devuelve (vistas pendientes de volcar, visitantes únicos, si el
+    visitante es nuevo hoy); todo None si Redis no responde y la vista se
+    escribió directo en la base.
+    """
+    try:
+        r = get_redis()
+        with r.pipeline(transaction=False) as pipe:
+            pipe.hincrby(HASH_VISTAS, hueco_id, 1)
+            if visitante is not None:
+                hoy = timezone.localdate()
+                pipe.pfadd(clave_unicos(hueco_id), visitante)
+                pipe.pfadd(clave_unicos(hueco_id, hoy), visitante)
+                pipe.expire(clave_unicos(hueco_id, hoy), TTL_UNICOS_DIA)
+                pipe.sadd(SUCIOS_UNICOS, f"{hueco_id}:{hoy:%Y%m%d}")
+                pipe.pfcount(clave_unicos(hueco_id))
+            resultados = pipe.execute()
+        if visitante is None:
+            return resultados[0], None, None
+        return resultados[0], resultados[-1], bool(resultados[2])
+    except Exception as e:
+        print(f"Error al registrar la vista del hueco {hueco_id}: {e}")
+        Hueco.objects.filter(pk=hueco_id).update(vistas=F('vistas') + 1)
+        return None, None, None
+
+
+def sumar_vistas(deltas):
+    """Aplica {hueco_id: vistas} con un UPDATE. Devuelve las filas actualizadas."""
+    if not deltas:
+        return 0
+    if connection.vendor != "postgresql":
+        return sum(
+            Hueco.objects.filter(pk=hueco_id).update(vistas=F('vistas') + delta)
+            for hueco_id, delta in deltas.items()
+        )
+    tabla = connection.ops.quote_name(Hueco._meta.db_table)
+    valores = ", ".join(["(%s, %s)"] * len(deltas))
+    parametros = [valor for par in deltas.items() for valor in par]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {tabla} AS h SET vistas = h.vistas + v.delta "
+            f"FROM (VALUES {valores}) AS v(id, delta) WHERE h.id = v.id",
+            parametros,
+        )
+        return cursor.rowcount
+
+
+def _devolver(r, clave, deltas):
+    """Devuelve {hueco_id: vistas} al hash `clave` para un volcado posterior."""
+    with r.pipeline(transaction=False) as pipe:
+        for hueco_id, vistas in deltas.items():
+            pipe.hincrby(clave, hueco_id, vistas)
+        pipe.execute()
+
+
+def _volcar_hash(r, clave, lote):
+    """Vuelca un hash de volcado (ya sin escrituras) y lo borra."""
+    actualizados = 0
+    cursor = 0
+    while True:
+        cursor, campos = r.hscan(clave, cursor, count=lote)
+        deltas = {int(hueco_id): int(vistas) for hueco_id, vistas in campos.items() if int(vistas)}
+        if campos:
+            r.hdel(clave, *campos)
+        if deltas:
+            try:
+                with transaction.atomic():
+                    actualizados += sumar_vistas(deltas)
+            except Exception:
+                _devolver(r, clave, deltas)
+                raise
+        if cursor == 0:
+            break
+    r.delete(clave)
+    return actualizados
+
+
+def _volcar_legado(r, lote):
+    """
+    Suma y borra (GET + DELETE en MULTI) los contadores sueltos de la versión
+    anterior. Si el UPDATE falla, el bloque pasa a HASH_VISTAS.
+    """
+    actualizados = 0
+    claves = []
+
+    def volcar_bloque():
+        with r.pipeline() as pipe:
+            for clave in claves:
+                pipe.get(clave)
+                pipe.delete(clave)
+            resultados = pipe.execute()[::2]
+        deltas = {}
+        for clave, valor in zip(claves, resultados):
+            hueco_id = clave.rsplit("_", 1)[-1]
+            if hueco_id.isdigit() and valor and int(valor) > 0:
+                deltas[int(hueco_id)] = deltas.get(int(hueco_id), 0) + int(valor)
+        try:
+            with transaction.atomic():
+                return sumar_vistas(deltas)
+        except Exception:
+            _devolver(r, HASH_VISTAS, deltas)
+            raise
+
+    for clave in r.scan_iter(PATRON_LEGADO, count=lote):
+        claves.append(clave.decode())
+        if len(claves) >= lote:
+            actualizados += volcar_bloque()
+            claves = []
+    if claves:
+        actualizados += volcar_bloque()
+    return actualizados
+
+
+def volcar_vistas(lote=5000, clave=HASH_VISTAS):
+    """
+    Vuelca a Hueco.vistas las vistas acumuladas en `clave`, incluidos los
+    volcados que quedaron a medias. Devuelve el número de huecos actualizados.
+    """
+    r = get_redis()
+    prefijo = _prefijo_volcado(clave)
+    pendientes = [pendiente.decode() for pendiente in r.scan_iter(f"{prefijo}*", count=1000)]
+    nueva = f"{prefijo}{time.time_ns()}"
+    if r.eval(_LUA_RENOMBRAR, 2, clave, nueva):
+        pendientes.append(nueva)
+
+    actualizados = sum(_volcar_hash(r, pendiente, lote) for pendiente in pendientes)
+    if clave == HASH_VISTAS:
+        actualizados += _volcar_legado(r, lote)
+    return actualizados
+
+
+def _guardar_unicos(totales, por_dia):
+    """
+    Escribe los conteos de los HLL: GREATEST en Hueco.vistas_unicas (si Redis
+    perdiera una clave, el total ya volcado no retrocede) y upsert por día.
+    """
+    if totales:
+        if connection.vendor == "postgresql":
+            tabla = connection.ops.quote_name(Hueco._meta.db_table)
+            valores = ", ".join(["(%s, %s)"] * len(totales))
+            parametros = [valor for par in totales.items() for valor in par]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {tabla} AS h SET vistas_unicas = GREATEST(h.vistas_unicas, v.unicos) "
+                    f"FROM (VALUES {valores}) AS v(id, unicos) WHERE h.id = v.id",
+                    parametros,
+                )
+        else:
+            for hueco_id, unicos in totales.items():
+                Hueco.objects.filter(pk=hueco_id, vistas_unicas__lt=unicos).update(vistas_unicas=unicos)
+    existentes = set(Hueco.objects.filter(pk__in={hueco_id for hueco_id, _ in por_dia}).values_list("pk", flat=True))
+    VistaDiariaHueco.objects.bulk_create(
+        [
+            VistaDiariaHueco(hueco_id=hueco_id, fecha=dia, vistas_unicas=unicos)
+            for (hueco_id, dia), unicos in por_dia.items()
+            if hueco_id in existentes
+        ],
+        update_conflicts=True,
+        unique_fields=["hueco", "fecha"],
+        update_fields=["vistas_unicas"],
+    )
+
+
+def volcar_unicos(lote=1000):
+    """
+    Vuelca los visitantes únicos de los pares hueco-día marcados desde el
+    último volcado. Una vista que llega después del SPOP vuelve a marcar su
+    par, así que entra en el siguiente. Devuelve los pares volcados.
+    """
+    r = get_redis()
+    volcados = 0
+    while True:
+        marcados = r.spop(SUCIOS_UNICOS, lote)
+        if not marcados:
+            break
+        pares = []
+        for marcado in marcados:
+            hueco_id, dia = marcado.decode().split(":")
+            pares.append((int(hueco_id), datetime.strptime(dia, "%Y%m%d").date()))
+        huecos = sorted({hueco_id for hueco_id, _ in pares})
+        with r.pipeline(transaction=False) as pipe:
+            for hueco_id in huecos:
+                pipe.pfcount(clave_unicos(hueco_id))
+            for hueco_id, dia in pares:
+                pipe.pfcount(clave_unicos(hueco_id, dia))
+            conteos = pipe.execute()
+        totales = dict(zip(huecos, conteos[:len(huecos)]))
+        por_dia = dict(zip(pares, conteos[len(huecos):]))
+        try:
+            with transaction.atomic():
+                _guardar_unicos(totales, {par: unicos for par, unicos in por_dia.items() if unicos})
+        except Exception:
+            # Se vuelven a marcar para el siguiente volcado
+            r.sadd(SUCIOS_UNICOS, *marcados)
+            raise
+        volcados += len(pares)
+        if len(marcados) < lote:
+            break
+    return volcados
+
+
+def unicos_por_dia(hueco_id, dias=30):
+    """[(fecha, visitantes únicos)] de los últimos `dias` días, incluido hoy (con lo aún no volcado)."""
+    hoy = timezone.localdate()
+    desde = date.fromordinal(hoy.toordinal() - dias + 1)
+    serie = dict(
+        VistaDiariaHueco.objects.filter(hueco_id=hueco_id, fecha__gte=desde)
+        .values_list("fecha", "vistas_unicas")
+    )
+    try:
+        serie[hoy] = max(serie.get(hoy, 0), get_redis().pfcount(clave_unicos(hueco_id, hoy)))
+    except Exception as e:
+        print(f"Error al leer los visitantes únicos del hueco {hueco_id}: {e}")
+    return sorted(serie.items())
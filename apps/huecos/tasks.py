@@ -1,6 +1,8 @@
 from celery import shared_task
 from firebase_admin import messaging
 
+from apps.core.tareas import tarea_unica
+
 @shared_task
 def enviar_notificaciones_push(tokens, titulo, mensaje):
     """
@@ -76,29 +78,59 @@ def optimizar_imagen_hueco_task(hueco_id):
         print(f"[CELERY ERROR] Optimizando imagen de hueco {hueco_id}: {e}")
 
 @shared_task
+@tarea_unica(lease=120)
 def sincronizar_vistas_redis():
     """
-    Sincroniza las vistas cacheadas en Redis hacia la Base de Datos.
-    Idealmente ejecutado cada 5-10 minutos vía Celery Beat.
+    Vuelca a la base las vistas acumuladas en Redis (ver vistas_service).
+    Programada cada 5 minutos (config/settings/celery.py).
+    """
+    from apps.huecos.services.vistas_service import volcar_vistas
+    total = volcar_vistas()
+    print(f"[VISTAS] {total} huecos actualizados.")
+    return total
+
+@shared_task
+@tarea_unica(lease=120)
+def sincronizar_vistas_unicas():
+    """
+    Vuelca a Hueco.vistas_unicas y VistaDiariaHueco los visitantes únicos
+    (HyperLogLog en Redis, ver vistas_service). Programada cada 5 minutos.
+    """
+    from apps.huecos.services.vistas_service import volcar_unicos
+    total = volcar_unicos()
+    print(f"[VISTAS] {total} pares hueco-día de visitantes únicos volcados.")
+    return total
+
+@shared_task
+@tarea_unica(lease=300)
+def reconstruir_indice_huecos():
+    """
+    Regenera el snapshot del índice espacial en memoria (KD-tree) y lo
+    publica para todos los workers. Ver services/indice_service.py.
     """
+    from apps.huecos.services.indice_service import reconstruir_indice
+    version = reconstruir_indice()
+    print(f"[INDICE] Snapshot v{version} publicado.")
+    return version
+
+@shared_task
+@tarea_unica(lease=300)
+def reconstruir_ranking_puntos():
+    """Recalcula el sorted set del ranking desde PuntosUsuario (ver ranking_service)."""
     from django.core.cache import cache
-    from apps.huecos.models import Hueco
-    import redis
-    from django.conf import settings
-    from django.db.models import F
-    
+    from apps.huecos.services.ranking_service import reconstruir_ranking
     try:
-        # Obtenemos el cliente subyacente de redis si está disponible
-        r = redis.Redis.from_url(settings.CACHES['default']['LOCATION'] if 'redis' in str(settings.CACHES['default'].get('BACKEND', '')) else 'redis://localhost:6379/1')
-        keys = r.keys("hueco_vistas_*")
-        
-        for key_bytes in keys:
-            key = key_bytes.decode('utf-8')
-            hueco_id_str = key.split('_')[-1]
-            if hueco_id_str.isdigit():
-                vistas = int(r.get(key) or 0)
-                if vistas > 0:
-                    Hueco.objects.filter(id=hueco_id_str).update(vistas=F('vistas') + vistas)
-                    r.set(key, 0) # reiniciar contador
-    except Exception as e:
-        print(f"[CELERY ERROR] Sincronizando vistas: {e}")
+        total = reconstruir_ranking()
+        print(f"[RANKING] {total} usuarios en el ranking.")
+        return total
+    finally:
+        cache.delete("ranking_reconstruccion_encolada")
+
+@shared_task
+@tarea_unica(lease=300)
+def reconciliar_contadores_huecos():
+    """Corrige comentarios_count / confirmaciones_count desalineados (ver contador_service)."""
+    from apps.huecos.services.contador_service import reconciliar_contadores
+    corregidos = reconciliar_contadores()
+    print(f"[CONTADORES] {corregidos} huecos corregidos.")
+    return corregidos
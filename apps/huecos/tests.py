@@ -1,3 +1,80 @@
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
-# Create your tests here.
+from apps.huecos.models import Comentario, Confirmacion, EstadoHueco, Hueco, Suscripcion, ValidacionHueco
+from apps.huecos.serializers import CAMPOS_COMPACTOS, HuecoCompactoSerializer, HuecoSerializer
+from apps.huecos.services.hueco_service import anotar_para_lista
+from apps.usuarios.models import User
+
+
+class HuecoListSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lector = User.objects.create(username="lector", email="lector@huecoapp.local")
+        autor = User.objects.create(username="autor", email="autor@huecoapp.local")
+        vecino = User.objects.create(username="vecino", email="vecino@huecoapp.local")
+
+        for i in range(25):
+            hueco = Hueco.objects.create(
+                usuario=autor,
+                latitud=4.60 + i * 0.001,
+                longitud=-74.08,
+                estado=EstadoHueco.ACTIVO,
+                numero_ciclos=1,
+            )
+            for n in range(4):
+                Comentario.objects.create(hueco=hueco, usuario=vecino, texto=f"comentario {n}")
+            Confirmacion.objects.create(hueco=hueco, usuario=vecino, numero_ciclo=1, nuevo_estado=EstadoHueco.CERRADO)
+            if i % 2:
+                Suscripcion.objects.create(hueco=hueco, usuario=cls.lector)
+                ValidacionHueco.objects.create(hueco=hueco, usuario=cls.lector, voto=True)
+                Confirmacion.objects.create(
+                    hueco=hueco, usuario=cls.lector, numero_ciclo=1, nuevo_estado=EstadoHueco.REPARADO
+                )
+            if i % 3 == 0:
+                # De un ciclo anterior: no es la confirmación actual
+                Confirmacion.objects.create(
+                    hueco=hueco, usuario=cls.lector, numero_ciclo=0, nuevo_estado=EstadoHueco.CERRADO
+                )
+
+    def _contexto(self, params=None):
+        request = Request(APIRequestFactory().get("/", params))
+        request.user = self.lector
+        return {"request": request}
+
+    def _serializar(self, cantidad):
+        qs = anotar_para_lista(Hueco.objects.order_by("id"))[:cantidad]
+        return HuecoSerializer(qs, many=True, context=self._contexto()).data
+
+    def test_consultas_constantes_sin_importar_el_tamano_de_pagina(self):
+        # huecos + últimos comentarios + suscripciones + validaciones + confirmaciones
+        with self.assertNumQueries(5):
+            pequena = self._serializar(5)
+        with self.assertNumQueries(5):
+            grande = self._serializar(25)
+        self.assertEqual(len(pequena), 5)
+        self.assertEqual(len(grande), 25)
+
+    def test_lote_igual_a_serializar_uno_por_uno(self):
+        contexto = self._contexto()
+        esperado = [
+            HuecoSerializer(hueco, context=contexto).data
+            for hueco in Hueco.objects.order_by("id")
+        ]
+        self.assertEqual(self._serializar(25), esperado)
+        self.assertEqual(
+            HuecoSerializer(Hueco.objects.order_by("id"), many=True, context=contexto).data,
+            esperado,
+        )
+
+    def test_vista_compacta_sin_campos_caros(self):
+        with self.assertNumQueries(1):
+            datos = HuecoCompactoSerializer(Hueco.objects.order_by("id"), many=True, context=self._contexto({"vista": "compacta"})).data
+        self.assertEqual(set(datos[0]), set(CAMPOS_COMPACTOS))
+
+        contexto = self._contexto({"fields": "id,estado", "expand": "mi_confirmacion"})
+        with self.assertNumQueries(2):
+            datos = HuecoCompactoSerializer(Hueco.objects.order_by("id"), many=True, context=contexto).data
+        self.assertEqual(list(datos[1]), ["id", "estado", "mi_confirmacion"])
+        self.assertEqual(datos[1]["mi_confirmacion"]["usuario"], self.lector.pk)
@@ -1,16 +1,19 @@
+import math
+
 from rest_framework import viewsets, status, serializers
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from django.db import models
 from django.utils.timezone import now
 from rest_framework.pagination import LimitOffsetPagination
 from django.core.cache import cache
 from rest_framework.decorators import action
 from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.db.models import Q
 from rest_framework.generics import ListAPIView
-from geopy.distance import geodesic
+
+from apps.core.pagination import CursorDistanciaPagination, CursorPagination, PaginacionCursorMixin
 
 
 from .models import (
@@ -19,17 +22,61 @@ from .models import (
     EstadoHueco, DenunciaHueco
 )
 from .serializers import (
-    HuecoSerializer, ConfirmacionSerializer,
+    HuecoSerializer, HuecoCompactoSerializer, campos_solicitados, ConfirmacionSerializer,
     ComentarioSerializer, PuntosUsuarioSerializer,
     ValidacionHuecoSerializer, DenunciaHuecoSerializer
 )
 
-from apps.huecos.services.hueco_service import get_huecos_cercanos
+from apps.huecos.services.hueco_service import (
+    ESTADOS_CERCANOS, K_MAX, anotar_para_lista, get_huecos_cercanos, get_ids_cercanos, get_k_cercanos,
+)
+from apps.huecos.services.fragmento_service import serializar_huecos
+from apps.huecos.services.distancia_service import distancia_m
 from apps.huecos.services.puntos_service import registrar_puntos
 from apps.huecos.services.validacion_service import procesar_validacion
+from apps.huecos.services.tile_service import obtener_tile, ZOOM_MAX
+from apps.huecos.services.vistas_service import identificador_visitante, registrar_vista, unicos_por_dia
+from apps.huecos.services.conteo_service import contar_en_caja
+from apps.huecos.services.tendencia_service import (
+    MAX_LIMITE, clave_ciudad, claves_cercanas, huecos_en_tendencia, registrar_interaccion,
+)
+from apps.huecos.services.ranking_service import (
+    MAX_DIAS_VENTANA, PERIODOS, RankingRedis, clave_ranking, normalizar_ciudad,
+    posicion_de, posicion_en_base, ranking_de_respaldo, ranking_existe,
+)
+from apps.huecos.tasks import reconstruir_ranking_puntos
+from apps.usuarios.models import User
+from apps.huecos.services.ruta_service import (
+    ANCHO_MAX_M, MAX_PUNTOS_RUTA, RutaDemasiadoLarga, decodificar_polyline, huecos_en_ruta,
+)
 
 
-class HuecoViewSet(viewsets.ModelViewSet):
+class CamposHuecoMixin:
+    """
+    Campos dispersos en las lecturas de huecos: ?fields=, ?expand= o
+    ?vista=compacta usan HuecoCompactoSerializer (ver campos_solicitados) y
+    evitan precargar comentarios si no se piden.
+    """
+
+    def campos_pedidos(self):
+        if self.request.method != 'GET':
+            return None
+        return campos_solicitados(self.request.query_params)
+
+    def get_serializer_class(self):
+        if self.campos_pedidos() is not None:
+            return HuecoCompactoSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        campos = self.campos_pedidos()
+        if campos is not None and 'comentarios' not in campos:
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+
+class HuecoViewSet(CamposHuecoMixin, PaginacionCursorMixin, viewsets.ModelViewSet):
     """
     ViewSet principal de huecos:
     - Crea nuevos reportes
@@ -37,25 +84,23 @@ class HuecoViewSet(viewsets.ModelViewSet):
     - Asigna puntos y registra historial automáticamente
     - Limita a 20 reportes diarios por usuario
     """
-    queryset = Hueco.objects.filter(status=1, is_deleted=False).order_by('-fecha_reporte')
+    queryset = anotar_para_lista(Hueco.objects.filter(status=1, is_deleted=False)).order_by('-fecha_reporte')
     serializer_class = HuecoSerializer
     permission_classes = [IsAuthenticated]
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         
-        # Incrementar vistas (Redis optimizado)
-        try:
-            cache_key = f"hueco_vistas_{instance.id}"
-            try:
-                cache.incr(cache_key)
-            except ValueError:
-                cache.set(cache_key, 1, timeout=None)
-            instance.vistas += 1 
-        except Exception:
-            # Fallback
-            instance.vistas += 1
-            instance.save(update_fields=['vistas'])
+        # Incrementar vistas (se acumulan en Redis y se vuelcan por lotes).
+        # La respuesta muestra lo volcado más lo que aún está en Redis.
+        pendientes, unicos, nuevo_hoy = registrar_vista(instance.id, identificador_visitante(request))
+        if nuevo_hoy:
+            # Recargar la página no sube la tendencia: solo el primer paso del día
+            registrar_interaccion(instance, "vista")
+        if pendientes:
+            instance.vistas += pendientes
+        if unicos:
+            instance.vistas_unicas = max(instance.vistas_unicas, unicos)
 
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -118,7 +163,7 @@ class HuecoViewSet(viewsets.ModelViewSet):
                 try:
                     u_lat = float(user_lat)
                     u_lon = float(user_lon)
-                    dist_usuario = geodesic((u_lat, u_lon), (lat_f, lon_f)).meters
+                    dist_usuario = distancia_m(u_lat, u_lon, lat_f, lon_f)
                     if dist_usuario > 100: # Límite de 100 metros
                         raise serializers.ValidationError(
                             f"Estás muy lejos del hueco ({int(dist_usuario)}m). "
@@ -140,7 +185,10 @@ class HuecoViewSet(viewsets.ModelViewSet):
                     accion=f"Hueco reabierto por {user.username} (desde ubicación)"
                 )
 
-                registrar_puntos(user, 5, "reapertura", f"Reapertura del hueco #{hueco_existente.id}")
+                registrar_puntos(
+                    user, 5, "reapertura", f"Reapertura del hueco #{hueco_existente.id}",
+                    ciudad=hueco_existente.ciudad,
+                )
                 from apps.huecos.services.notificacion_service import notificar_reapertura
                 
                 notificar_reapertura(hueco_existente, user)
@@ -154,7 +202,7 @@ class HuecoViewSet(viewsets.ModelViewSet):
 
             # Guardamos de una vez con status=1 (BaseStatusModel)
             hueco = serializer.save(usuario=user, created_by=user, status=1)
-            registrar_puntos(user, 10, "reporte", f"Nuevo reporte de hueco #{hueco.id}")
+            registrar_puntos(user, 10, "reporte", f"Nuevo reporte de hueco #{hueco.id}", ciudad=hueco.ciudad)
 
             HistorialHueco.objects.create(
                 hueco=hueco,
@@ -196,6 +244,27 @@ class HuecoViewSet(viewsets.ModelViewSet):
         except Suscripcion.DoesNotExist:
             return Response({"detail": "No sigues este hueco."}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'], url_path='vistas')
+    def vistas(self, request, pk=None):
+        """Vistas, visitantes únicos y visitantes únicos por día (?dias=, 30 por defecto)."""
+        hueco = self.get_object()
+        try:
+            dias = int(request.query_params.get('dias', 30))
+        except ValueError:
+            dias = 0
+        if not 1 <= dias <= MAX_DIAS_VENTANA:
+            raise serializers.ValidationError(
+                {"dias": f"Debe ser un entero entre 1 y {MAX_DIAS_VENTANA}."}
+            )
+        return Response({
+            "vistas": hueco.vistas,
+            "vistas_unicas": hueco.vistas_unicas,
+            "por_dia": [
+                {"fecha": fecha, "vistas_unicas": unicos}
+                for fecha, unicos in unicos_por_dia(hueco.id, dias)
+            ],
+        })
+
     @action(detail=True, methods=['post'], url_path='reportar')
     def reportar(self, request, pk=None):
         """Permite a los usuarios denunciar contenido inapropiado o falso"""
@@ -253,7 +322,8 @@ class ConfirmacionViewSet(viewsets.ModelViewSet):
 
         # 3. Asignar puntos solo si es nuevo registro
         if created:
-            registrar_puntos(user, 2, "confirmacion", f"Confirmación del hueco #{hueco.id}")
+            registrar_puntos(user, 2, "confirmacion", f"Confirmación del hueco #{hueco.id}", ciudad=hueco.ciudad)
+            registrar_interaccion(hueco, "confirmacion")
             HistorialHueco.objects.create(
                 hueco=hueco,
                 usuario=user,
@@ -272,21 +342,90 @@ class ComentarioViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         comentario = serializer.save(usuario=self.request.user)
-        registrar_puntos(self.request.user, 1, "comentario", f"Comentario en hueco #{comentario.hueco.id}")
+        registrar_puntos(
+            self.request.user, 1, "comentario", f"Comentario en hueco #{comentario.hueco.id}",
+            ciudad=comentario.hueco.ciudad,
+        )
+        registrar_interaccion(comentario.hueco, "comentario")
 
 
 class PuntosUsuarioViewSet(viewsets.ReadOnlyModelViewSet):
-    """Permite listar los puntos y ver el ranking general"""
+    """
+    Permite listar los puntos y ver el ranking general.
+    El ranking sale de los sorted sets de Redis (ver ranking_service), paginado:
+    ?periodo=semana|mes o ?dias=N (últimos N días) y ?ciudad= lo acotan.
+    /puntos/mi-posicion/ devuelve la posición del usuario autenticado.
+    """
     queryset = PuntosUsuario.objects.all().order_by('-fecha')
     serializer_class = PuntosUsuarioSerializer
 
+    def _ventana(self):
+        """(dias, ciudad) pedidos; dias None = histórico."""
+        params = self.request.query_params
+        dias = PERIODOS.get(params.get('periodo'))
+        if dias is None and params.get('dias'):
+            try:
+                dias = int(params['dias'])
+            except ValueError:
+                dias = 0
+            if not 1 <= dias <= MAX_DIAS_VENTANA:
+                raise serializers.ValidationError(
+                    {"dias": f"Debe ser un entero entre 1 y {MAX_DIAS_VENTANA}."}
+                )
+        return dias, normalizar_ciudad(params.get('ciudad'))
+
+    def _ranking(self, dias, ciudad):
+        """Secuencia (usuario_id, total) ordenada; la base responde mientras se reconstruyen los sets."""
+        if ranking_existe():
+            try:
+                return RankingRedis(clave_ranking(dias, ciudad))
+            except Exception as e:
+                print(f"Error al consultar el ranking: {e}")
+        elif cache.add("ranking_reconstruccion_encolada", 1, timeout=300):
+            try:
+                reconstruir_ranking_puntos.delay()
+            except Exception as e:
+                print(f"Error al encolar la reconstrucción del ranking: {e}")
+        return ranking_de_respaldo(dias, ciudad)
+
     def list(self, request, *args, **kwargs):
-        ranking = (
-            PuntosUsuario.objects.values('usuario__username')
-            .annotate(total=models.Sum('puntos'))
-            .order_by('-total')
+        ranking = self._ranking(*self._ventana())
+        page = self.paginate_queryset(ranking)
+        filas = list(page) if page is not None else list(ranking)
+        nombres = dict(
+            User.objects.filter(pk__in=[usuario_id for usuario_id, _ in filas]).values_list('pk', 'username')
         )
-        return Response(ranking)
+        primera = self.paginator.page.start_index() if page is not None else 1
+        datos = [
+            {
+                "posicion": primera + i,
+                "usuario_id": usuario_id,
+                "usuario__username": nombres.get(usuario_id),
+                "total": total,
+            }
+            for i, (usuario_id, total) in enumerate(filas)
+        ]
+        if page is not None:
+            return self.get_paginated_response(datos)
+        return Response(datos)
+
+    @action(detail=False, methods=['get'], url_path='mi-posicion')
+    def mi_posicion(self, request):
+        usuario = request.user
+        dias, ciudad = self._ventana()
+        try:
+            if not ranking_existe():
+                raise LookupError("Ranking en reconstrucción.")
+            datos = posicion_de(usuario.pk, clave_ranking(dias, ciudad))
+        except Exception:
+            datos = posicion_en_base(usuario.pk, dias, ciudad)
+        posicion, total = datos if datos is not None else (None, 0)
+        return Response({
+            "posicion": posicion,
+            "usuario_id": usuario.pk,
+            "usuario__username": usuario.username,
+            "total": total,
+        })
 
 
 class ValidacionHuecoViewSet(viewsets.ModelViewSet):
@@ -303,116 +442,116 @@ class ValidacionHuecoViewSet(viewsets.ModelViewSet):
         usuario = self.request.user
         # Guardar validación: Esto disparará el signal actualizar_estado_hueco en signals.py
         # el cual a su vez llamará al servicio procesar_validacion de forma limpia.
-        return serializer.save(usuario=usuario)
+        validacion = serializer.save(usuario=usuario)
+        registrar_interaccion(validacion.hueco, "validacion")
+        return validacion
 
 
-class HuecosCercanosViewSet(viewsets.ReadOnlyModelViewSet):
+class HuecosCercanosViewSet(CamposHuecoMixin, PaginacionCursorMixin, viewsets.ReadOnlyModelViewSet):
     """
     Lista huecos cercanos por ubicación o ciudad.
     Mantiene queryset válido para DRF y agrega distancia ordenada.
+    Pagina con cursor sobre (distancia, id), o (fecha_reporte, id) sin
+    ubicación; ?limit=/?offset= mantiene la paginación anterior.
     """
     queryset = Hueco.objects.all()
     serializer_class = HuecoSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = LimitOffsetPagination
+    legacy_pagination_class = LimitOffsetPagination
+    parametros_legados = ('limit', 'offset')
 
-    def get_queryset(self):
-        request = self.request
-        lat = request.query_params.get('lat')
-        lon = request.query_params.get('lon')
-        ciudad = request.query_params.get('ciudad')
-        radio_param = request.query_params.get('radio', 1000)
+    def get_pagination_class(self):
+        lat, _, _, _ = self._parametros()
+        return CursorDistanciaPagination if lat is not None else CursorPagination
 
-        # --- Validación de radio ---
+    def _parametros(self):
+        """(lat, lon, radio, ciudad); lat/lon quedan en None si faltan o son inválidos."""
+        params = self.request.query_params
         try:
-            radio = float(radio_param)
+            radio = float(params.get('radio', 1000))
         except ValueError:
             radio = 1000
+        try:
+            lat = float(params['lat'])
+            lon = float(params['lon'])
+        except (KeyError, ValueError):
+            lat = lon = None
+        return lat, lon, radio, params.get('ciudad')
 
-        # --- Clave de cache ---
-        cache_key = f"hc_{lat}_{lon}_{radio}_{ciudad}"
-        cached_qs = cache.get(cache_key)
-        if cached_qs is not None:
-            return cached_qs
-
-        # --- Query base (ESTADOS que quieres incluir) ---
-        # --- Query base (ESTADOS que quieres incluir) ---
-        qs = Hueco.objects.filter(
-            estado__in=[
-                EstadoHueco.PENDIENTE, 
-                EstadoHueco.CERRADO, 
-                EstadoHueco.REABIERTO, 
-                EstadoHueco.ACTIVO,
-                EstadoHueco.EN_REPARACION,
-                EstadoHueco.REPARADO
-            ],
-            status=1,
-            is_deleted=False
-        )
+    def get_queryset(self):
+        # Sin orden ni distancia: list() ordena en Python y retrieve() calcula su distancia
+        _, _, _, ciudad = self._parametros()
+        qs = anotar_para_lista(Hueco.objects.filter(estado__in=ESTADOS_CERCANOS, status=1, is_deleted=False))
 
         # --- Filtrar por ciudad (si aplica) ---
         if ciudad:
             qs = qs.filter(descripcion__icontains=ciudad)
-
-        # --- Si hay lat/lon, calcular distancias ---
-        if lat and lon:
-            try:
-                lat = float(lat)
-                lon = float(lon)
-
-                # Obtener lista de huecos cercanos desde el servicio
-                cercanos = get_huecos_cercanos(lat, lon, radio_metros=radio)
-
-                # Extraer IDS en orden por distancia
-                ids_en_orden = [h.id for h, _ in cercanos]
-
-                if not ids_en_orden:
-                    cache.set(cache_key, Hueco.objects.none(), 300)
-                    return Hueco.objects.none()
-
-                # Convertir la lista ordenada en queryset ordenado manualmente
-                preserved_order = models.Case(
-                    *[models.When(id=id_h, then=pos) for pos, id_h in enumerate(ids_en_orden)]
-                )
-
-                qs = qs.filter(id__in=ids_en_orden).annotate(
-                    distancia_m=models.Case(
-                        *[
-                            models.When(id=h.id, then=round(dist, 2))
-                            for h, dist in cercanos
-                        ],
-                        default=None,
-                        output_field=models.FloatField()
-                    )
-                ).order_by(preserved_order)
-
-            except ValueError:
-                pass  # lat/lon inválidos → se ignora distancia
-
-        # Guardar en caché (queryset, NO lista)
-        cache.set(cache_key, qs, 300)
         return qs
 
-class MisReportesListView(ListAPIView):
+    def list(self, request, *args, **kwargs):
+        """
+        Pagina solo ids y serializa con fragmento_service: la parte compartida
+        de cada hueco sale de caché y los campos del usuario de una consulta.
+        """
+        lat, lon, radio, ciudad = self._parametros()
+
+        paginador = self.paginator
+        distancias = {}
+        if lat is not None:
+            # (id, distancia) ordenados; los candidatos se cachean por celda + bucket de radio
+            cercanos = get_ids_cercanos(lat, lon, radio_metros=radio)
+            distancias = dict(cercanos)
+            if ciudad and cercanos:
+                en_ciudad = set(self.get_queryset().filter(id__in=distancias).values_list('id', flat=True))
+                cercanos = [(id_h, d) for id_h, d in cercanos if id_h in en_ciudad]
+            if isinstance(paginador, CursorPagination):
+                page = paginador.paginate_pares([(d, id_h) for id_h, d in cercanos], request)
+            else:
+                ids = [id_h for id_h, _ in cercanos]
+                page = paginador.paginate_queryset(ids, request, view=self)
+        elif isinstance(paginador, CursorPagination):
+            qs = self.get_queryset().select_related(None).prefetch_related(None).only('id', 'fecha_reporte')
+            page = [h.id for h in paginador.paginate_queryset(qs, request, view=self)]
+        else:
+            ids = self.get_queryset().order_by('-fecha_reporte', '-id').values_list('id', flat=True)
+            page = paginador.paginate_queryset(ids, request, view=self)
+
+        if page is None:
+            # ?offset= sin ?limit=: lista completa, como antes
+            return Response(serializar_huecos(ids, request, distancias, self.campos_pedidos()))
+        datos = serializar_huecos(page, request, distancias, self.campos_pedidos())
+        return self.get_paginated_response(datos)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        lat, lon, radio, _ = self._parametros()
+        if lat is not None:
+            distancia = distancia_m(lat, lon, instance.latitud, instance.longitud)
+            if distancia > radio:
+                raise NotFound()
+            instance.distancia_m = round(distancia, 2)
+        return Response(self.get_serializer(instance).data)
+
+class MisReportesListView(CamposHuecoMixin, PaginacionCursorMixin, ListAPIView):
     serializer_class = HuecoSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         # El usuario pidió explícitamente que "Mis Reportes" sea SOLO para el que reporta el hueco inicialmente.
-        return (
+        return anotar_para_lista(
             Hueco.objects.filter(status=1, usuario=user)
             .distinct()
             .order_by("-fecha_reporte")
         )
 
-class SeguidosListView(ListAPIView):
+class SeguidosListView(CamposHuecoMixin, PaginacionCursorMixin, ListAPIView):
     serializer_class = HuecoSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return (
+        return anotar_para_lista(
             Hueco.objects.filter(
                 status=1,
                 suscripciones__usuario=user,
@@ -421,3 +560,146 @@ class SeguidosListView(ListAPIView):
             .distinct()
             .order_by("-fecha_reporte")
         )
+
+class HuecoTileView(APIView):
+    """
+    Tile del mapa z/x/y: grupos con conteos por estado y gravedad en zoom bajo,
+    huecos individuales (id, lat, lon, estado, gravedad) en zoom alto.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, z, x, y):
+        z, x, y = int(z), int(x), int(y)
+        if z > ZOOM_MAX or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return Response({"detail": "Tile fuera de rango."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(obtener_tile(z, x, y))
+
+class HuecoConteoView(APIView):
+    """
+    Conteo de huecos activos en una caja (?lat_min=&lat_max=&lon_min=&lon_max=),
+    leído de los conteos pre-agregados por geocelda. ?estados=2,4 filtra estados.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            lat_min, lat_max, lon_min, lon_max = [
+                float(request.query_params[p]) for p in ("lat_min", "lat_max", "lon_min", "lon_max")
+            ]
+            if not all(map(math.isfinite, (lat_min, lat_max, lon_min, lon_max))):
+                raise ValueError("coordenadas no finitas")
+            if lat_min > lat_max or lon_min > lon_max:
+                raise ValueError("mínimos mayores que máximos")
+            estados = request.query_params.get("estados")
+            estados = [int(e) for e in estados.split(",")] if estados else None
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Parámetros requeridos: lat_min <= lat_max, lon_min <= lon_max (números finitos)."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        caja = (
+            max(lat_min, -90.0), min(lat_max, 90.0),
+            max(lon_min, -180.0), min(lon_max, 180.0),
+        )
+        por_estado = contar_en_caja(*caja, estados=estados)
+        return Response({"total": sum(por_estado.values()), "por_estado": por_estado})
+
+class HuecosMasCercanosView(APIView):
+    """
+    Los k huecos activos más cercanos a (lat, lon), sin radio:
+    /huecos/nearest/?lat=&lon=&k=  (k por defecto 10, entre 1 y K_MAX).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            lat = float(request.query_params["lat"])
+            lon = float(request.query_params["lon"])
+            k = int(request.query_params.get("k", 10))
+            if not (math.isfinite(lat) and math.isfinite(lon)) or abs(lat) > 90 or abs(lon) > 180:
+                raise ValueError("coordenadas fuera de rango")
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Parámetros requeridos: lat (-90 a 90), lon (-180 a 180) (k opcional)."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        cercanos = get_k_cercanos(lat, lon, max(1, min(k, K_MAX)))
+        return Response(serializar_huecos(
+            [id_h for id_h, _ in cercanos], request, dict(cercanos), campos_solicitados(request.query_params)
+        ))
+
+class HuecosEnTendenciaView(APIView):
+    """
+    Huecos activos con más interacciones recientes (ver tendencia_service):
+    /huecos/tendencias/?lat=&lon=  (celda de la ubicación y sus 8 vecinas) o ?ciudad=,
+    con ?limite= (por defecto 20, máximo MAX_LIMITE).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            limite = int(params.get("limite", 20))
+            if "lat" in params or "lon" in params:
+                lat, lon = float(params["lat"]), float(params["lon"])
+                if not (math.isfinite(lat) and math.isfinite(lon)) or abs(lat) > 90 or abs(lon) > 180:
+                    raise ValueError("coordenadas fuera de rango")
+                claves = claves_cercanas(lat, lon)
+            elif normalizar_ciudad(params.get("ciudad")):
+                claves = [clave_ciudad(normalizar_ciudad(params["ciudad"]))]
+            else:
+                raise KeyError("ciudad")
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Parámetros requeridos: lat y lon, o ciudad (limite opcional)."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            tendencias = huecos_en_tendencia(claves, min(max(limite, 1), MAX_LIMITE))
+        except Exception as e:
+            print(f"Error al consultar las tendencias: {e}")
+            tendencias = []
+        puntajes = dict(tendencias)
+        campos = campos_solicitados(params)
+        if campos is not None and "id" not in campos:
+            campos = ["id", *campos]
+        huecos = serializar_huecos(list(puntajes), request, campos=campos)
+        for datos in huecos:
+            datos["puntaje_tendencia"] = round(puntajes[datos["id"]], 3)
+        return Response(huecos)
+
+class HuecosEnRutaView(APIView):
+    """
+    Huecos activos a lo largo de una ruta, ordenados por distancia recorrida.
+    POST /huecos/ruta/ {"polyline": "<polyline codificada>", "ancho": 50}
+    `ancho` es la distancia máxima (m) a la ruta; máximo ANCHO_MAX_M. Las
+    rutas de más de MAX_LARGO_RUTA_M (o de demasiadas celdas), con
+    coordenadas fuera de rango o que cruzan el meridiano 180 dan 400.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            puntos = decodificar_polyline(str(request.data.get("polyline", "")))
+            ancho = float(request.data.get("ancho", 50))
+        except (TypeError, ValueError):
+            return Response({"detail": "Polyline o ancho inválidos."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not puntos:
+            return Response({"detail": "La ruta está vacía."}, status=status.HTTP_400_BAD_REQUEST)
+        if any(abs(lat) > 90 or abs(lon) > 180 for lat, lon in puntos):
+            return Response({"detail": "La ruta tiene coordenadas fuera de rango."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(puntos) > MAX_PUNTOS_RUTA:
+            return Response(
+                {"detail": f"La ruta no puede tener más de {MAX_PUNTOS_RUTA} puntos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 < ancho <= ANCHO_MAX_M:
+            return Response(
+                {"detail": f"El ancho debe estar entre 0 y {ANCHO_MAX_M} metros."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            return Response(huecos_en_ruta(puntos, ancho))
+        except RutaDemasiadoLarga as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -1,16 +1,10 @@
 from rest_framework import serializers
-from ...models import User
+from ...models import User, UserStats
 from typing import Optional
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
-from apps.huecos.models import (
-    PuntosUsuario,
-    Hueco,
-    Confirmacion,
-    Comentario,
-    ValidacionHueco,
-    Suscripcion,
-)
+from apps.huecos.models import PuntosUsuario
+from apps.usuarios.services.stats_service import recalcular_estadisticas_una_vez
 from django.db.models import Sum
  
 class UserSerializer(serializers.ModelSerializer):
@@ -57,15 +51,17 @@ class UserSerializer(serializers.ModelSerializer):
         )
         return total
 
+    def _estadisticas(self, obj: User):
+        """Fila UserStats del usuario (se calcula si aún no existe)."""
+        try:
+            return obj.estadisticas
+        except UserStats.DoesNotExist:
+            obj.estadisticas = recalcular_estadisticas_una_vez(obj.pk)
+            return obj.estadisticas
+
     # ---- DETALLE PUNTOS POR TIPO ----
     def get_detalle_puntos(self, obj: User):
-        qs = (
-            PuntosUsuario.objects
-            .filter(usuario=obj, is_deleted=False)
-            .values("tipo")
-            .annotate(total=Sum("puntos"))
-        )
-        return {row["tipo"]: row["total"] for row in qs}
+        return self._estadisticas(obj).puntos_por_tipo
 
     # ---- REPUTACIÓN ----
     def get_reputacion(self, obj: User):
@@ -82,42 +78,13 @@ class UserSerializer(serializers.ModelSerializer):
 
     # ---- STATS DE ACTIVIDAD ----
     def get_stats(self, obj: User):
-        reportes = Hueco.objects.filter(
-            usuario=obj,
-            status=1,
-            is_deleted=False
-        ).count()
-
-        seguidos = Suscripcion.objects.filter(
-            usuario=obj,
-            status=1,
-            is_deleted=False
-        ).count()
-
-        validaciones = ValidacionHueco.objects.filter(
-            usuario=obj,
-            status=1,
-            is_deleted=False
-        ).count()
-
-        confirmaciones = Confirmacion.objects.filter(
-            usuario=obj,
-            status=1,
-            is_deleted=False
-        ).count()
-
-        comentarios = Comentario.objects.filter(
-            usuario=obj,
-            status=1,
-            is_deleted=False
-        ).count()
-
+        stats = self._estadisticas(obj)
         return {
-            "reportes": reportes,
-            "huecos_seguidos": seguidos,
-            "validaciones_realizadas": validaciones,
-            "confirmaciones_realizadas": confirmaciones,
-            "comentarios_realizados": comentarios,
+            "reportes": stats.reportes,
+            "huecos_seguidos": stats.huecos_seguidos,
+            "validaciones_realizadas": stats.validaciones,
+            "confirmaciones_realizadas": stats.confirmaciones,
+            "comentarios_realizados": stats.comentarios,
         }
 
     def get_employee_id(self, obj):
@@ -9,7 +9,7 @@ from .serializers import UserSerializer
 from apps.utils.auditlogmimix import AuditLogMixin
 
 class UserViewSet(AuditLogMixin, viewsets.ModelViewSet):
-    queryset = User.objects.filter(is_deleted=False)
+    queryset = User.objects.filter(is_deleted=False).select_related("reputacion", "estadisticas")
     serializer_class = UserSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ["auth_provider", "is_active"]
@@ -1,11 +1,80 @@
+import copy
+
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.exceptions import AuthenticationFailed
 
+from apps.usuarios.services.sesion_service import estado_sesion
+
+
+class UsuarioPerezoso(SimpleLazyObject):
+    """
+    Usuario autenticado que conoce su id sin consultar la base: pk, id,
+    is_authenticated e is_anonymous se responden sin cargar la fila; el resto
+    de atributos (o un isinstance) la carga una sola vez.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, func, usuario_id):
+        self.__dict__["_usuario_id"] = usuario_id
+        super().__init__(func)
+
+    @property
+    def pk(self):
+        return self.__dict__["_usuario_id"]
+
+    id = pk
+
+    def __copy__(self):
+        if self._wrapped is empty:
+            return type(self)(self._setupfunc, self.pk)
+        return copy.copy(self._wrapped)
+
+
 class VersionedJWTAuthentication(JWTAuthentication):
+    """
+    JWT con kill-switch por versión: el claim "ver" debe coincidir con
+    User.token_version. La versión e is_active se leen del caché de
+    sesion_service y el usuario se entrega como UsuarioPerezoso.
+    """
+
     def get_user(self, validated_token):
-        user = super().get_user(validated_token)
+        if api_settings.USER_ID_FIELD != "id" or api_settings.CHECK_REVOKE_TOKEN:
+            # Estas variantes necesitan la fila completa
+            user = super().get_user(validated_token)
+            self.verificar_version(validated_token, user.token_version)
+            return user
+
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        estado = estado_sesion(user_id)
         token_ver = int(validated_token.get("ver", 0))
-        current_ver = int(getattr(user, "token_version", 0))
-        if token_ver != current_ver:
+        if estado is not None and token_ver > estado[0]:
+            # El token es más nuevo que el caché: se vuelve a leer de la base
+            estado = estado_sesion(user_id, refrescar=True)
+        if estado is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        token_version, is_active = estado
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        self.verificar_version(validated_token, token_version)
+
+        def cargar():
+            try:
+                return self.user_model.objects.get(pk=user_id)
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        return UsuarioPerezoso(cargar, user_id)
+
+    @staticmethod
+    def verificar_version(validated_token, current_ver):
+        if int(validated_token.get("ver", 0)) != int(current_ver or 0):
             raise AuthenticationFailed("Token invalidated by a newer login")
-        return user
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.usuarios.services.stats_service import reconstruir_estadisticas
+
+
+class Command(BaseCommand):
+    """
+    Recalcula UserStats de todos los usuarios desde las tablas de origen
+    (p. ej. tras cargas masivas o update() que no pasan por save()).
+    """
+    help = "Recalcula las estadísticas materializadas (UserStats) de todos los usuarios."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Usuarios por lote")
+
+    def handle(self, *args, **options):
+        procesados = reconstruir_estadisticas(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"Usuarios procesados: {procesados}."))
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.25 on 2026-10-17 00:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def poblar_estadisticas(apps, schema_editor):
+    User = apps.get_model('usuarios', 'User')
+    UserStats = apps.get_model('usuarios', 'UserStats')
+    PuntosUsuario = apps.get_model('huecos', 'PuntosUsuario')
+
+    def conteo(nombre_modelo):
+        filas = (
+            apps.get_model('huecos', nombre_modelo).objects
+            .filter(usuario=OuterRef('pk'), status=1, is_deleted=False)
+            .order_by().values('usuario').annotate(total=Count('id')).values('total')
+        )
+        return Coalesce(Subquery(filas, output_field=IntegerField()), 0)
+
+    puntos = {}
+    for fila in (
+        PuntosUsuario.objects.filter(is_deleted=False)
+        .values('usuario_id', 'tipo').annotate(total=Sum('puntos')).order_by()
+    ):
+        puntos.setdefault(fila['usuario_id'], {})[fila['tipo']] = fila['total']
+
+    usuarios = User.objects.annotate(
+        _reportes=conteo('Hueco'),
+        _huecos_seguidos=conteo('Suscripcion'),
+        _validaciones=conteo('ValidacionHueco'),
+        _confirmaciones=conteo('Confirmacion'),
+        _comentarios=conteo('Comentario'),
+    ).values('pk', '_reportes', '_huecos_seguidos', '_validaciones', '_confirmaciones', '_comentarios')
+    UserStats.objects.bulk_create(
+        (
+            UserStats(
+                usuario_id=fila['pk'],
+                reportes=fila['_reportes'],
+                huecos_seguidos=fila['_huecos_seguidos'],
+                validaciones=fila['_validaciones'],
+                confirmaciones=fila['_confirmaciones'],
+                comentarios=fila['_comentarios'],
+                puntos_por_tipo=puntos.get(fila['pk'], {}),
+            )
+            for fila in usuarios.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_user_avatar'),
+        ('huecos', '0015_indices_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reportes', models.PositiveIntegerField(default=0)),
+                ('huecos_seguidos', models.PositiveIntegerField(default=0)),
+                ('validaciones', models.PositiveIntegerField(default=0)),
+                ('confirmaciones', models.PositiveIntegerField(default=0)),
+                ('comentarios', models.PositiveIntegerField(default=0)),
+                ('puntos_por_tipo', models.JSONField(default=dict)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'user_stats',
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,12 @@
 import hashlib
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from apps.utils.mixins import AuditMixin
+from apps.utils.mixins import AuditMixin, FieldTrackerMixin
 from apps.core.models import BaseStatusModel
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 
@@ -75,6 +75,111 @@ def crear_reputacion_usuario(sender, instance, created, **kwargs):
         ReputacionUsuario.objects.create(usuario=instance)
 
 
+@receiver(post_save, sender=User)
+def publicar_sesion_usuario(sender, instance, update_fields=None, **kwargs):
+    """Refleja en caché token_version e is_active (ver sesion_service)."""
+    from apps.usuarios.services.sesion_service import publicar_estado_sesion
+
+    if update_fields is None or {"token_version", "is_active"} & set(update_fields):
+        publicar_estado_sesion(instance)
+
+
+@receiver(post_delete, sender=User)
+def invalidar_sesion_usuario(sender, instance, **kwargs):
+    from apps.usuarios.services.sesion_service import invalidar_estado_sesion
+
+    invalidar_estado_sesion(instance.pk)
+
+
+class UserStats(models.Model):
+    """
+    Contadores de actividad del usuario, materializados para que serializar
+    un usuario sea leer una fila. Los mantienen ContadorEnUsuarioMixin (al
+    crear, eliminar o restaurar cada fila) y PuntosUsuario.save; ver
+    stats_service para el recálculo completo.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name="estadisticas")
+    reportes = models.PositiveIntegerField(default=0)
+    huecos_seguidos = models.PositiveIntegerField(default=0)
+    validaciones = models.PositiveIntegerField(default=0)
+    confirmaciones = models.PositiveIntegerField(default=0)
+    comentarios = models.PositiveIntegerField(default=0)
+    puntos_por_tipo = models.JSONField(default=dict)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "user_stats"
+
+    def __str__(self):
+        return f"Estadísticas de {self.usuario_id}"
+
+
+@receiver(post_save, sender=User)
+def crear_estadisticas_usuario(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(usuario=instance)
+
+
+class ContadorEnUsuarioMixin(FieldTrackerMixin):
+    """
+    Mantiene UserStats.<campo_estadistica> del autor de la fila: cuenta
+    mientras la fila esté activa (status=1) y no eliminada. Se ajusta con F()
+    en la misma transacción que el save().
+    """
+    campo_estadistica = None
+    campos_rastreados = ('usuario_id', 'status', 'is_deleted')
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def _usuario_contado(valores):
+        """Usuario al que suma la fila, o None si no cuenta."""
+        if not valores or valores.get('is_deleted') or valores.get('status') != 1:
+            return None
+        return valores.get('usuario_id')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        relevantes = {'usuario', 'usuario_id', 'status', 'is_deleted'}
+        if update_fields is not None and not relevantes & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        originales = self.valores_originales()
+        actuales = dict(originales or {})
+        for campo, nombres in (('usuario_id', {'usuario', 'usuario_id'}), ('status', {'status'}),
+                               ('is_deleted', {'is_deleted'})):
+            if originales is None or update_fields is None or nombres & set(update_fields):
+                actuales[campo] = getattr(self, campo)
+
+        anterior = self._usuario_contado(originales)
+        actual = self._usuario_contado(actuales)
+        if anterior == actual:
+            resultado = super().save(*args, **kwargs)
+        else:
+            from apps.usuarios.services.stats_service import ajustar_estadistica
+            with transaction.atomic():
+                resultado = super().save(*args, **kwargs)
+                ajustar_estadistica(anterior, self.campo_estadistica, -1)
+                ajustar_estadistica(actual, self.campo_estadistica, 1)
+        self._guardar_originales()
+        return resultado
+
+
+@receiver(post_delete)
+def descontar_estadistica_eliminada(sender, instance, **kwargs):
+    """Borrado físico de una fila de ContadorEnUsuarioMixin: descuenta si todavía contaba."""
+    if not isinstance(instance, ContadorEnUsuarioMixin):
+        return
+    from apps.usuarios.services.stats_service import ajustar_estadistica
+
+    valores = {'usuario_id': instance.usuario_id, 'status': instance.status, 'is_deleted': instance.is_deleted}
+    valores.update(getattr(instance, '_originales', {}))
+    ajustar_estadistica(
+        ContadorEnUsuarioMixin._usuario_contado(valores), instance.campo_estadistica, -1, crear=False
+    )
+
+
 class LoginOTP(models.Model):
     """
     Sistema de inicio de sesión sin contraseña mediante códigos OTP.
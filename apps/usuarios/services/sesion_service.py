@@ -0,0 +1,72 @@
+"""
+Estado de sesión por usuario en caché: (token_version, is_active).
+
+VersionedJWTAuthentication lo consulta en cada petición en lugar de leer la
+fila completa de User. Los receivers de User (models.py) lo reescriben al
+confirmarse cada guardado, así que un cambio de token_version (login,
+logout, login con Google) o de is_active se ve en la siguiente petición.
+El nivel local de la caché (apps.core.cache) usa un TTL corto para acotar
+el retraso si se pierde una invalidación.
+"""
+from django.db import transaction
+
+from apps.core.cache import CacheDosNiveles
+
+TTL_ESTADO_SESION = 300
+cache_sesion = CacheDosNiveles("estado_sesion", max_entradas=10000, ttl_local=10)
+
+
+def clave_estado_sesion(usuario_id):
+    return f"sesion_estado_{usuario_id}"
+
+
+def estado_sesion(usuario_id, refrescar=False):
+    """
+    (token_version, is_active) del usuario, de caché o de la base; None si
+    el usuario no existe. Con `refrescar` se lee siempre de la base.
+    """
+    from apps.usuarios.models import User
+
+    clave = clave_estado_sesion(usuario_id)
+    if not refrescar:
+        try:
+            estado = cache_sesion.get(clave)
+            if estado is not None:
+                return tuple(estado)
+        except Exception as e:
+            print(f"Error al leer el estado de sesión del usuario {usuario_id}: {e}")
+
+    fila = User.objects.filter(pk=usuario_id).values_list("token_version", "is_active").first()
+    if fila is None:
+        return None
+    try:
+        # add: si entre la lectura y aquí un guardado ya escribió el estado
+        # nuevo, no se pisa con el que se leyó
+        if refrescar:
+            cache_sesion.set(clave, fila, TTL_ESTADO_SESION)
+        else:
+            cache_sesion.add(clave, fila, TTL_ESTADO_SESION)
+    except Exception as e:
+        print(f"Error al guardar el estado de sesión del usuario {usuario_id}: {e}")
+    return tuple(fila)
+
+
+def publicar_estado_sesion(usuario):
+    """Escribe en caché el estado del usuario al confirmarse la transacción actual."""
+    clave = clave_estado_sesion(usuario.pk)
+    estado = (usuario.token_version, usuario.is_active)
+
+    def publicar():
+        try:
+            cache_sesion.set(clave, estado, TTL_ESTADO_SESION)
+        except Exception as e:
+            print(f"Error al actualizar el estado de sesión del usuario {usuario.pk}: {e}")
+
+    transaction.on_commit(publicar)
+
+
+def invalidar_estado_sesion(usuario_id):
+    try:
+        cache_sesion.delete(clave_estado_sesion(usuario_id))
+    except Exception as e:
+        print(f"Error al invalidar el estado de sesión del usuario {usuario_id}: {e}")
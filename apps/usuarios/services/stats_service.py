@@ -0,0 +1,144 @@
+"""
+Estadísticas de actividad por usuario (UserStats).
+
+Cada contador cuenta las filas del usuario con status=1 y no eliminadas, igual
+que las consultas que antes hacía UserSerializer.get_stats. Se mantienen de
+forma incremental (ContadorEnUsuarioMixin y PuntosUsuario.save); las funciones
+de recálculo sirven para usuarios sin fila y para corregir desvíos.
+"""
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from apps.core.cache import calcular_una_vez
+
+TTL_RECALCULO = 30
+
+# Campo de UserStats → modelo cuyas filas cuenta
+CONTADORES = {
+    'reportes': 'huecos.Hueco',
+    'huecos_seguidos': 'huecos.Suscripcion',
+    'validaciones': 'huecos.ValidacionHueco',
+    'confirmaciones': 'huecos.Confirmacion',
+    'comentarios': 'huecos.Comentario',
+}
+
+
+def _filas_que_cuentan(campo):
+    return apps.get_model(CONTADORES[campo]).objects.filter(status=1, is_deleted=False)
+
+
+def ajustar_estadistica(usuario_id, campo, delta, crear=True):
+    """
+    Suma `delta` a UserStats.<campo> del usuario. Si el usuario todavía no
+    tiene fila y `crear`, se calcula completa (ya incluye este cambio).
+    """
+    from apps.usuarios.models import UserStats
+
+    if usuario_id is None or not delta:
+        return
+    if UserStats.objects.filter(usuario_id=usuario_id).update(**{campo: F(campo) + delta}):
+        return
+    if crear:
+        recalcular_estadisticas(usuario_id)
+
+
+def sumar_puntos(usuario_id, tipo, puntos):
+    """Acumula `puntos` en puntos_por_tipo[tipo] (fila bloqueada mientras se modifica)."""
+    from apps.usuarios.models import UserStats
+
+    with transaction.atomic():
+        stats = UserStats.objects.select_for_update().filter(usuario_id=usuario_id).first()
+        if stats is None:
+            recalcular_estadisticas(usuario_id)
+            return
+        stats.puntos_por_tipo[tipo] = stats.puntos_por_tipo.get(tipo, 0) + puntos
+        stats.save(update_fields=['puntos_por_tipo', 'actualizado_en'])
+
+
+def _puntos_por_tipo(usuario_ids):
+    from apps.huecos.models import PuntosUsuario
+
+    puntos = defaultdict(dict)
+    filas = (
+        PuntosUsuario.objects.filter(usuario_id__in=usuario_ids, is_deleted=False)
+        .values('usuario_id', 'tipo').annotate(total=Sum('puntos')).order_by()
+    )
+    for fila in filas:
+        puntos[fila['usuario_id']][fila['tipo']] = fila['total']
+    return puntos
+
+
+def recalcular_estadisticas(usuario_id):
+    """Calcula desde cero las estadísticas de un usuario y las guarda."""
+    from apps.usuarios.models import UserStats
+
+    valores = {
+        campo: _filas_que_cuentan(campo).filter(usuario_id=usuario_id).count()
+        for campo in CONTADORES
+    }
+    valores['puntos_por_tipo'] = _puntos_por_tipo([usuario_id]).get(usuario_id, {})
+    stats, _ = UserStats.objects.update_or_create(usuario_id=usuario_id, defaults=valores)
+    return stats
+
+
+def recalcular_estadisticas_una_vez(usuario_id):
+    """
+    recalcular_estadisticas para lecturas: si llegan varias peticiones por un
+    usuario sin fila, calcula una y las demás reciben su resultado.
+    """
+    return calcular_una_vez(
+        "estadisticas_usuario",
+        f"stats_recalculo_{usuario_id}",
+        lambda: recalcular_estadisticas(usuario_id),
+        TTL_RECALCULO,
+        gracia=0,
+    )
+
+
+def reconstruir_estadisticas(lote=1000):
+    """
+    Recalcula las estadísticas de todos los usuarios por rangos de id: una
+    consulta con subconsultas de conteo por rango, más la suma de puntos.
+    Devuelve el número de usuarios procesados.
+    """
+    from apps.usuarios.models import User, UserStats
+
+    def conteo(campo):
+        filas = (
+            _filas_que_cuentan(campo).filter(usuario=OuterRef('pk'))
+            .order_by().values('usuario').annotate(total=Count('id')).values('total')
+        )
+        return Coalesce(Subquery(filas, output_field=IntegerField()), 0)
+
+    campos = list(CONTADORES)
+    procesados = 0
+    ultimo = 0
+    while True:
+        filas = list(
+            User.objects.filter(pk__gt=ultimo).order_by('pk')
+            .annotate(**{f'_{campo}': conteo(campo) for campo in campos})
+            .values('pk', *[f'_{campo}' for campo in campos])[:lote]
+        )
+        if not filas:
+            return procesados
+        ids = [fila['pk'] for fila in filas]
+        puntos = _puntos_por_tipo(ids)
+
+        with transaction.atomic():
+            existentes = UserStats.objects.select_for_update().in_bulk(ids, field_name='usuario_id')
+            nuevos, cambiados = [], []
+            for fila in filas:
+                stats = existentes.get(fila['pk']) or UserStats(usuario_id=fila['pk'])
+                for campo in campos:
+                    setattr(stats, campo, fila[f'_{campo}'])
+                stats.puntos_por_tipo = puntos.get(fila['pk'], {})
+                (cambiados if stats.pk else nuevos).append(stats)
+            UserStats.objects.bulk_create(nuevos)
+            UserStats.objects.bulk_update(cambiados, campos + ['puntos_por_tipo'])
+
+        procesados += len(ids)
+        ultimo = ids[-1]
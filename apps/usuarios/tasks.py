@@ -0,0 +1,41 @@
+from celery import shared_task
+
+from apps.core.tareas import tarea_unica
+
+
+@shared_task
+@tarea_unica(lease=120)
+def limpiar_otps_vencidos():
+    """Borra los códigos OTP de inicio de sesión ya vencidos."""
+    from django.utils import timezone
+    from apps.usuarios.models import LoginOTP
+
+    borrados, _ = LoginOTP.objects.filter(expires_at__lt=timezone.now()).delete()
+    print(f"[OTP] {borrados} códigos vencidos borrados.")
+    return borrados
+
+
+@shared_task
+@tarea_unica(lease=300)
+def purgar_tokens_vencidos():
+    """
+    Borra los refresh tokens vencidos de la blacklist de simplejwt
+    (OutstandingToken y, en cascada, BlacklistedToken), como flushexpiredtokens.
+    """
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    borrados, _ = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    print(f"[TOKENS] {borrados} filas de tokens vencidos borradas.")
+    return borrados
+
+
+@shared_task
+@tarea_unica(lease=600)
+def reconstruir_estadisticas_usuarios():
+    """Recalcula UserStats de todos los usuarios (ver stats_service)."""
+    from apps.usuarios.services.stats_service import reconstruir_estadisticas
+
+    procesados = reconstruir_estadisticas()
+    print(f"[ESTADISTICAS] {procesados} usuarios recalculados.")
+    return procesados
@@ -1 +1,51 @@
-# Create your tests here.
+from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.usuarios.auth import VersionedJWTAuthentication
+from apps.usuarios.models import User
+from apps.usuarios.services.sesion_service import cache_sesion, clave_estado_sesion
+
+
+class VersionedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create(username="sesion", email="sesion@huecoapp.local")
+        cache_sesion.delete(clave_estado_sesion(self.usuario.pk))
+        self.auth = VersionedJWTAuthentication()
+
+    def _token(self):
+        token = AccessToken.for_user(self.usuario)
+        token["ver"] = self.usuario.token_version
+        return token
+
+    def _subir_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.token_version += 1
+            self.usuario.save(update_fields=["token_version"])
+
+    def test_estado_en_cache_y_usuario_perezoso(self):
+        token = self._token()
+        with self.assertNumQueries(1):
+            self.auth.get_user(token)
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(token)
+            self.assertEqual(user.pk, self.usuario.pk)
+            self.assertTrue(user.is_authenticated)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.usuario.email)
+
+    def test_nueva_version_invalida_tokens_anteriores(self):
+        anterior = self._token()
+        self.auth.get_user(anterior)
+        self._subir_version()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(anterior)
+        self.assertEqual(self.auth.get_user(self._token()).pk, self.usuario.pk)
+
+    def test_usuario_inactivo(self):
+        token = self._token()
+        self.auth.get_user(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.soft_delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(token)
@@ -1,4 +1,6 @@
 # apps/utils/mixins.py
+from functools import lru_cache
+
 from django.conf import settings
 from django.db    import models
 from django.utils import timezone
@@ -57,3 +59,53 @@ class AuditMixin(models.Model):
         self.deleted_at = None
         self.deleted_by = None
         self.save(update_fields=["is_deleted", "deleted_at", "deleted_by"])
+
+
+class FieldTrackerMixin(models.Model):
+    """
+    Recuerda los valores de `campos_rastreados` tal como se leyeron de la base,
+    para que save() pueda saber qué cambió sin otra consulta.
+    Si varias clases de la jerarquía declaran `campos_rastreados`, se rastrea
+    la unión de todos.
+    """
+
+    campos_rastreados = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_originales()
+        return instancia
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def todos_los_rastreados(cls):
+        campos = []
+        for clase in cls.__mro__:
+            for campo in clase.__dict__.get("campos_rastreados", ()):
+                if campo not in campos:
+                    campos.append(campo)
+        return tuple(campos)
+
+    def _guardar_originales(self):
+        self._originales = {
+            campo: self.__dict__[campo]
+            for campo in self.todos_los_rastreados()
+            if campo in self.__dict__
+        }
+
+    def valores_originales(self):
+        """Valores guardados en la base (None si la instancia es nueva)."""
+        if self._state.adding or self.pk is None:
+            return None
+        originales = dict(getattr(self, "_originales", {}))
+        faltantes = [c for c in self.todos_los_rastreados() if c not in originales]
+        if faltantes:
+            # Campos diferidos (.only/.defer): se leen de la base
+            originales.update(
+                type(self)._base_manager.filter(pk=self.pk).values(*faltantes).first() or {}
+            )
+        return originales
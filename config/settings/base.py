@@ -179,13 +179,18 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": True,
 }
 
+REDIS_URL = getenv("REDIS_URL", "redis://localhost:6380/1")
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": getenv("REDIS_URL", "redis://localhost:6380/1"),
+        "LOCATION": REDIS_URL,
     }
 }
 
+# Snapshots del índice espacial en memoria (apps.huecos.services.indice_service)
+HUECOS_INDICE_DIR = getenv("HUECOS_INDICE_DIR", os.path.join(BASE_DIR, "var", "indice_huecos"))
+
 
 
 SPECTACULAR_SETTINGS = {
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 # Establece el módulo de configuración de Django para el programa 'celery'.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.development')
 
@@ -11,3 +12,51 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Descubre y carga las tareas automáticamente desde tus aplicaciones
 app.autodiscover_tasks()
+
+# Tareas periódicas de mantenimiento (celery -A config beat). Cada una corre
+# con tarea_unica (apps/core/tareas.py): si la anterior sigue en curso, la
+# nueva se omite. `expires` descarta las que se encolaron y no alcanzaron a
+# correr antes de la siguiente. Horas en CELERY_TIMEZONE (UTC): 08:00 UTC son
+# las 03:00 en Colombia.
+app.conf.beat_schedule = {
+    'sincronizar-vistas': {
+        'task': 'apps.huecos.tasks.sincronizar_vistas_redis',
+        'schedule': crontab(minute='*/5'),
+        'options': {'expires': 5 * 60},
+    },
+    'sincronizar-vistas-unicas': {
+        'task': 'apps.huecos.tasks.sincronizar_vistas_unicas',
+        'schedule': crontab(minute='2-59/5'),
+        'options': {'expires': 5 * 60},
+    },
+    'limpiar-otps-vencidos': {
+        'task': 'apps.usuarios.tasks.limpiar_otps_vencidos',
+        'schedule': crontab(minute=7),
+        'options': {'expires': 60 * 60},
+    },
+    'purgar-tokens-vencidos': {
+        'task': 'apps.usuarios.tasks.purgar_tokens_vencidos',
+        'schedule': crontab(hour=8, minute=15),
+        'options': {'expires': 6 * 60 * 60},
+    },
+    'reconciliar-contadores-huecos': {
+        'task': 'apps.huecos.tasks.reconciliar_contadores_huecos',
+        'schedule': crontab(hour=8, minute=30),
+        'options': {'expires': 6 * 60 * 60},
+    },
+    'reconstruir-estadisticas-usuarios': {
+        'task': 'apps.usuarios.tasks.reconstruir_estadisticas_usuarios',
+        'schedule': crontab(hour=8, minute=45),
+        'options': {'expires': 6 * 60 * 60},
+    },
+    'reconstruir-ranking-puntos': {
+        'task': 'apps.huecos.tasks.reconstruir_ranking_puntos',
+        'schedule': crontab(hour=9, minute=0),
+        'options': {'expires': 6 * 60 * 60},
+    },
+    'reconstruir-indice-huecos': {
+        'task': 'apps.huecos.tasks.reconstruir_indice_huecos',
+        'schedule': crontab(hour=9, minute=15),
+        'options': {'expires': 6 * 60 * 60},
+    },
+}
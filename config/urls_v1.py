@@ -1,6 +1,6 @@
 # config/urls_v1.py
 from rest_framework.routers import DefaultRouter
-from django.urls import path
+from django.urls import path, re_path
 
 # Importa tus ViewSets y la función summary
 from apps.usuarios.api.v1.views import UserViewSet
@@ -13,6 +13,11 @@ from apps.huecos.views import (
     HuecosCercanosViewSet,
     MisReportesListView,  
     SeguidosListView,
+    HuecoTileView,
+    HuecoConteoView,
+    HuecosMasCercanosView,
+    HuecosEnRutaView,
+    HuecosEnTendenciaView,
 )
 router = DefaultRouter()
 router.register(r"users", UserViewSet)
@@ -26,4 +31,9 @@ router.register(r'puntos', PuntosUsuarioViewSet, basename='puntos')
 urlpatterns = [
     path("huecos/misreportes/", MisReportesListView.as_view()),
     path("huecos/seguidos/", SeguidosListView.as_view()),
+    path("huecos/conteo/", HuecoConteoView.as_view()),
+    path("huecos/nearest/", HuecosMasCercanosView.as_view()),
+    path("huecos/ruta/", HuecosEnRutaView.as_view()),
+    path("huecos/tendencias/", HuecosEnTendenciaView.as_view()),
+    re_path(r"^huecos/tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)/?$", HuecoTileView.as_view()),
 ] + router.urls